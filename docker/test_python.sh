@@ -1,3 +1,5 @@
 #!/bin/bash
+set -e
 
 python3 /PrairieLearn/question-servers/freeformPythonLib/prairielearn_test.py
+python3 /PrairieLearn/elements/pl-graph/pl_graph_test.py
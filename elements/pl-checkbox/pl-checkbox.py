@@ -1,8 +1,6 @@
 import prairielearn as pl
-import lxml.html
 import random
 import math
-import chevron
 
 
 WEIGHT_DEFAULT = 1
@@ -18,7 +16,7 @@ HIDE_SCORE_BADGE_DEFAULT = False
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
 
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'number-answers', 'min-correct', 'max-correct', 'fixed-order', 'inline', 'hide-answer-panel', 'hide-help-text', 'detailed-help-text', 'partial-credit', 'partial-credit-method', 'hide-letter-keys', 'hide-score-badge']
@@ -105,7 +103,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     partial_credit = pl.get_boolean_attrib(element, 'partial-credit', PARTIAL_CREDIT_DEFAULT)
     partial_credit_method = pl.get_string_attrib(element, 'partial-credit-method', PARTIAL_CREDIT_METHOD_DEFAULT)
@@ -185,8 +183,7 @@ def render(element_html, data):
 
             info_params.update({'gradingtext': gradingtext})
 
-        with open('pl-checkbox.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-checkbox.mustache', info_params).strip()
 
         html_params = {
             'question': True,
@@ -214,8 +211,7 @@ def render(element_html, data):
             except Exception:
                 raise ValueError('invalid score' + score)
 
-        with open('pl-checkbox.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-checkbox.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -256,8 +252,7 @@ def render(element_html, data):
                 except Exception:
                     raise ValueError('invalid score' + score)
 
-            with open('pl-checkbox.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-checkbox.mustache', html_params).strip()
         else:
             html_params = {
                 'submission': True,
@@ -265,8 +260,7 @@ def render(element_html, data):
                 'parse_error': parse_error,
                 'inline': inline,
             }
-            with open('pl-checkbox.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-checkbox.mustache', html_params).strip()
 
     elif data['panel'] == 'answer':
 
@@ -281,8 +275,7 @@ def render(element_html, data):
                     'answers': correct_answer_list,
                     'hide_letter_keys': pl.get_boolean_attrib(element, 'hide-letter-keys', HIDE_LETTER_KEYS_DEFAULT)
                 }
-                with open('pl-checkbox.mustache', 'r', encoding='utf-8') as f:
-                    html = chevron.render(f, html_params).strip()
+                html = pl.render_template('pl-checkbox.mustache', html_params).strip()
         else:
             html = ''
 
@@ -294,7 +287,7 @@ def render(element_html, data):
 
 def parse(element_html, data):
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     submitted_key = data['submitted_answers'].get(name, None)
@@ -327,7 +320,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
     partial_credit = pl.get_boolean_attrib(element, 'partial-credit', PARTIAL_CREDIT_DEFAULT)
@@ -360,7 +353,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
     partial_credit = pl.get_boolean_attrib(element, 'partial-credit', PARTIAL_CREDIT_DEFAULT)
@@ -1,8 +1,7 @@
 import prairielearn as pl
-import lxml.html
 from html import escape, unescape
-import chevron
 import os
+import functools
 
 import pygments
 import pygments.lexers
@@ -82,9 +81,14 @@ def parse_highlight_lines(highlight_lines):
     return lines
 
 
+@functools.lru_cache(maxsize=64)
 def get_lexer_by_name(name):
     """
     Tries to find a lexer by both its proper name and any aliases it has.
+    Lexers do not keep state between calls, so the same instance is returned
+    for repeated lookups of the same name. The element cache server loads
+    this file once, so the lookups are memoized there (see
+    highlight_code()).
     """
     # Search by proper class/language names
     # This returns None if not found, and a class if found.
@@ -101,8 +105,20 @@ def get_lexer_by_name(name):
             return None
 
 
+@pl.element_cache
+def highlight_code(code, language, formatter_opts):
+    # The highlighted code only depends on the arguments, so it is cached
+    # across renders and, in the element cache server, across requests
+    if language is not None:
+        lexer = get_lexer_by_name(language)
+    else:
+        lexer = NoHighlightingLexer()
+    formatter = HighlightingHtmlFormatter(**formatter_opts)
+    return pygments.highlight(unescape(code), lexer, formatter)
+
+
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = []
     optional_attribs = ['language', 'no-highlight', 'source-file-name', 'prevent-select', 'highlight-lines', 'highlight-lines-color']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -126,7 +142,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     language = pl.get_string_attrib(element, 'language', LANGUAGE_DEFAULT)
     no_highlight = pl.get_boolean_attrib(element, 'no-highlight', NO_HIGHLIGHT_DEFAULT)
     specify_language = (language is not None) and (not no_highlight)
@@ -170,11 +186,6 @@ def render(element_html, data):
         elif len(code) > 0 and (code[0] == '\n' or code[0] == '\r'):
             code = code[1:]
 
-    if specify_language:
-        lexer = get_lexer_by_name(language)
-    else:
-        lexer = NoHighlightingLexer()
-
     formatter_opts = {
         'style': 'friendly',
         'cssclass': 'mb-2 rounded',
@@ -184,9 +195,8 @@ def render(element_html, data):
     if highlight_lines is not None:
         formatter_opts['hl_lines'] = parse_highlight_lines(highlight_lines)
         formatter_opts['hl_color'] = highlight_lines_color
-    formatter = HighlightingHtmlFormatter(**formatter_opts)
 
-    code = pygments.highlight(unescape(code), lexer, formatter)
+    code = highlight_code(code, language if specify_language else None, formatter_opts)
 
     html_params = {
         'no_highlight': no_highlight,
@@ -194,7 +204,6 @@ def render(element_html, data):
         'prevent_select': prevent_select,
     }
 
-    with open('pl-code.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-code.mustache', html_params).strip()
 
     return html
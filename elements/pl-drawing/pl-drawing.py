@@ -1,7 +1,6 @@
 import prairielearn as pl
 import lxml.html
 import lxml.etree
-import chevron
 import json
 import warnings
 import math
@@ -385,7 +384,7 @@ def check_graded(element, graded=True):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     check_attributes_rec(element)
 
     w_button = None
@@ -464,23 +463,23 @@ def prepare(element_html, data):
             data['correct_answers'][name] = ans
 
 
-def render_controls(template, elem):
+def render_controls(elem):
     if elem.tag == 'pl-controls':
         markup = ''
         for el in elem:
             if el.tag is lxml.etree.Comment:
                 continue
-            markup += render_controls(template, el) + '<br>\n'
+            markup += render_controls(el) + '<br>\n'
         return markup
     elif elem.tag == 'pl-drawing-button':
         opts = {format_attrib_name(k): v for k, v in elem.attrib.items() if k != 'type'}
-        return chevron.render(template, {'render_button': True, 'button_class': elem.attrib.get('type', ''), 'options': json.dumps(opts)}).strip()
+        return pl.render_template('pl-drawing.mustache', {'render_button': True, 'button_class': elem.attrib.get('type', ''), 'options': json.dumps(opts)}).strip()
     elif elem.tag == 'pl-controls-group':
         markup = '<p><strong>' + elem.attrib.get('label', '') + '</strong></p>\n<p>'
         for child in elem:
             if child.tag is lxml.etree.Comment:
                 continue
-            markup += render_controls(template, child) + '\n'
+            markup += render_controls(child) + '\n'
         markup += '</p>\n'
         return markup
     else:
@@ -1736,11 +1735,9 @@ def render_drawing_items(elem, curid=1, defaults={}):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name', '')
     preview_mode = not pl.get_boolean_attrib(element, 'gradable', element_defaults['gradable'])
-    with open('pl-drawing.mustache') as f:
-        template = f.read()
 
     btn_markup = ''
     init = {'objects': []}
@@ -1749,7 +1746,7 @@ def render(element_html, data):
         if el.tag is lxml.etree.Comment:
             continue
         elif el.tag == 'pl-controls' and not preview_mode:
-            btn_markup = render_controls(template, el)
+            btn_markup = render_controls(el)
         elif el.tag == 'pl-drawing-initial':
             init, _ = render_drawing_items(el)
             draw_error_box = pl.get_boolean_attrib(el, 'draw-error-box', element_defaults['draw-error-box'])
@@ -1831,11 +1828,11 @@ def render(element_html, data):
             parse_error = data['format_errors'].get(name, None)
             html_params['parse_error'] = parse_error
 
-    return chevron.render(template, html_params).strip()
+    return pl.render_template('pl-drawing.mustache', html_params).strip()
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name', element_defaults['answers-name'])
     preview_mode = not pl.get_boolean_attrib(element, 'gradable', element_defaults['gradable'])
 
@@ -1856,7 +1853,7 @@ def parse(element_html, data):
 
 def grade(element_html, data):
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     prev = not pl.get_boolean_attrib(element, 'gradable', element_defaults['gradable'])
     if prev:
         return
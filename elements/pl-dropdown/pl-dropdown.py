@@ -1,7 +1,5 @@
 import prairielearn as pl
-import lxml.html
 import random
-import chevron
 from enum import Enum
 
 WEIGHT_DEFAULT = 1
@@ -49,7 +47,7 @@ def get_solution(element, data):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=['answers-name'], optional_attribs=['blank', 'weight', 'sort'])
     answers_name = pl.get_string_attrib(element, 'answers-name')
 
@@ -61,7 +59,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answers_name = pl.get_string_attrib(element, 'answers-name')
     dropdown_options = get_options(element, data)
     submitted_answer = data['submitted_answers'].get(answers_name, None)
@@ -120,13 +118,12 @@ def render(element_html, data):
             'correct-answer': data['correct_answers'][answers_name]
         }
 
-    with open('pl-dropdown.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-dropdown.mustache', html_params).strip()
     return html
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answers_name = pl.get_string_attrib(element, 'answers-name')
     answer = data['submitted_answers'].get(answers_name, None)
 
@@ -150,7 +147,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answers_name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
     submitted_answer = data['submitted_answers'].get(answers_name, None)
@@ -162,7 +159,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answers_name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 from ansi2html import Ansi2HTMLConverter
 import ansi2html.style as ansi2html_style
 
@@ -29,7 +27,7 @@ def ansi_to_html(output):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = []
     optional_attribs = []
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -126,8 +124,7 @@ def render(element_html, data):
 
                     html_params['tests'] = tests
 
-        with open('pl-external-grader-results.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-external-grader-results.mustache', html_params).strip()
     else:
         html = ''
 
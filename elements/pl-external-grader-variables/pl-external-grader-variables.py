@@ -1,13 +1,11 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 
 
 PARAMS_NAME_DEFAULT = None
 
 
 def prepare(element_html, element_index, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, ['params-name'], [])
 
     params_name = pl.get_string_attrib(element, 'params-name', PARAMS_NAME_DEFAULT)
@@ -18,7 +16,7 @@ def prepare(element_html, element_index, data):
 
 
 def render(element_html, element_index, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     params_name = pl.get_string_attrib(element, 'params-name', PARAMS_NAME_DEFAULT)
     names_user_description = data['params'][params_name]
     has_names_user_description = len(names_user_description) > 0
@@ -27,7 +25,6 @@ def render(element_html, element_index, data):
         'names_user_description': names_user_description,
         'has_names_user_description': has_names_user_description,
     }
-    with open('pl-external-grader-variables.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-external-grader-variables.mustache', html_params).strip()
 
     return html
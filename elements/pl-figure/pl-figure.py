@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import os
 
 
@@ -11,12 +9,12 @@ INLINE_DEFAULT = False
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=['file-name'], optional_attribs=['width', 'type', 'directory', 'inline'])
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
 
     # Get file name or raise exception if one does not exist
     file_name = pl.get_string_attrib(element, 'file-name')
@@ -54,7 +52,6 @@ def render(element_html, data):
 
     # Create and return html
     html_params = {'src': file_url, 'width': width, 'inline': inline}
-    with open('pl-figure.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-figure.mustache', html_params).strip()
 
     return html
@@ -1,5 +1,4 @@
 import prairielearn as pl
-import lxml.html
 import os
 
 
@@ -9,12 +8,12 @@ FORCE_DOWNLOAD_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=['file-name'], optional_attribs=['type', 'directory', 'label', 'force-download'])
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
 
     # Get file name or raise exception if one does not exist
     file_name = pl.get_string_attrib(element, 'file-name')
@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import base64
 import hashlib
 import os
@@ -29,7 +27,7 @@ def add_format_error(data, error_string):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['file-name']
     optional_attribs = ['ace-mode', 'ace-theme', 'editor-config-function', 'source-file-name', 'min-lines', 'max-lines', 'auto-resize', 'preview', 'focus', 'directory']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -51,7 +49,7 @@ def render(element_html, data):
     if data['panel'] != 'question':
         return ''
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     file_name = pl.get_string_attrib(element, 'file-name', '')
     answer_name = get_answer_name(file_name)
     editor_config_function = pl.get_string_attrib(element, 'editor-config-function', EDITOR_CONFIG_FUNCTION_DEFAULT)
@@ -116,8 +114,7 @@ def render(element_html, data):
 
     if data['panel'] == 'question':
         html_params['question'] = True
-        with open('pl-file-editor.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-file-editor.mustache', html_params).strip()
     else:
         html = ''
 
@@ -125,7 +122,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     file_name = pl.get_string_attrib(element, 'file-name', '')
     answer_name = get_answer_name(file_name)
 
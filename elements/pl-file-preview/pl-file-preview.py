@@ -1,11 +1,9 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import base64
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = []
     optional_attribs = []
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -47,7 +45,6 @@ def render(element_html, data):
     else:
         html_params['has_files'] = False
 
-    with open('pl-file-preview.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-file-preview.mustache', html_params).strip()
 
     return html
@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import json
 from io import StringIO
 import csv
@@ -28,7 +26,7 @@ def add_format_error(data, error_string):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['file-names']
     optional_attribs = []
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -43,7 +41,7 @@ def render(element_html, data):
     if data['panel'] != 'question':
         return ''
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     uuid = pl.get_uuid()
     raw_file_names = pl.get_string_attrib(element, 'file-names', '')
     file_names = get_file_names_as_array(raw_file_names)
@@ -61,14 +59,13 @@ def render(element_html, data):
     else:
         html_params['has_files'] = False
 
-    with open('pl-file-upload.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-file-upload.mustache', html_params).strip()
 
     return html
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     raw_file_names = pl.get_string_attrib(element, 'file-names', '')
     required_file_names = get_file_names_as_array(raw_file_names)
     answer_name = get_answer_name(raw_file_names)
@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import json
 import pygraphviz
 import numpy as np
@@ -45,27 +43,31 @@ def graphviz_from_adj_matrix(element, data):
     # Auto detect showing weights if any of the weights are not 1 or 0
 
     if show_weights is None:
-        all_ones = True
-        for x in mat.flatten():
-            if x != 1 and x != 0:
-                all_ones = False
-        show_weights = not all_ones
+        show_weights = not np.all((mat == 0) | (mat == 1))
+
+    return layout_adj_matrix(mat.tolist(), [str(node) for node in mat_label], engine, bool(show_weights), digits, presentation_type)
+
+
+@pl.element_cache
+def layout_adj_matrix(mat, mat_label, engine, show_weights, digits, presentation_type):
+    # The layout only depends on the arguments, so it is cached across
+    # renders and, in the element cache server, across requests
+    mat = np.array(mat)
 
     # Create pygraphviz graph representation
 
     G = pygraphviz.AGraph(directed=True)
 
-    for node in mat_label:
+    nodes = list(mat_label)
+    for node in nodes:
         G.add_node(node)
 
-    for i, out_node in enumerate(mat_label):
-        for j, in_node in enumerate(mat_label):
-            x = mat[j, i]
-            if (x > 0):
-                if (show_weights):
-                    G.add_edge(out_node, in_node, label=pl.string_from_2darray(x, presentation_type=presentation_type, digits=digits))
-                else:
-                    G.add_edge(out_node, in_node)
+    # Entry (j, i) of the matrix is the weight of the edge from node i to node j
+    for (i, j) in zip(*np.nonzero(mat.T > 0)):
+        if (show_weights):
+            G.add_edge(nodes[i], nodes[j], label=pl.string_from_2darray(mat[j, i], presentation_type=presentation_type, digits=digits))
+        else:
+            G.add_edge(nodes[i], nodes[j])
 
     G.layout(engine)
     return G.string()
@@ -85,7 +87,7 @@ def prepare(element_html, data):
         if hasattr(extension, 'optional_attribs'):
             optional_attribs.extend(extension.optional_attribs)
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=[], optional_attribs=optional_attribs)
 
 
@@ -98,7 +100,7 @@ def render(element_html, data):
             matrix_backends[name] = backend
 
     # Get attribs
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     engine = pl.get_string_attrib(element, 'engine', ENGINE_DEFAULT)
     input_param = pl.get_string_attrib(element, 'params-name-matrix', PARAMS_NAME_MATRIX_DEFAULT)
     input_type = pl.get_string_attrib(element, 'params-type', PARAMS_TYPE_DEFAULT)
@@ -124,7 +126,6 @@ def render(element_html, data):
         'engine': engine,
     }
 
-    with open('pl-graph.mustache') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-graph.mustache', html_params).strip()
 
     return html
@@ -0,0 +1,47 @@
+import sys
+import os
+ELEMENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ELEMENT_DIR, '../../question-servers/freeformPythonLib'))
+sys.path.insert(0, os.path.join(ELEMENT_DIR, '../../lib'))
+
+import importlib.util      # noqa: E402
+import unittest            # noqa: E402
+from unittest import mock  # noqa: E402
+import numpy as np         # noqa: E402
+import prairielearn as pl  # noqa: E402
+
+spec = importlib.util.spec_from_file_location('pl_graph', os.path.join(ELEMENT_DIR, 'pl-graph.py'))
+pl_graph = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pl_graph)
+
+
+class TestPlGraph(unittest.TestCase):
+
+    ELEMENT_HTML = '<pl-graph params-name-matrix="m" params-name-labels="l" weights="true"></pl-graph>'
+
+    def setUp(self):
+        pl._element_cache.clear()
+        self.mat = np.array([[0, 0.5, 0], [0.25, 0, 1], [0.75, 0.5, 0]])
+        self.data = {'params': {'m': pl.to_json(self.mat), 'l': pl.to_json(np.array(['A', 'B', 'C']))}}
+
+    def layout(self):
+        return pl_graph.graphviz_from_adj_matrix(pl.parse_element(self.ELEMENT_HTML), self.data)
+
+    def test_cached_layout_matches_uncached(self):
+        uncached = pl_graph.layout_adj_matrix.element_cache_wrapped(self.mat.tolist(), ['A', 'B', 'C'], 'dot', True, 2, 'f')
+        self.assertEqual(self.layout(), uncached)
+        with mock.patch.object(pl_graph.pygraphviz, 'AGraph') as AGraph:
+            self.assertEqual(self.layout(), uncached)
+            AGraph.assert_not_called()
+
+    def test_changed_matrix_misses_cache(self):
+        self.layout()
+        self.data['params']['m'] = pl.to_json(self.mat.T)
+        with mock.patch.object(pl_graph.pygraphviz, 'AGraph') as AGraph:
+            AGraph.return_value.string.return_value = 'new layout'
+            self.assertEqual(self.layout(), 'new layout')
+            AGraph.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,4 @@
-import lxml.html
 from html import escape
-import chevron
 import math
 import prairielearn as pl
 import random
@@ -17,7 +15,7 @@ PLACEHOLDER_TEXT_THRESHOLD = 4  # Minimum size to show the placeholder text
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'correct-answer', 'label', 'suffix', 'display', 'size', 'show-help-text']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -31,7 +29,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', LABEL_DEFAULT)
     suffix = pl.get_string_attrib(element, 'suffix', SUFFIX_DEFAULT)
@@ -44,12 +42,10 @@ def render(element_html, data):
 
         # Get info strings
         info_params = {'format': True}
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            info_params.pop('format', None)
-            info_params['shortformat'] = True
-            shortinfo = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-integer-input.mustache', info_params).strip()
+        info_params.pop('format', None)
+        info_params['shortformat'] = True
+        shortinfo = pl.render_template('pl-integer-input.mustache', info_params).strip()
 
         html_params = {
             'question': True,
@@ -89,8 +85,7 @@ def render(element_html, data):
             raise ValueError('method of display "%s" is not valid (must be "inline" or "block")' % display)
         if raw_submitted_answer is not None:
             html_params['raw_submitted_answer'] = escape(raw_submitted_answer)
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-integer-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -137,14 +132,12 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-integer-input.mustache', html_params).strip()
     elif data['panel'] == 'answer':
         a_tru = pl.from_json(data['correct_answers'].get(name, None))
         if a_tru is not None:
             html_params = {'answer': True, 'label': label, 'a_tru': '{:d}'.format(a_tru), 'suffix': suffix}
-            with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-integer-input.mustache', html_params).strip()
         else:
             html = ''
     else:
@@ -154,7 +147,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     # Get submitted answer or return parse_error if it does not exist
@@ -169,8 +162,7 @@ def parse(element_html, data):
             'format_error': True,
             'format_error_message': 'the submitted answer was blank.'
         }
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            format_str = chevron.render(f, opts).strip()
+        format_str = pl.render_template('pl-integer-input.mustache', opts).strip()
         data['format_errors'][name] = format_str
         data['submitted_answers'][name] = None
         return
@@ -182,14 +174,13 @@ def parse(element_html, data):
             raise ValueError('invalid submitted answer (wrong type)')
         data['submitted_answers'][name] = pl.to_json(a_sub_parsed)
     except Exception:
-        with open('pl-integer-input.mustache', 'r', encoding='utf-8') as f:
-            format_str = chevron.render(f, {'format_error': True}).strip()
+        format_str = pl.render_template('pl-integer-input.mustache', {'format_error': True}).strip()
         data['format_errors'][name] = format_str
         data['submitted_answers'][name] = None
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     # Get weight
@@ -221,7 +212,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
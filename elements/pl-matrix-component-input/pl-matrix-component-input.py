@@ -1,9 +1,7 @@
 import prairielearn as pl
-import lxml.html
 from html import escape
 import numpy as np
 import math
-import chevron
 import random
 
 
@@ -18,7 +16,7 @@ ALLOW_FRACTIONS_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'label', 'comparison', 'rtol', 'atol', 'digits', 'allow-partial-credit', 'allow-feedback', 'allow-fractions', 'rows', 'columns']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -37,7 +35,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     # get the name of the element, in this case, the name of the array
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', LABEL_DEFAULT)
@@ -90,12 +88,10 @@ def render(element_html, data):
             raise ValueError('method of comparison "%s" is not valid (must be "relabs", "sigfig", or "decdig")' % comparison)
 
         info_params['allow_fractions'] = allow_fractions
-        with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
-        with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-            info_params.pop('format', None)
-            info_params['shortformat'] = True
-            shortinfo = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-matrix-component-input.mustache', info_params).strip()
+        info_params.pop('format', None)
+        info_params['shortformat'] = True
+        shortinfo = pl.render_template('pl-matrix-component-input.mustache', info_params).strip()
 
         html_params = {
             'question': True,
@@ -123,8 +119,7 @@ def render(element_html, data):
             except Exception:
                 raise ValueError('invalid score' + score)
 
-        with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-matrix-component-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
 
@@ -191,8 +186,7 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-matrix-component-input.mustache', html_params).strip()
 
     elif data['panel'] == 'answer':
 
@@ -224,8 +218,7 @@ def render(element_html, data):
                 'uuid': pl.get_uuid()
             }
 
-            with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-matrix-component-input.mustache', html_params).strip()
         else:
             html = ''
 
@@ -236,7 +229,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     allow_fractions = pl.get_boolean_attrib(element, 'allow-fractions', ALLOW_FRACTIONS_DEFAULT)
 
@@ -271,15 +264,14 @@ def parse(element_html, data):
                 data['submitted_answers'][each_entry_name] = None
 
     if invalid_format:
-        with open('pl-matrix-component-input.mustache', 'r', encoding='utf-8') as f:
-            data['format_errors'][name] = chevron.render(f, {'format_error': True, 'allow_fractions': allow_fractions}).strip()
+        data['format_errors'][name] = pl.render_template('pl-matrix-component-input.mustache', {'format_error': True, 'allow_fractions': allow_fractions}).strip()
         data['submitted_answers'][name] = None
     else:
         data['submitted_answers'][name] = pl.to_json(A)
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     allow_partial_credit = pl.get_boolean_attrib(element, 'allow-partial-credit', ALLOW_PARTIAL_CREDIT_DEFAULT)
 
@@ -311,34 +303,26 @@ def grade(element_html, data):
     else:
         m, n = np.shape(a_tru)
 
-    number_of_correct = 0
-    feedback = {}
-    for i in range(m):
-        for j in range(n):
-
-            each_entry_name = name + str(n * i + j + 1)
-            a_sub = data['submitted_answers'].get(each_entry_name, None)
-            # Get submitted answer (if it does not exist, score is zero)
-            if a_sub is None:
-                data['partial_scores'][name] = {'score': 0, 'weight': weight}
-                return
-            # If submitted answer is in a format generated by pl.to_json, convert it
-            # back to a standard type (otherwise, do nothing)
-            a_sub = pl.from_json(a_sub)
+    # Get all submitted answers (if any does not exist, score is zero)
+    entry_names = [name + str(k + 1) for k in range(m * n)]
+    a_sub = [data['submitted_answers'].get(each_entry_name, None) for each_entry_name in entry_names]
+    if any(each_a_sub is None for each_a_sub in a_sub):
+        data['partial_scores'][name] = {'score': 0, 'weight': weight}
+        return
+    # If submitted answers are in a format generated by pl.to_json, convert them
+    # back to a standard type (otherwise, do nothing)
+    a_sub = np.array([pl.from_json(each_a_sub) for each_a_sub in a_sub]).reshape(m, n)
 
-            # Compare submitted answer with true answer
-            if comparison == 'relabs':
-                correct = pl.is_correct_scalar_ra(a_sub, a_tru[i, j], rtol, atol)
-            elif comparison == 'sigfig':
-                correct = pl.is_correct_scalar_sf(a_sub, a_tru[i, j], digits)
-            elif comparison == 'decdig':
-                correct = pl.is_correct_scalar_dd(a_sub, a_tru[i, j], digits)
+    # Compare all submitted answers with the true answer at once
+    if comparison == 'relabs':
+        correct = pl.is_correct_elementwise_ra(a_sub, a_tru, rtol, atol)
+    elif comparison == 'sigfig':
+        correct = pl.is_correct_elementwise_sf(a_sub, a_tru, digits)
+    elif comparison == 'decdig':
+        correct = pl.is_correct_elementwise_dd(a_sub, a_tru, digits)
 
-            if correct:
-                number_of_correct += 1
-                feedback.update({each_entry_name: 'correct'})
-            else:
-                feedback.update({each_entry_name: 'incorrect'})
+    number_of_correct = int(np.count_nonzero(correct))
+    feedback = {each_entry_name: 'correct' if each_correct else 'incorrect' for (each_entry_name, each_correct) in zip(entry_names, correct.flat)}
 
     if number_of_correct == m * n:
         data['partial_scores'][name] = {'score': 1, 'weight': weight}
@@ -351,7 +335,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
     allow_partial_credit = pl.get_boolean_attrib(element, 'allow-partial-credit', ALLOW_PARTIAL_CREDIT_DEFAULT)
@@ -407,44 +391,43 @@ def test(element_html, data):
         data['partial_scores'][name] = {'score': score_value, 'weight': weight, 'feedback': feedback}
 
 
+FEEDBACK_BADGES = {
+    'correct': '&nbsp;<span class="badge badge-success"><i class="fa fa-check" aria-hidden="true"></i></span>',
+    'incorrect': '&nbsp;<span class="badge badge-danger"><i class="fa fa-times" aria-hidden="true"></i></span>',
+}
+
+
 def createTableForHTMLDisplay(m, n, name, label, data, format):
 
     editable = data['editable']
 
+    # The table is built as a list of strings that is joined at the end,
+    # with one entry name and raw submitted answer lookup per cell
+    entry_names = [name + str(k + 1) for k in range(m * n)]
+    raw_submitted_answers = [data['raw_submitted_answers'].get(each_entry_name, None) for each_entry_name in entry_names]
+    bracket_left = '<td class="close-left" rowspan="' + str(m) + '"></td>' + '<td style="width:4px" rowspan="' + str(m) + '"></td>'
+    bracket_right = '<td style="width:4px" rowspan="' + str(m) + '"></td>' + '<td class="close-right" rowspan="' + str(m) + '"></td>'
+
     if format == 'output-invalid':
 
-        display_array = '<table>'
-        display_array += '<tr>'
-        display_array += '<td class="close-left" rowspan="' + str(m) + '"></td>'
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
-        # First row of array
-        for j in range(n):
-            each_entry_name = name + str(j + 1)
-            raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-            format_errors = data['format_errors'].get(each_entry_name, None)
-            if format_errors is None:
-                display_array += '<td class="allborder"><code class="user-output">'
+        cells = []
+        for (each_entry_name, raw_submitted_answer) in zip(entry_names, raw_submitted_answers):
+            if data['format_errors'].get(each_entry_name, None) is None:
+                cells.append('<td class="allborder"><code class="user-output">')
             else:
-                display_array += '<td class="allborder"><code class="user-output-invalid">'
-            display_array += escape(pl.escape_unicode_string(raw_submitted_answer))
-            display_array += '</code></td> '
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
-        display_array += '<td class="close-right" rowspan="' + str(m) + '"></td>'
+                cells.append('<td class="allborder"><code class="user-output-invalid">')
+            cells[-1] += escape(pl.escape_unicode_string(raw_submitted_answer)) + '</code></td> '
+
+        display_array = ['<table>', '<tr>', bracket_left]
+        # First row of array
+        display_array.extend(cells[:n])
+        display_array.append(bracket_right)
         # Add the other rows
         for i in range(1, m):
-            display_array += ' <tr>'
-            for j in range(n):
-                each_entry_name = name + str(n * i + j + 1)
-                raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-                format_errors = data['format_errors'].get(each_entry_name, None)
-                if format_errors is None:
-                    display_array += '<td class="allborder"><code class="user-output">'
-                else:
-                    display_array += '<td class="allborder"><code class="user-output-invalid">'
-                display_array += escape(pl.escape_unicode_string(raw_submitted_answer))
-                display_array += '</code></td> '
-            display_array += '</tr>'
-        display_array += '</table>'
+            display_array.append(' <tr>')
+            display_array.extend(cells[n * i:n * (i + 1)])
+            display_array.append('</tr>')
+        display_array.append('</table>')
 
     elif format == 'output-feedback':
 
@@ -463,87 +446,56 @@ def createTableForHTMLDisplay(m, n, name, label, data, format):
         else:
             score_message = ''
 
-        display_array = '<table>'
-        display_array += '<tr>'
+        cells = []
+        for (each_entry_name, raw_submitted_answer) in zip(entry_names, raw_submitted_answers):
+            cell = escape(raw_submitted_answer)
+            if feedback_each_entry is not None:
+                cell += FEEDBACK_BADGES[feedback_each_entry[each_entry_name]]
+            cells.append(cell)
+
+        display_array = ['<table>', '<tr>']
         # Add the prefix
         if label is not None:
-            display_array += '<td rowspan="0">' + label + '&nbsp;</td>'
-        display_array += '<td class="close-left" rowspan="' + str(m) + '"></td>'
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
+            display_array.append('<td rowspan="0">' + label + '&nbsp;</td>')
+        display_array.append(bracket_left)
         # First row of array
-        for j in range(n):
-            each_entry_name = name + str(j + 1)
-            raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-            display_array += '<td class="allborder">'
-            display_array += escape(raw_submitted_answer)
-            if feedback_each_entry is not None:
-                if feedback_each_entry[each_entry_name] == 'correct':
-                    feedback_message = '&nbsp;<span class="badge badge-success"><i class="fa fa-check" aria-hidden="true"></i></span>'
-                elif feedback_each_entry[each_entry_name] == 'incorrect':
-                    feedback_message = '&nbsp;<span class="badge badge-danger"><i class="fa fa-times" aria-hidden="true"></i></span>'
-                display_array += feedback_message
-            display_array += '</td> '
+        display_array.extend('<td class="allborder">' + cell + '</td> ' for cell in cells[:n])
         # Add the suffix
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
-        display_array += '<td class="close-right" rowspan="' + str(m) + '"></td>'
-        if score_message is not None:
-            display_array += '<td rowspan="0">&nbsp;' + score_message + '</td>'
-        display_array += '</tr>'
+        display_array.append(bracket_right)
+        display_array.append('<td rowspan="0">&nbsp;' + score_message + '</td>')
+        display_array.append('</tr>')
         # Add the other rows
         for i in range(1, m):
-            display_array += ' <tr>'
-            for j in range(n):
-                each_entry_name = name + str(n * i + j + 1)
-                raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-                display_array += ' <td class="allborder"> '
-                display_array += escape(raw_submitted_answer)
-                if feedback_each_entry is not None:
-                    if feedback_each_entry[each_entry_name] == 'correct':
-                        feedback_message = '&nbsp;<span class="badge badge-success"><i class="fa fa-check" aria-hidden="true"></i></span>'
-                    elif feedback_each_entry[each_entry_name] == 'incorrect':
-                        feedback_message = '&nbsp;<span class="badge badge-danger"><i class="fa fa-times" aria-hidden="true"></i></span>'
-                    display_array += feedback_message
-                display_array += ' </td> '
-            display_array += '</tr>'
-        display_array += '</table>'
+            display_array.append(' <tr>')
+            display_array.extend(' <td class="allborder"> ' + cell + ' </td> ' for cell in cells[n * i:n * (i + 1)])
+            display_array.append('</tr>')
+        display_array.append('</table>')
 
     elif format == 'input':
-        display_array = '<table>'
-        display_array += '<tr>'
-        # Add first row
-        display_array += '<td class="close-left" rowspan="' + str(m) + '"></td>'
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
-        for j in range(n):
-            each_entry_name = name + str(j + 1)
-            raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-            display_array += ' <td> <input name= "' + each_entry_name + '" type="text" size="8"  '
+
+        cells = []
+        for (each_entry_name, raw_submitted_answer) in zip(entry_names, raw_submitted_answers):
+            cell = ' <td> <input name= "' + each_entry_name + '" type="text" size="8"  '
             if not editable:
-                display_array += ' disabled '
+                cell += ' disabled '
             if raw_submitted_answer is not None:
-                display_array += '  value= "'
-                display_array += escape(raw_submitted_answer)
-            display_array += '" /> </td>'
-        display_array += '<td style="width:4px" rowspan="' + str(m) + '"></td>'
-        display_array += '<td class="close-right" rowspan="' + str(m) + '"></td>'
+                cell += '  value= "' + escape(raw_submitted_answer)
+            cells.append(cell + '" /> </td>')
+
+        display_array = ['<table>', '<tr>']
+        # Add first row
+        display_array.append(bracket_left)
+        display_array.extend(cells[:n])
+        display_array.append(bracket_right)
         # Add other rows
         for i in range(1, m):
-            display_array += ' <tr>'
-            for j in range(n):
-                each_entry_name = name + str(n * i + j + 1)
-                raw_submitted_answer = data['raw_submitted_answers'].get(each_entry_name, None)
-                display_array += ' <td> <input name= "' + each_entry_name + '" type="text" size="8"  '
-                if not editable:
-                    display_array += ' disabled '
-                if raw_submitted_answer is not None:
-                    display_array += '  value= "'
-                    display_array += escape(raw_submitted_answer)
-                display_array += '" /> </td>'
-                display_array += ' </td> '
-            display_array += '</tr>'
-        display_array += '</table>'
+            display_array.append(' <tr>')
+            display_array.extend(cell + ' </td> ' for cell in cells[n * i:n * (i + 1)])
+            display_array.append('</tr>')
+        display_array.append('</table>')
 
     else:
 
-        display_array = ''
+        display_array = []
 
-    return display_array
+    return ''.join(display_array)
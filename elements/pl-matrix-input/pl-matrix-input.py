@@ -1,9 +1,7 @@
 import prairielearn as pl
-import lxml.html
 import numpy as np
 import random
 import math
-import chevron
 
 
 WEIGHT_DEFAULT = 1
@@ -17,14 +15,14 @@ SHOW_HELP_TEXT_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'label', 'comparison', 'rtol', 'atol', 'digits', 'allow-complex', 'show-help-text']
     pl.check_attribs(element, required_attribs, optional_attribs)
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', LABEL_DEFAULT)
 
@@ -60,12 +58,10 @@ def render(element_html, data):
         else:
             raise ValueError('method of comparison "%s" is not valid (must be "relabs", "sigfig", or "decdig")' % comparison)
         info_params['allow_complex'] = pl.get_boolean_attrib(element, 'allow-complex', ALLOW_COMPLEX_DEFAULT)
-        with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
-        with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-            info_params.pop('format', None)
-            info_params['shortformat'] = True
-            shortinfo = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-matrix-input.mustache', info_params).strip()
+        info_params.pop('format', None)
+        info_params['shortformat'] = True
+        shortinfo = pl.render_template('pl-matrix-input.mustache', info_params).strip()
 
         html_params = {
             'question': True,
@@ -94,8 +90,7 @@ def render(element_html, data):
 
         if raw_submitted_answer is not None:
             html_params['raw_submitted_answer'] = pl.escape_unicode_string(raw_submitted_answer)
-        with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-matrix-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -144,8 +139,7 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-matrix-input.mustache', html_params).strip()
 
     elif data['panel'] == 'answer':
         # Get true answer - do nothing if it does not exist
@@ -184,8 +178,7 @@ def render(element_html, data):
                 html_params['default_is_matlab'] = True
             else:
                 html_params['default_is_python'] = True
-            with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-matrix-input.mustache', html_params).strip()
         else:
             html = ''
 
@@ -197,14 +190,13 @@ def render(element_html, data):
 
 def get_format_string(message):
     params = {'format_error': True, 'format_error_message': message}
-    with open('pl-matrix-input.mustache', 'r', encoding='utf-8') as f:
-        return chevron.render(f, params).strip()
+    return pl.render_template('pl-matrix-input.mustache', params).strip()
 
 
 def parse(element_html, data):
     # By convention, this function returns at the first error found
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     allow_complex = pl.get_boolean_attrib(element, 'allow-complex', ALLOW_COMPLEX_DEFAULT)
 
@@ -232,7 +224,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     # Get weight
@@ -289,7 +281,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
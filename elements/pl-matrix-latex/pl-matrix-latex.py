@@ -1,5 +1,4 @@
 import prairielearn as pl
-import lxml.html
 import numpy as np
 
 
@@ -8,14 +7,14 @@ PRESENTATION_TYPE_DEFAULT = 'f'
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['params-name']
     optional_attribs = ['digits', 'presentation-type']
     pl.check_attribs(element, required_attribs, optional_attribs)
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
 
     # Get the number of digits to output
     digits = pl.get_integer_attrib(element, 'digits', DIGITS_DEFAULT)
@@ -1,19 +1,17 @@
 import prairielearn as pl
-import lxml.html
 import numpy as np
-import chevron
 
 
 DIGITS_DEFAULT = 2
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=[], optional_attribs=['digits'])
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     digits = pl.get_integer_attrib(element, 'digits', DIGITS_DEFAULT)
 
     matlab_data = ''
@@ -59,7 +57,6 @@ def render(element_html, data):
         'uuid': pl.get_uuid()
     }
 
-    with open('pl-matrix-output.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-matrix-output.mustache', html_params).strip()
 
     return html
@@ -1,10 +1,8 @@
 import prairielearn as pl
 import pathlib
 import json
-import lxml.html
 import random
 import math
-import chevron
 
 WEIGHT_DEFAULT = 1
 FIXED_ORDER_DEFAULT = False
@@ -57,7 +55,7 @@ def categorize_options(element, data):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'number-answers', 'fixed-order', 'inline',
                         'none-of-the-above', 'all-of-the-above', 'hide-letter-keys',
@@ -200,7 +198,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     answers = data['params'].get(name, [])
@@ -252,8 +250,7 @@ def render(element_html, data):
             except Exception:
                 raise ValueError('invalid score' + score)
 
-        with open('pl-multiple-choice.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-multiple-choice.mustache', html_params).strip()
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
         html_params = {
@@ -283,8 +280,7 @@ def render(element_html, data):
                 except Exception:
                     raise ValueError('invalid score' + score)
 
-        with open('pl-multiple-choice.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-multiple-choice.mustache', html_params).strip()
     elif data['panel'] == 'answer':
         correct_answer = data['correct_answers'].get(name, None)
 
@@ -299,8 +295,7 @@ def render(element_html, data):
                 'inline': inline,
                 'hide_letter_keys': pl.get_boolean_attrib(element, 'hide-letter-keys', HIDE_LETTER_KEYS_DEFAULT)
             }
-            with open('pl-multiple-choice.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-multiple-choice.mustache', html_params).strip()
     else:
         raise Exception('Invalid panel type: %s' % data['panel'])
 
@@ -308,7 +303,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     submitted_key = data['submitted_answers'].get(name, None)
@@ -324,7 +319,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
@@ -339,7 +334,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
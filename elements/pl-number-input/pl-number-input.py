@@ -1,6 +1,4 @@
-import lxml.html
 from html import escape
-import chevron
 import math
 import prairielearn as pl
 import numpy as np
@@ -22,7 +20,7 @@ ALLOW_FRACTIONS_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'correct-answer', 'label', 'suffix', 'display', 'comparison', 'rtol', 'atol', 'digits', 'allow-complex', 'show-help-text', 'size', 'show-correct-answer', 'show-placeholder', 'allow-fractions']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -55,7 +53,7 @@ def format_true_ans(element, data, name):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', None)
     suffix = pl.get_string_attrib(element, 'suffix', None)
@@ -127,14 +125,12 @@ def render(element_html, data):
         if ans_true is not None:
             info_params['a_tru'] = ans_true
 
-        with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
-        with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-            info_params.pop('format', None)
-            # Within mustache, the shortformat generates the shortinfo that is used as a placeholder inside of the numeric entry.
-            # Here we opt to not generate the value, hence the placeholder is empty.
-            info_params['shortformat'] = pl.get_boolean_attrib(element, 'show-placeholder', SHOW_PLACEHOLDER_DEFAULT)
-            shortinfo = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-number-input.mustache', info_params).strip()
+        info_params.pop('format', None)
+        # Within mustache, the shortformat generates the shortinfo that is used as a placeholder inside of the numeric entry.
+        # Here we opt to not generate the value, hence the placeholder is empty.
+        info_params['shortformat'] = pl.get_boolean_attrib(element, 'show-placeholder', SHOW_PLACEHOLDER_DEFAULT)
+        shortinfo = pl.render_template('pl-number-input.mustache', info_params).strip()
 
         html_params['info'] = info
         html_params['shortinfo'] = shortinfo
@@ -158,8 +154,7 @@ def render(element_html, data):
             raise ValueError('method of display "%s" is not valid (must be "inline" or "block")' % display)
         if raw_submitted_answer is not None:
             html_params['raw_submitted_answer'] = escape(raw_submitted_answer)
-        with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-number-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -209,8 +204,7 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-number-input.mustache', html_params).strip()
     elif data['panel'] == 'answer':
         ans_true = None
         if pl.get_boolean_attrib(element, 'show-correct-answer', SHOW_CORRECT_ANSWER_DEFAULT):
@@ -218,8 +212,7 @@ def render(element_html, data):
 
         if ans_true is not None:
             html_params = {'answer': True, 'label': label, 'a_tru': ans_true, 'suffix': suffix}
-            with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-number-input.mustache', html_params).strip()
         else:
             html = ''
     else:
@@ -235,12 +228,11 @@ def get_format_string(is_complex=False, allow_fractions=False, message=None):
         'allow_fractions': allow_fractions,
         'format_error_message': message
     }
-    with open('pl-number-input.mustache', 'r', encoding='utf-8') as f:
-        return chevron.render(f, params).strip()
+    return pl.render_template('pl-number-input.mustache', params).strip()
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     allow_complex = pl.get_boolean_attrib(element, 'allow-complex', ALLOW_COMPLEX_DEFAULT)
     allow_fractions = pl.get_boolean_attrib(element, 'allow-fractions', ALLOW_FRACTIONS_DEFAULT)
@@ -256,7 +248,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     # Get weight
@@ -326,7 +318,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
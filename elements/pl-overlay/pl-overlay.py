@@ -1,6 +1,5 @@
 import prairielearn as pl
 import lxml.html
-import chevron
 
 
 VALIGN_DEFAULT = 'middle'
@@ -22,7 +21,7 @@ ALIGNMENT_TO_PERC = {
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     num_backgrounds = 0
     for child in element:
         if isinstance(child, lxml.html.HtmlComment):
@@ -59,7 +58,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     width = pl.get_float_attrib(element, 'width', None)
     height = pl.get_float_attrib(element, 'height', None)
     background = None
@@ -118,6 +117,5 @@ def render(element_html, data):
         'background': background,
         'clip': pl.get_boolean_attrib(element, 'clip', CLIP_DEFAULT)
     }
-    with open('pl-overlay.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-overlay.mustache', html_params).strip()
     return html
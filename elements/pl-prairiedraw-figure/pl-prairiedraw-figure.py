@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import os
 
 
@@ -10,7 +8,7 @@ HEIGHT_DEFAULT = '300'
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['script-name']
     optional_attribs = ['param-names', 'width', 'height']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -18,7 +16,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     script_name = pl.get_string_attrib(element, 'script-name', None)
 
     with open(os.path.join(data['options']['question_path'], script_name)) as f:
@@ -42,7 +40,6 @@ def render(element_html, data):
         'uuid': pl.get_uuid(),
     }
 
-    with open('pl-prairiedraw-figure.mustache') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-prairiedraw-figure.mustache', html_params).strip()
 
     return html
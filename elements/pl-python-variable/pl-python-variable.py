@@ -1,5 +1,4 @@
 import prairielearn as pl
-import lxml.html
 
 NO_HIGHLIGHT_DEFAULT = False
 PREFIX_DEFAULT = ''
@@ -11,12 +10,12 @@ SHOW_DIMENSIONS_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=['params-name'], optional_attribs=['text', 'no-highlight', 'prefix', 'suffix', 'show-header', 'show-index', 'show-dimensions'])
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     force_text = pl.get_boolean_attrib(element, 'text', TEXT_DEFAULT)
     varname = pl.get_string_attrib(element, 'params-name')
     show_header = pl.get_boolean_attrib(element, 'show-header', SHOW_HEADER_DEFAULT)
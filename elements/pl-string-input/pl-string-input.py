@@ -1,6 +1,4 @@
-import lxml.html
 from html import escape
-import chevron
 import math
 import prairielearn as pl
 import random
@@ -21,7 +19,7 @@ SHOW_HELP_TEXT_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
     optional_attribs = ['weight', 'correct-answer', 'label', 'suffix', 'display', 'remove-leading-trailing', 'remove-spaces', 'allow-blank', 'ignore-case', 'placeholder', 'size', 'show-help-text']
     pl.check_attribs(element, required_attribs, optional_attribs)
@@ -36,7 +34,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', LABEL_DEFAULT)
     suffix = pl.get_string_attrib(element, 'suffix', SUFFIX_DEFAULT)
@@ -62,10 +60,8 @@ def render(element_html, data):
 
         # Get info strings
         info_params = {'format': True, 'space_hint': space_hint}
-        with open('pl-string-input.mustache', 'r', encoding='utf-8') as f:
-            template = f.read()
-            info = chevron.render(template, info_params).strip()
-            info_params.pop('format', None)
+        info = pl.render_template('pl-string-input.mustache', info_params).strip()
+        info_params.pop('format', None)
 
         html_params = {
             'question': True,
@@ -106,8 +102,7 @@ def render(element_html, data):
             raise ValueError('method of display "%s" is not valid (must be "inline" or "block")' % display)
         if raw_submitted_answer is not None:
             html_params['raw_submitted_answer'] = escape(raw_submitted_answer)
-        with open('pl-string-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-string-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -155,14 +150,12 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-string-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-string-input.mustache', html_params).strip()
     elif data['panel'] == 'answer':
         a_tru = pl.from_json(data['correct_answers'].get(name, None))
         if a_tru is not None:
             html_params = {'answer': True, 'label': label, 'a_tru': a_tru, 'suffix': suffix}
-            with open('pl-string-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-string-input.mustache', html_params).strip()
         else:
             html = ''
     else:
@@ -172,7 +165,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     # Get allow-blank option
     allow_blank = pl.get_string_attrib(element, 'allow-blank', ALLOW_BLANK_DEFAULT)
@@ -192,7 +185,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     # Get weight
@@ -245,7 +238,7 @@ def grade(element_html, data):
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
     allow_blank = pl.get_string_attrib(element, 'allow-blank', ALLOW_BLANK_DEFAULT)
@@ -1,7 +1,5 @@
 import prairielearn as pl
-import lxml.html
 from html import escape
-import chevron
 import sympy
 import random
 import math
@@ -17,6 +15,8 @@ ALLOW_COMPLEX_DEFAULT = False
 IMAGINARY_UNIT_FOR_DISPLAY_DEFAULT = 'i'
 SIZE_DEFAULT = 35
 SHOW_HELP_TEXT_DEFAULT = True
+NUMERIC_CHECK_DEFAULT = False
+GRADING_TIMEOUT_DEFAULT = None
 PLACEHOLDER_TEXT_THRESHOLD = 15  # Minimum size to show the placeholder text
 
 
@@ -29,9 +29,9 @@ def get_variables_list(variables_string):
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = ['answers-name']
-    optional_attribs = ['weight', 'correct-answer', 'variables', 'label', 'display', 'allow-complex', 'imaginary-unit-for-display', 'size', 'show-help-text']
+    optional_attribs = ['weight', 'correct-answer', 'variables', 'label', 'display', 'allow-complex', 'imaginary-unit-for-display', 'size', 'show-help-text', 'numeric-check', 'grading-timeout']
     pl.check_attribs(element, required_attribs, optional_attribs)
     name = pl.get_string_attrib(element, 'answers-name')
 
@@ -47,7 +47,7 @@ def prepare(element_html, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     label = pl.get_string_attrib(element, 'label', LABEL_DEFAULT)
     variables_string = pl.get_string_attrib(element, 'variables', VARIABLES_DEFAULT)
@@ -71,12 +71,10 @@ def render(element_html, data):
             'constants': constants,
             'allow_complex': allow_complex,
         }
-        with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-            info = chevron.render(f, info_params).strip()
-        with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-            info_params.pop('format', None)
-            info_params['shortformat'] = True
-            shortinfo = chevron.render(f, info_params).strip()
+        info = pl.render_template('pl-symbolic-input.mustache', info_params).strip()
+        info_params.pop('format', None)
+        info_params['shortformat'] = True
+        shortinfo = pl.render_template('pl-symbolic-input.mustache', info_params).strip()
 
         html_params = {
             'question': True,
@@ -114,8 +112,7 @@ def render(element_html, data):
             raise ValueError('method of display "%s" is not valid (must be "inline" or "block")' % display)
         if raw_submitted_answer is not None:
             html_params['raw_submitted_answer'] = escape(raw_submitted_answer)
-        with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-symbolic-input.mustache', html_params).strip()
 
     elif data['panel'] == 'submission':
         parse_error = data['format_errors'].get(name, None)
@@ -147,13 +144,11 @@ def render(element_html, data):
                 'constants': constants,
                 'allow_complex': allow_complex,
             }
-            with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-                info = chevron.render(f, info_params).strip()
+            info = pl.render_template('pl-symbolic-input.mustache', info_params).strip()
 
             # Render invalid popup
             raw_submitted_answer = data['raw_submitted_answers'].get(name, None)
-            with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-                parse_error += chevron.render(f, {'format_error': True, 'format_string': info}).strip()
+            parse_error += pl.render_template('pl-symbolic-input.mustache', {'format_error': True, 'format_string': info}).strip()
 
             html_params['parse_error'] = parse_error
             if raw_submitted_answer is not None:
@@ -182,8 +177,7 @@ def render(element_html, data):
 
         html_params['error'] = html_params['parse_error'] or html_params.get('missing_input', False)
 
-        with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-symbolic-input.mustache', html_params).strip()
 
     elif data['panel'] == 'answer':
         a_tru = data['correct_answers'].get(name, None)
@@ -199,8 +193,7 @@ def render(element_html, data):
                 'label': label,
                 'a_tru': sympy.latex(a_tru)
             }
-            with open('pl-symbolic-input.mustache', 'r', encoding='utf-8') as f:
-                html = chevron.render(f, html_params).strip()
+            html = pl.render_template('pl-symbolic-input.mustache', html_params).strip()
         else:
             html = ''
 
@@ -211,7 +204,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     variables = get_variables_list(pl.get_string_attrib(element, 'variables', VARIABLES_DEFAULT))
     allow_complex = pl.get_boolean_attrib(element, 'allow-complex', ALLOW_COMPLEX_DEFAULT)
@@ -320,11 +313,13 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     variables = get_variables_list(pl.get_string_attrib(element, 'variables', VARIABLES_DEFAULT))
     allow_complex = pl.get_boolean_attrib(element, 'allow-complex', ALLOW_COMPLEX_DEFAULT)
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
+    numeric_check = pl.get_boolean_attrib(element, 'numeric-check', NUMERIC_CHECK_DEFAULT)
+    grading_timeout = pl.get_float_attrib(element, 'grading-timeout', GRADING_TIMEOUT_DEFAULT)
 
     # Get true answer (if it does not exist, create no grade - leave it
     # up to the question code)
@@ -353,16 +348,19 @@ def grade(element_html, data):
         a_sub = phs.json_to_sympy(a_sub, allow_complex=allow_complex)
 
     # Check equality
-    correct = a_tru.equals(a_sub)
+    correct = phs.is_equal(a_tru, a_sub, numeric_check=numeric_check, timeout=grading_timeout)
 
-    if correct:
+    if correct is None:
+        # the comparison took longer than grading-timeout
+        data['format_errors'][name] = 'Your answer could not be checked in the time allowed. Try writing it in a simpler form.'
+    elif correct:
         data['partial_scores'][name] = {'score': 1, 'weight': weight}
     else:
         data['partial_scores'][name] = {'score': 0, 'weight': weight}
 
 
 def test(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
     weight = pl.get_integer_attrib(element, 'weight', WEIGHT_DEFAULT)
 
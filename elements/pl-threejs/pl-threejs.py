@@ -1,6 +1,4 @@
 import prairielearn as pl
-import lxml.html
-import chevron
 import numpy as np
 import json
 import base64
@@ -26,7 +24,7 @@ GRADE_DEFAULT = True
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = [
         'answer_name',          # key for 'submitted_answers' and 'true_answers'
     ]
@@ -133,7 +131,7 @@ def get_objects(element, data):
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answer_name = pl.get_string_attrib(element, 'answer-name')
 
     uuid = pl.get_uuid()
@@ -199,8 +197,7 @@ def render(element_html, data):
             'options': json.dumps(options, allow_nan=False)
         }
 
-        with open('pl-threejs.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-threejs.mustache', html_params).strip()
     elif data['panel'] == 'submission':
         will_be_graded = pl.get_boolean_attrib(element, 'grade', GRADE_DEFAULT)
         if not will_be_graded:
@@ -252,8 +249,7 @@ def render(element_html, data):
                 except Exception:
                     raise ValueError('invalid score' + score)
 
-        with open('pl-threejs.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-threejs.mustache', html_params).strip()
     elif data['panel'] == 'answer':
         will_be_graded = pl.get_boolean_attrib(element, 'grade', GRADE_DEFAULT)
         if not will_be_graded:
@@ -310,8 +306,7 @@ def render(element_html, data):
             'options': json.dumps(options, allow_nan=False)
         }
 
-        with open('pl-threejs.mustache', 'r', encoding='utf-8') as f:
-            html = chevron.render(f, html_params).strip()
+        html = pl.render_template('pl-threejs.mustache', html_params).strip()
     else:
         raise Exception('Invalid panel type: %s' % data['panel'])
 
@@ -319,7 +314,7 @@ def render(element_html, data):
 
 
 def parse(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answer-name')
 
     # Get submitted answer or return parse_error if it does not exist
@@ -343,7 +338,7 @@ def parse(element_html, data):
 
 
 def grade(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     answer_name = pl.get_string_attrib(element, 'answer-name')
 
     # Check if this element is intended to produce a grade
@@ -1,7 +1,5 @@
 import prairielearn as pl
-import lxml.html
 import numpy as np
-import chevron
 
 
 DIGITS_DEFAULT = 2
@@ -13,14 +11,14 @@ DEFAULT_TAB_DEFAULT = 'matlab'
 
 
 def prepare(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     required_attribs = []
     optional_attribs = ['digits', 'default-tab', 'show-matlab', 'show-mathematica', 'show-python', 'show-r']
     pl.check_attribs(element, required_attribs, optional_attribs)
 
 
 def render(element_html, data):
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     digits = pl.get_integer_attrib(element, 'digits', DIGITS_DEFAULT)
     show_matlab = pl.get_boolean_attrib(element, 'show-matlab', SHOW_MATLAB_DEFAULT)
     show_mathematica = pl.get_boolean_attrib(element, 'show-mathematica', SHOW_MATHEMATICA_DEFAULT)
@@ -138,7 +136,6 @@ def render(element_html, data):
         'uuid': pl.get_uuid()
     }
 
-    with open('pl-variable-output.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-variable-output.mustache', html_params).strip()
 
     return html
@@ -1,5 +1,4 @@
 import prairielearn as pl
-import lxml.html
 import math
 
 use_pl_variable_score = False
@@ -9,7 +8,7 @@ def prepare(element_html, data):
     if not use_pl_variable_score:
         return
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     pl.check_attribs(element, required_attribs=['answers-name'], optional_attribs=[])
 
 
@@ -17,7 +16,7 @@ def render(element_html, data):
     if not use_pl_variable_score:
         return ''
 
-    element = lxml.html.fragment_fromstring(element_html)
+    element = pl.parse_element(element_html)
     name = pl.get_string_attrib(element, 'answers-name')
 
     if data['panel'] == 'answer':
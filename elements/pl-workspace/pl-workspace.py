@@ -1,4 +1,4 @@
-import chevron
+import prairielearn as pl
 
 
 def add_format_error(data, error_string):
@@ -17,8 +17,7 @@ def render(element_html, data):
 
     # Create and return html
     html_params = {'workspace_url': workspace_url}
-    with open('pl-workspace.mustache', 'r', encoding='utf-8') as f:
-        html = chevron.render(f, html_params).strip()
+    html = pl.render_template('pl-workspace.mustache', html_params).strip()
 
     return html
 
@@ -398,11 +398,17 @@ function runJob(info, callback) {
                 AttachStderr: true,
                 Tty: true,
                 NetworkDisabled: !jobEnableNetworking,
+                Env: config.referenceCacheDir ? [
+                    'PL_REFERENCE_CACHE_DIR=/grade_cache',
+                    ...(config.referenceCacheMaxMB ? [`PL_REFERENCE_CACHE_MAX_MB=${config.referenceCacheMaxMB}`] : []),
+                ] : [],
                 HostConfig: {
                     Binds: [
                         `${tempDir}:/grade`,
+                        ...(config.referenceCacheDir ? [`${config.referenceCacheDir}:/grade_cache${config.referenceCacheReadOnly ? ':ro' : ''}`] : []),
                     ],
                     Memory: 1 << 30, // 1 GiB
+                    ShmSize: 1 << 30, // same as Memory, for the python autograder's snapshots of large datasets
                     MemorySwap: 1 << 30, // same as Memory, so no access to swap
                     KernelMemory: 1 << 29, // 512 MiB
                     DiskQuota: 1 << 30, // 1 GiB
@@ -2,6 +2,8 @@
 
 from __future__ import division, print_function
 
+import os
+
 __copyright__ = "Copyright (C) 2014 Andreas Kloeckner"
 
 __license__ = """
@@ -84,7 +86,9 @@ class Feedback:
 
         Adds some text to the feedback output for the current test.
         """
-        with open("/grade/run/" + cls.feedback_file + ".txt", 'a+',
+        # SCRATCH_DIR is set when test iterations run in parallel
+        output_dir = os.environ.get("SCRATCH_DIR", "/grade/run")
+        with open(os.path.join(output_dir, cls.feedback_file + ".txt"), 'a+',
                   encoding='utf-8') as f:
             f.write(cls.buffer + text)
             f.write('\n')
@@ -5,12 +5,22 @@ import numpy as np
 import numpy.random
 import random
 import io
+import pickle
+import hashlib
+import tempfile
+import shutil
 import pl_helpers
+import pl_snapshot
 from os.path import join
 from os.path import splitext
-from types import ModuleType, FunctionType
+from types import ModuleType, FunctionType, CodeType
 from copy import deepcopy
 
+# Default size limit of the console output of the student code, see
+# BoundedOutput
+MAX_OUTPUT_BYTES = 1 << 20
+
+
 class UserCodeFailed(Exception):
     def __init__(self, err, *args):
         self.err = err
@@ -31,67 +41,415 @@ def try_read(fname):
     return contents
 
 
-def execute_code(fname_ref, fname_student, include_plt=False,
-                 console_output_fname=None, test_iter_num=0, ipynb_key="#grade"):
-    """
-    execute_code(fname_ref, fname_student)
+# When the iterations of a test suite run in parallel (see pl_main.py), the
+# main process reads and deletes the grading files once, before any student
+# code runs, and stores their contents here for execute_code() to use. The
+# files are then never on disk while student code runs.
+preloaded_files = None
 
-    Helper function for running user code.
 
-    - fname_ref: Filename for the reference (answer) code.
-    - fname_student: Filename for the submitted student answer code.
-    - include_plt: If true, plots will be included in grading results.
-    - console_output_fname: Filename to redirect console output to.
-    - test_iter_num: The iteration number of this test, when test cases are run multiple times.
+def read_grading_files(fname_ref):
+    """
+    read_grading_files(fname_ref)
 
-    Returns:
-    - ref_result: A named tuple with reference variables
-    - student_result: A named tuple with submitted student variables
-    - plot_value: Any plots made by the student
+    Returns a dict with the contents of the grading files (data.json,
+    setup_code.py, the reference code in fname_ref, leading_code.py,
+    trailing_code.py, and test.py).
     """
 
-    base_dir = os.environ.get("MERGE_DIR")
-    job_dir = os.environ.get("JOB_DIR")
     filenames_dir = os.environ.get("FILENAMES_DIR")
-
     with open(join(filenames_dir, 'data.json'), encoding='utf-8') as f:
         data = json.load(f)
     with open(join(filenames_dir, 'setup_code.py'), 'r', encoding='utf-8') as f:
         str_setup = f.read()
     with open(fname_ref, 'r', encoding='utf-8') as f:
         str_ref = f.read()
+    with open(join(filenames_dir, 'test.py'), encoding='utf-8') as f:
+        str_test = f.read()
 
-    # Read in leading, trailing code
-    str_leading = try_read(join(filenames_dir, 'leading_code.py'))
-    str_trailing = try_read(join(filenames_dir, 'trailing_code.py'))
+    return {'data': data,
+            'setup': str_setup,
+            'ref': str_ref,
+            'leading': try_read(join(filenames_dir, 'leading_code.py')),
+            'trailing': try_read(join(filenames_dir, 'trailing_code.py')),
+            'test': str_test,
+            'reference_cache': read_reference_cache_entries()}
 
-    # Read student code (and transform if necessary) and append leading/trailing code
-    with open(fname_student, 'r', encoding='utf-8') as f:
-        filename, extension = splitext(fname_student)
-        if extension == '.ipynb':
-            str_student = pl_helpers.extract_ipynb_contents(f, ipynb_key)
-        else:
-            str_student = f.read()
-    str_student = str_leading + str_student + str_trailing
 
-    with open(join(filenames_dir, 'test.py'), encoding='utf-8') as f:
-        str_test = f.read()
+def remove_grading_files(fname_ref):
+    """
+    Delete sensitive code so students can't read e.g. test cases or setup code
+    """
 
-    # Delete sensitive code so students can't read e.g. test cases or setup code
+    filenames_dir = os.environ.get("FILENAMES_DIR")
     os.remove(join(filenames_dir, 'data.json'))
     os.remove(fname_ref)
     os.remove(join(filenames_dir, 'setup_code.py'))
     os.remove(join(filenames_dir, 'leading_code.py'))
     os.remove(join(filenames_dir, 'trailing_code.py'))
     os.remove(join(filenames_dir, 'test.py'))
+    remove_reference_cache_entries()
+
+
+def restore_grading_files(fname_ref, files):
+    """
+    Replace the files deleted by remove_grading_files(), in case the tests
+    are to be run again.
+    """
+
+    filenames_dir = os.environ.get("FILENAMES_DIR")
+    with open(join(filenames_dir, 'data.json'), 'w', encoding='utf-8') as f:
+        json.dump(files['data'], f)
+    with open(fname_ref, 'w', encoding='utf-8') as f:
+        f.write(files['ref'])
+    with open(join(filenames_dir, 'setup_code.py'), 'w', encoding='utf-8') as f:
+        f.write(files['setup'])
+    if len(files['leading']) > 0:
+        with open(join(filenames_dir, 'leading_code.py'), 'w', encoding='utf-8') as f:
+            f.write(files['leading'])
+    if len(files['trailing']) > 0:
+        with open(join(filenames_dir, 'trailing_code.py'), 'w', encoding='utf-8') as f:
+            f.write(files['trailing'])
+    with open(join(filenames_dir, 'test.py'), 'w', encoding='utf-8') as f:
+        f.write(files['test'])
+    if len(files['reference_cache']) > 0:
+        os.mkdir(join(filenames_dir, REFERENCE_CACHE_DIR_NAME))
+        for (fname, contents) in files['reference_cache'].items():
+            with open(join(filenames_dir, REFERENCE_CACHE_DIR_NAME, fname), 'wb') as f:
+                f.write(contents)
+
+
+def read_data():
+    """
+    Returns the question data, from data.json or the preloaded files.
+    """
+
+    if preloaded_files is not None:
+        return deepcopy(preloaded_files['data'])
+    filenames_dir = os.environ.get("FILENAMES_DIR")
+    with open(join(filenames_dir, 'data.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def truncation_marker(omitted):
+    return '\n\n... [{} bytes of output omitted] ...\n\n'.format(omitted)
+
+
+class BoundedOutput(io.RawIOBase):
+    """
+    BoundedOutput(fname, max_bytes)
+
+    A stream for the console output of the student code, which keeps only
+    the first and last max_bytes/2 bytes of what is written, so that
+    printing in an infinite loop can fill neither the memory nor the disk.
+    The output is written to fname as it comes, with a marker in place of
+    what was omitted, so the file has the end of the output even if the
+    process is killed. Until the stream is closed, the file may have up to
+    twice as many bytes of the end of the output. Use bounded_output() to
+    get a text stream.
+    """
+
+    def __init__(self, fname, max_bytes):
+        super(BoundedOutput, self).__init__()
+        self.file = open(fname, 'wb', buffering=0)
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.head_size = 0
+        self.tail = bytearray()
+        self.total = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        size = len(b)
+        self.total += size
+        if self.head_size < self.head_bytes:
+            n = min(size, self.head_bytes - self.head_size)
+            self.file.write(b[:n])
+            self.head_size += n
+            b = b[n:]
+        if len(b) > 0:
+            self.tail += b
+            # trimming only when the tail has doubled keeps writes O(1)
+            if len(self.tail) > 2 * self.tail_bytes:
+                self._trim_tail()
+            else:
+                self.file.write(b)
+        return size
+
+    def _trim_tail(self):
+        """
+        Keeps only the last tail_bytes bytes of the tail, and writes them to
+        the file after the head and the marker.
+        """
+
+        del self.tail[:len(self.tail) - self.tail_bytes]
+        omitted = self.total - self.head_size - len(self.tail)
+        self.file.seek(self.head_size)
+        if omitted > 0:
+            self.file.write(truncation_marker(omitted).encode('utf-8'))
+        self.file.write(self.tail)
+        self.file.truncate()
+
+    def close(self):
+        if not self.closed:
+            if len(self.tail) > self.tail_bytes:
+                self._trim_tail()
+            self.file.close()
+        super(BoundedOutput, self).close()
+
+
+def bounded_output(fname, max_bytes):
+    """
+    Returns a buffered text stream that writes to a BoundedOutput.
+    """
+
+    return io.TextIOWrapper(io.BufferedWriter(BoundedOutput(fname, max_bytes)),
+                            encoding='utf-8', errors='backslashreplace')
+
+
+def read_output(fname, max_bytes):
+    """
+    Returns the contents of the output file fname, keeping only its first and
+    last max_bytes/2 bytes in the same way as BoundedOutput, if it is larger
+    than the output of a BoundedOutput can be (including one that was not
+    closed, because its process was killed).
+    """
+
+    with open(fname, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= max_bytes + (max_bytes - max_bytes // 2) + len(truncation_marker(sys.maxsize)):
+            return f.read().decode('utf-8', 'replace')
+        head_bytes = max_bytes // 2
+        tail_bytes = max_bytes - head_bytes
+        head = f.read(head_bytes)
+        f.seek(size - tail_bytes)
+        tail = f.read(tail_bytes)
+    return (head.decode('utf-8', 'ignore') + truncation_marker(size - head_bytes - tail_bytes) +
+            tail.decode('utf-8', 'ignore'))
+
+
+# The results of the reference code can be cached, so that a slow reference
+# solution (e.g., one that trains a model or runs a simulation) is only run
+# once. The cache is only ever accessed by root in run.sh. It has a
+# directory for each version of a question, named by a hash of the files of
+# the question and of the autograder, and before any code runs as the ag
+# user, run.sh copies the entries of the question into the directory
+# REFERENCE_CACHE_DIR_NAME in FILENAMES_DIR. These are then grading files
+# like ans.py, which are deleted while the student code runs. New entries
+# are written to PL_REFERENCE_CACHE_STAGING_DIR by pl_reference_cache.py,
+# which run.sh runs before any student files are in the job, and then
+# copied into the cache by root. Entries are .npz files that hold only numpy
+# arrays and JSON values, so reading one can't run code. Within a question,
+# the key of a result is a hash of the iteration number, the variables for
+# the user, and "data" without the submission. Each submission is graded
+# with a new random seed, so results are not cached if the reference code
+# uses the seeded random number generators.
+REFERENCE_CACHE_DIR_NAME = 'reference_cache'
+reference_cache_staging_dir = os.environ.get("PL_REFERENCE_CACHE_STAGING_DIR")
+
+# The parts of "data" that belong to the submission rather than the question
+SUBMISSION_KEYS = ('submitted_answers', 'raw_submitted_answers', 'format_errors',
+                   'partial_scores', 'score', 'feedback', 'gradable')
+
+
+def read_reference_cache_entries():
+    """
+    Returns the contents of the cached reference results of the job, as a
+    dict from file names to bytes.
+    """
+
+    cache_dir = join(os.environ.get("FILENAMES_DIR"), REFERENCE_CACHE_DIR_NAME)
+    entries = {}
+    if os.path.isdir(cache_dir) and not os.path.islink(cache_dir):
+        for fname in os.listdir(cache_dir):
+            with open(join(cache_dir, fname), 'rb') as f:
+                entries[fname] = f.read()
+    return entries
+
+
+def remove_reference_cache_entries():
+    """
+    Deletes the cached reference results of the job, and anything else at
+    their path.
+    """
+
+    cache_dir = join(os.environ.get("FILENAMES_DIR"), REFERENCE_CACHE_DIR_NAME)
+    if os.path.islink(cache_dir) or os.path.isfile(cache_dir):
+        os.remove(cache_dir)
+    elif os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def rng_state():
+    return (random.getstate(), np.random.get_state())
+
+
+def rng_state_equal(state1, state2):
+    (py1, np1), (py2, np2) = state1, state2
+    return py1 == py2 and all(np.array_equal(a, b) for (a, b) in zip(np1, np2))
+
+
+def code_digest(code):
+    """
+    Returns a digest of a code object, including the code that it contains.
+    """
+
+    h = hashlib.sha256(code.co_code)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            h.update(code_digest(const))
+        else:
+            h.update(repr(const).encode('utf-8'))
+    h.update(repr((code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars)).encode('utf-8'))
+    return h.digest()
+
+
+def value_digest(value):
+    """
+    Returns a digest of a variable for the reference cache key, or None if
+    it can't be hashed. Functions and classes are hashed by their code.
+    """
+
+    try:
+        if isinstance(value, FunctionType):
+            closure = [cell.cell_contents for cell in value.__closure__ or ()]
+            extra = [value_digest(v) for v in [value.__defaults__, value.__kwdefaults__] + closure]
+            if None in extra:
+                return None
+            return hashlib.sha256(code_digest(value.__code__) + b''.join(extra)).digest()
+        if isinstance(value, type):
+            h = hashlib.sha256(value.__qualname__.encode('utf-8'))
+            for base in value.__bases__:
+                h.update(base.__qualname__.encode('utf-8'))
+            for (name, attr) in sorted(vars(value).items()):
+                if name in ('__dict__', '__weakref__'):
+                    continue
+                if isinstance(attr, (staticmethod, classmethod)):
+                    attr = attr.__func__
+                elif isinstance(attr, property):
+                    attr = (attr.fget, attr.fset, attr.fdel)
+                digest = value_digest(attr)
+                if digest is None:
+                    return None
+                h.update(name.encode('utf-8') + b'\0' + digest)
+            return h.digest()
+        if isinstance(value, (tuple, list)) and any(isinstance(v, (FunctionType, type)) for v in value):
+            digests = [value_digest(v) for v in value]
+            return None if None in digests else hashlib.sha256(b''.join(digests)).digest()
+        return hashlib.sha256(pickle.dumps(value, protocol=4)).digest()
+    except Exception:
+        return None
+
+
+def reference_cache_key(data, test_iter_num, user_code):
+    """
+    Returns the cache key of the results of the reference code in iteration
+    test_iter_num, when it starts with the variables for the user in
+    user_code, or None if the results can't be cached because one of them
+    can't be hashed. The code of the question is not part of the key, as
+    the cache has a directory for each version of a question.
+    """
+
+    question_data = {i: j for (i, j) in data.items() if i not in SUBMISSION_KEYS}
+    h = hashlib.sha256()
+    h.update(json.dumps([sys.version, np.__version__, test_iter_num, question_data],
+                        sort_keys=True).encode('utf-8'))
+    for name in sorted(user_code):
+        digest = value_digest(user_code[name])
+        if digest is None:
+            return None
+        h.update(name.encode('utf-8') + b'\0' + digest)
+    return h.hexdigest()
+
+
+def is_json_value(value):
+    """
+    Returns true if value is made of JSON types only, so that it is the same
+    after a round trip through JSON.
+    """
+
+    if value is None or type(value) in (bool, int, float, str):
+        return True
+    if type(value) is list:
+        return all(is_json_value(v) for v in value)
+    if type(value) is dict:
+        return all(type(k) is str and is_json_value(v) for (k, v) in value.items())
+    return False
+
+
+def load_cached_reference(entries, key):
+    """
+    Returns the reference results for the key from the cached entries of the
+    job (see read_reference_cache_entries()), or None.
+    """
+
+    if key + '.npz' not in entries:
+        return None
+    try:
+        with np.load(io.BytesIO(entries[key + '.npz']), allow_pickle=False) as npz:
+            manifest = json.loads(npz['manifest'].item())
+            result = {}
+            for (name, (kind, value)) in manifest.items():
+                if kind == 'json':
+                    result[name] = value
+                elif kind == 'array':
+                    result[name] = npz[value]
+                else:
+                    result[name] = npz[value][()]
+            return result
+    except Exception:
+        return None
+
+
+def save_cached_reference(key, ref_result):
+    """
+    Writes the reference results for the key to the staging directory, if
+    they are all numpy arrays, numpy scalars, or JSON values.
+    """
+
+    manifest = {}
+    arrays = {}
+    for (name, value) in ref_result.items():
+        if is_json_value(value):
+            manifest[name] = ('json', value)
+        elif isinstance(value, (np.ndarray, np.generic)) and type(value) is not np.matrix \
+                and not value.dtype.hasobject:
+            array_name = 'a{:d}'.format(len(arrays))
+            arrays[array_name] = np.asarray(value)
+            manifest[name] = ('array' if isinstance(value, np.ndarray) else 'scalar', array_name)
+        else:
+            return
+    try:
+        (fd, tmp_path) = tempfile.mkstemp(dir=reference_cache_staging_dir, suffix='.npz')
+        with open(fd, 'wb') as f:
+            np.savez(f, manifest=np.array(json.dumps(manifest)), **arrays)
+        os.replace(tmp_path, join(reference_cache_staging_dir, key + '.npz'))
+    except Exception:
+        pass
+
+
+def run_setup_and_reference(files, test_iter_num, seed):
+    """
+    Runs the setup code and then the reference code (or takes its results
+    from the cache) with the given random seed.
+
+    Returns:
+    - setup_code: The namespace of the setup code
+    - ref_code: The namespace of the reference code
+    - snapshots: The pl_snapshot.Snapshots of the variables for the user
+    - repeated_setup_name: The code that repeats the setup
+    """
+
+    data = files['data']
+    str_setup = files['setup']
+    str_ref = files['ref']
 
     repeated_setup_name = 'repeated_setup()'
     if repeated_setup_name not in str_setup:
         repeated_setup_name = 'pass'
 
-    # Seed student code and answer code with same seed
-    seed = random.randint(0, (2 ** 32) - 1)
-
     setup_code = {'test_iter_num': test_iter_num, 'data': data}
     # make all the variables in setup_code.py available to ans.py
     exec(str_setup, setup_code)
@@ -101,23 +459,104 @@ def execute_code(fname_ref, fname_student, include_plt=False,
     for variable in data['params']['names_for_user']:
         names_for_user.append(variable['name'])
 
-    # Make copies of variables that go to the user so we do not clobber them
+    # Make copies of variables that go to the user so we do not clobber them.
+    # Large arrays and DataFrames are copy-on-write snapshots (see
+    # pl_snapshot.py) that are shared with the copies for the student code.
+    snapshots = pl_snapshot.Snapshots()
     ref_code = {}
     for i, j in setup_code.items():
         if (not (i=='__builtins__' or isinstance(j, ModuleType))) and \
           (i in names_for_user):
             ref_code[i] = j
-    ref_code = deepcopy(ref_code)
+    ref_code = snapshots.deepcopy(ref_code)
 
     # Add any other variables to reference namespace and do not copy
     for i,j in setup_code.items():
         if not (i=='__builtins__' or isinstance(j, ModuleType) or
                 i in names_for_user):
             ref_code[i] = j
+
+    cache_key = None
+    cached_result = None
+    if len(files['reference_cache']) > 0 or reference_cache_staging_dir:
+        cache_key = reference_cache_key(data, test_iter_num,
+                                        {i: j for (i, j) in ref_code.items() if i in names_for_user})
+        if cache_key is not None:
+            cached_result = load_cached_reference(files['reference_cache'], cache_key)
+
     set_random_seed(seed)
-    exec(str_ref, ref_code)
+    if cached_result is not None:
+        # the cache does not contain "data", which is shared with setup_code,
+        # nor the functions and classes of the setup code
+        ref_code.update(cached_result)
+    else:
+        seeded_state = rng_state()
+        setup_ref_code = dict(ref_code)
+        exec(str_ref, ref_code)
+        # results that depend on the seed can't be shared with other submissions
+        if cache_key is not None and reference_cache_staging_dir and rng_state_equal(seeded_state, rng_state()):
+            save_cached_reference(cache_key, {i: j for (i, j) in ref_code.items()
+                                              if not (i.startswith('_') or i == 'data' or isinstance(j, ModuleType) or
+                                                      (isinstance(j, (FunctionType, type)) and setup_ref_code.get(i) is j))})
     # ref_code contains the correct answers
 
+    return setup_code, ref_code, snapshots, repeated_setup_name
+
+
+def execute_code(fname_ref, fname_student, include_plt=False,
+                 console_output_fname=None, test_iter_num=0, ipynb_key="#grade",
+                 max_output_bytes=MAX_OUTPUT_BYTES):
+    """
+    execute_code(fname_ref, fname_student)
+
+    Helper function for running user code.
+
+    - fname_ref: Filename for the reference (answer) code.
+    - fname_student: Filename for the submitted student answer code.
+    - include_plt: If true, plots will be included in grading results.
+    - console_output_fname: Filename to redirect console output to.
+    - test_iter_num: The iteration number of this test, when test cases are run multiple times.
+    - max_output_bytes: The maximum size of the console output, only its beginning and end are kept.
+
+    Returns:
+    - ref_result: A named tuple with reference variables
+    - student_result: A named tuple with submitted student variables
+    - plot_value: Any plots made by the student
+    """
+
+    base_dir = os.environ.get("MERGE_DIR")
+    job_dir = os.environ.get("JOB_DIR")
+    filenames_dir = os.environ.get("FILENAMES_DIR")
+
+    if preloaded_files is not None:
+        # iterations in the same worker process share preloaded_files, so
+        # each gets its own "data" that setup and student code can change
+        files = dict(preloaded_files, data=deepcopy(preloaded_files['data']))
+    else:
+        files = read_grading_files(fname_ref)
+    data = files['data']
+
+    # Read in leading, trailing code
+    str_leading = files['leading']
+    str_trailing = files['trailing']
+
+    # Read student code (and transform if necessary) and append leading/trailing code
+    with open(fname_student, 'r', encoding='utf-8') as f:
+        filename, extension = splitext(fname_student)
+        if extension == '.ipynb':
+            str_student = pl_helpers.extract_ipynb_contents(f, ipynb_key)
+        else:
+            str_student = f.read()
+    str_student = str_leading + str_student + str_trailing
+
+    if preloaded_files is None:
+        remove_grading_files(fname_ref)
+
+    # Seed student code and answer code with same seed
+    seed = random.randint(0, (2 ** 32) - 1)
+
+    setup_code, ref_code, snapshots, repeated_setup_name = run_setup_and_reference(files, test_iter_num, seed)
+
     if include_plt:
         for i, j in ref_code.items():
             if isinstance(j, ModuleType):
@@ -125,6 +564,7 @@ def execute_code(fname_ref, fname_student, include_plt=False,
                     j.close('all')
 
     # make only the variables listed in names_for_user available to student
+    names_for_user = [variable['name'] for variable in data['params']['names_for_user']]
     names_from_user = []
     for variable in data['params']['names_from_user']:
         names_from_user.append(variable['name'])
@@ -135,12 +575,16 @@ def execute_code(fname_ref, fname_student, include_plt=False,
     for i,j in setup_code.items():
         if (not (i=='__builtins__' or isinstance(j, ModuleType))) and (i in names_for_user):
             student_code[i] = j
-    student_code = deepcopy(student_code)
+    # repeated_setup() may modify the arrays in place, so they must be
+    # snapshotted again
+    student_code = snapshots.deepcopy(student_code, reuse=(repeated_setup_name == 'pass'))
 
     ## Execute student code
     previous_stdout = sys.stdout
+    console_output = None
     if console_output_fname:
-        sys.stdout = open(console_output_fname, 'w', encoding='utf-8')
+        console_output = bounded_output(console_output_fname, max_output_bytes)
+        sys.stdout = console_output
 
     set_random_seed(seed)
 
@@ -150,28 +594,17 @@ def execute_code(fname_ref, fname_student, include_plt=False,
     except Exception:
         err = sys.exc_info()
 
+    # Redirect stdout back to normal
+    if console_output is not None:
+        console_output.close()
+    sys.stdout = previous_stdout
+
     # Now that user code has been run, replace deleted files in case we are to run the tests again.
-    with open(join(filenames_dir, 'data.json'), 'w', encoding='utf-8') as f:
-        json.dump(data, f)
-    with open(fname_ref, 'w', encoding='utf-8') as f:
-        f.write(str_ref)
-    with open(join(filenames_dir, 'setup_code.py'), 'w', encoding='utf-8') as f:
-        f.write(str_setup)
-    if len(str_leading) > 0:
-        with open(join(filenames_dir, 'leading_code.py'), 'w', encoding='utf-8') as f:
-            f.write(str_leading)
-    if len(str_trailing) > 0:
-        with open(join(filenames_dir, 'trailing_code.py'), 'w', encoding='utf-8') as f:
-            f.write(str_trailing)
-    with open(join(filenames_dir, 'test.py'), 'w', encoding='utf-8') as f:
-        f.write(str_test)
+    if preloaded_files is None:
+        restore_grading_files(fname_ref, files)
     if err is not None:
         raise UserCodeFailed(err)
 
-    # Redirect stdout back to normal
-    sys.stdout.flush()
-    sys.stdout = previous_stdout
-
     ref_result = {}
     for i,j in ref_code.items():
         if not (i.startswith('_') or isinstance(j, ModuleType)):
@@ -2,15 +2,9 @@ import io
 import urllib
 import base64
 import os
-import pygments
 from os.path import join, splitext
 from functools import wraps
 from code_feedback import Feedback
-from pygments.lexers import PythonLexer
-from pygments.formatters import Terminal256Formatter
-from IPython import get_ipython
-from nbformat import read
-from IPython.core.interactiveshell import InteractiveShell
 
 
 class DoNotRun(Exception):
@@ -23,6 +17,11 @@ def extract_ipynb_contents(f, ipynb_key):
     delimiter
     """
 
+    # IPython and nbformat take most of a second to import, which every
+    # grading job would pay, so they are only imported for notebooks
+    from nbformat import read
+    from IPython.core.interactiveshell import InteractiveShell
+
     nb = read(f, 4)
     shell = InteractiveShell.instance()
     content = ''
@@ -38,7 +37,7 @@ def save_plot(plt, iternum=0):
     """
     Save plot(s) to files as png images.
     """
-    base_dir = os.environ.get("MERGE_DIR")
+    base_dir = os.environ.get("SCRATCH_DIR", os.environ.get("MERGE_DIR"))
 
     for i in plt.get_fignums():
         plt.figure(i)
@@ -110,6 +109,9 @@ def print_student_code(st_code='user_code.py', ipynb_key='#grade', as_feedback=T
             contents = '\n'.join(lines)
         else:
             contents = f.read().strip()
+        import pygments
+        from pygments.lexers import PythonLexer
+        from pygments.formatters import Terminal256Formatter
         formatted = pygments.highlight(contents, PythonLexer(), Terminal256Formatter(style='monokai'))
         if as_feedback:
             Feedback.add_feedback(formatted)
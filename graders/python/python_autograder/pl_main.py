@@ -3,9 +3,15 @@ import json
 import traceback
 import os
 import sys
+import shutil
+import glob
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from os.path import join
 from collections import defaultdict
 from pl_result import PLTestResult
+import pl_execute
 
 
 """
@@ -15,6 +21,10 @@ Loads and executes test cases.
 
 OUTPUT_FILE = 'output-fname.txt'
 
+ITERATION_FAILED_MESSAGE = ('The grading process of one of the runs of the tests exited\n'
+                            'unexpectedly, for example because your code exited or used\n'
+                            'too much memory. The runs after it were not graded.\n')
+
 def add_files(results):
     base_dir = os.environ.get("MERGE_DIR")
 
@@ -36,6 +46,103 @@ def add_files(results):
             os.remove(feedback_fname)
 
 
+def run_iteration(test_case, scratch_root, iter_num):
+    """
+    Runs one iteration of the test suite in a worker process, with its own
+    random seed and with its output files (feedback, console output, and
+    plots) written to a new scratch directory in scratch_root. Returns the
+    scratch directory and the results, gradability, and format errors of the
+    iteration.
+    """
+    scratch_dir = tempfile.mkdtemp(prefix=f'iteration_{iter_num}_', dir=scratch_root)
+    os.environ['SCRATCH_DIR'] = scratch_dir
+    pl_execute.set_random_seed()
+
+    test_case.iter_num = iter_num
+    suite = TestLoader().loadTestsFromTestCase(test_case)
+    result = PLTestResult()
+    suite.run(result)
+    return scratch_dir, result.getResults(), result.getGradable(), result.format_errors
+
+
+def merge_iteration_files(scratch_dir):
+    """
+    Moves the output files of an iteration run by run_iteration() to
+    MERGE_DIR, as if the iteration had been run in the main process.
+    Feedback is appended to the feedback of the previous iterations, while
+    the console output replaces it.
+    """
+    base_dir = os.environ.get("MERGE_DIR")
+    for fname in sorted(os.listdir(scratch_dir)):
+        src = join(scratch_dir, fname)
+        if fname.startswith('feedback_'):
+            with open(src, 'r', encoding='utf-8') as f_in, \
+                 open(join(base_dir, fname), 'a', encoding='utf-8') as f_out:
+                f_out.write(f_in.read())
+        else:
+            shutil.move(src, join(base_dir, fname))
+    shutil.rmtree(scratch_dir)
+
+
+def failed_iteration_results():
+    """
+    Returns the results of an iteration whose worker process died, and adds
+    a message about it to the feedback.
+    """
+    base_dir = os.environ.get("MERGE_DIR")
+    with open(join(base_dir, 'feedback_error.txt'), 'a', encoding='utf-8') as f:
+        f.write(ITERATION_FAILED_MESSAGE)
+    return [{'name': 'The grading process exited unexpectedly',
+             'filename': 'error',
+             'max_points': 1,
+             'points': 0}]
+
+
+def run_parallel_iterations(test_case):
+    """
+    Runs the iterations of the test suite in up to test_case.parallel_iters
+    worker processes and returns their results, gradability, and format
+    errors in order. Stops at the first iteration that is not gradable, as
+    the serial loop does.
+    """
+    # Read and delete the grading files before any student code runs, so
+    # that they are never on disk while an iteration is running
+    fname_ref = join(os.environ.get("FILENAMES_DIR"), 'ans.py')
+    pl_execute.preloaded_files = pl_execute.read_grading_files(fname_ref)
+    pl_execute.remove_grading_files(fname_ref)
+
+    iterations = []
+    scratch_root = tempfile.mkdtemp(prefix='iterations_', dir=os.environ.get("MERGE_DIR"))
+    processes = min(test_case.parallel_iters, test_case.total_iters)
+    # the worker processes are forked, so that they have the grading files
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(run_iteration, test_case, scratch_root, i) for i in range(test_case.total_iters)]
+        try:
+            for (iter_num, future) in enumerate(futures):
+                try:
+                    (scratch_dir, results, gradable, format_errors) = future.result()
+                except BrokenProcessPool:
+                    # a worker process died, so this and all later iterations
+                    # fail, but the output of the student code up to then is kept
+                    for scratch_dir in glob.glob(join(scratch_root, f'iteration_{iter_num}_*')):
+                        merge_iteration_files(scratch_dir)
+                    iterations.append((failed_iteration_results(), True, []))
+                    break
+                merge_iteration_files(scratch_dir)
+                iterations.append((results, gradable, format_errors))
+                if not gradable:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+    # this also removes the output of any iterations after a non-gradable one
+    shutil.rmtree(scratch_root, ignore_errors=True)
+
+    pl_execute.restore_grading_files(fname_ref, pl_execute.preloaded_files)
+    pl_execute.preloaded_files = None
+    return iterations
+
+
 if __name__ == '__main__':
     try:
         from filenames.test import Test as test_case
@@ -59,15 +166,22 @@ if __name__ == '__main__':
         all_results = []
         format_errors = []
         gradable = True
-        for i in range(test_case.total_iters):
-            suite = loader.loadTestsFromTestCase(test_case)
-            result = PLTestResult()
-            suite.run(result)
-            all_results.append(result.getResults())
-            if not result.getGradable():
-                gradable = False
-                format_errors = result.format_errors
-                break
+        if test_case.parallel_iters > 1 and test_case.total_iters > 1:
+            for (results, iter_gradable, iter_format_errors) in run_parallel_iterations(test_case):
+                all_results.append(results)
+                if not iter_gradable:
+                    gradable = False
+                    format_errors = iter_format_errors
+        else:
+            for i in range(test_case.total_iters):
+                suite = loader.loadTestsFromTestCase(test_case)
+                result = PLTestResult()
+                suite.run(result)
+                all_results.append(result.getResults())
+                if not result.getGradable():
+                    gradable = False
+                    format_errors = result.format_errors
+                    break
 
         # Change back to previous directory
         os.chdir(prev_wd)
@@ -97,8 +211,8 @@ if __name__ == '__main__':
 
         text_output = ""
         if os.path.exists(join(base_dir, "output.txt")):
-            with open(join(base_dir, "output.txt"), 'r', encoding='utf-8') as content_file:
-                 text_output = content_file.read()
+            # the student code may have written to the file itself
+            text_output = pl_execute.read_output(join(base_dir, "output.txt"), test_case.max_output_bytes)
             os.remove(join(base_dir, "output.txt"))
 
         # Assemble final grading results
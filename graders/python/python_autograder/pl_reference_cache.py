@@ -0,0 +1,33 @@
+import os
+import sys
+import random
+import traceback
+from os.path import join
+import pl_execute
+
+
+"""
+Fills the reference solution cache (see pl_execute.py) for a version of a
+question. run.sh runs this as the ag user before the student files are
+added to the first job of the version, so that only the code of the
+question can write cache entries. The entries are written to
+PL_REFERENCE_CACHE_STAGING_DIR, from which run.sh copies them into the
+cache as root.
+"""
+
+if __name__ == '__main__':
+    try:
+        base_dir = os.environ.get("MERGE_DIR")
+        filenames_dir = os.environ.get("FILENAMES_DIR")
+        os.chdir(base_dir)
+        sys.path.insert(0, base_dir)
+        from filenames.test import Test as test_case
+
+        files = pl_execute.read_grading_files(join(filenames_dir, 'ans.py'))
+        for i in range(test_case.total_iters):
+            pl_execute.set_random_seed()
+            pl_execute.run_setup_and_reference(files, i, random.randint(0, (2 ** 32) - 1))
+    except Exception:
+        # grading runs the reference solution itself if it is not cached
+        print('[reference cache] could not run the reference solution:', file=sys.stderr)
+        traceback.print_exc()
@@ -0,0 +1,159 @@
+import os
+import sys
+import copy
+import mmap
+import tempfile
+import numpy as np
+from types import ModuleType, FunctionType
+
+# Arrays (and DataFrames) smaller than this are deep copied as usual
+SNAPSHOT_MIN_BYTES = int(os.environ.get("PL_SNAPSHOT_MIN_BYTES", 1 << 20))
+
+# Snapshots are written to this directory if it has space for them, and to
+# the default temporary directory otherwise. In docker, /dev/shm has only
+# 64 MB unless the container is created with a larger ShmSize.
+SHM_DIR = '/dev/shm'
+
+
+def write_backing_file(arr):
+    """
+    Returns a temporary file with the data of arr in memory order, in
+    SHM_DIR if it has space for it and on disk otherwise. Raises OSError if
+    neither has space.
+    """
+
+    tmp_dirs = [None]
+    try:
+        stat = os.statvfs(SHM_DIR)
+        if stat.f_bavail * stat.f_frsize > arr.nbytes:
+            tmp_dirs.insert(0, SHM_DIR)
+    except OSError:
+        pass
+    for (i, tmp_dir) in enumerate(tmp_dirs):
+        f = tempfile.TemporaryFile(dir=tmp_dir)
+        try:
+            # writes the data without a temporary copy
+            (arr if arr.flags.c_contiguous else arr.T).tofile(f)
+            f.flush()
+            return f
+        except OSError:
+            f.close()
+            if i == len(tmp_dirs) - 1:
+                raise
+
+
+class Snapshot:
+    """
+    Snapshot(original, arr)
+
+    The data of a large numpy array or DataFrame (original), whose values
+    are arr, written once to a file. A deep copy of a snapshot is a writable
+    copy-on-write memory map of the file, with the type of the original, so
+    only the pages that are modified use additional memory.
+    """
+
+    def __init__(self, original, arr):
+        self.original = original
+        self.order = 'C' if arr.flags.c_contiguous else 'F'
+        self.shape = arr.shape
+        self.dtype = arr.dtype
+        self.file = write_backing_file(arr)
+
+    def __deepcopy__(self, memo):
+        buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+        arr = np.ndarray(self.shape, dtype=self.dtype, buffer=buf, order=self.order)
+        if isinstance(self.original, np.ndarray):
+            return arr
+        pandas = sys.modules["pandas"]
+        df = self.original
+        result = pandas.DataFrame(arr, copy=False,
+                                  index=copy.deepcopy(df.index, memo),
+                                  columns=copy.deepcopy(df.columns, memo))
+        result.attrs = copy.deepcopy(df.attrs, memo)
+        return result
+
+
+class Snapshots:
+    """
+    Snapshots()
+
+    Deep copies of namespaces, in which large numpy arrays and DataFrames
+    are not copied but become copy-on-write snapshots of their data (see
+    Snapshot), which are shared by all of the copies of the same array. The
+    reference and the student code each get a writable, isolated copy of a
+    large dataset for the cost of a single copy.
+
+    Only arrays whose data is a single contiguous block without python
+    objects are snapshotted, as well as DataFrames with a single such dtype,
+    and only if they are in the namespace, in a list, tuple, or dict, or an
+    attribute of an object in it that does not define __deepcopy__().
+    Everything else is copied with deepcopy(), which is given the copies of
+    the snapshotted arrays in its memo, so that shared references are kept.
+    """
+
+    def __init__(self, min_bytes=SNAPSHOT_MIN_BYTES):
+        self.min_bytes = min_bytes
+        # id of the original object -> Snapshot
+        self.backing = {}
+
+    def deepcopy(self, value, reuse=True):
+        """
+        deepcopy(value, reuse=True)
+
+        Returns a deep copy of value. If reuse is false, arrays are written
+        to new files even if they were snapshotted before, which is needed if
+        they may have been modified in place since then.
+        """
+
+        if not reuse:
+            self.backing = {}
+        memo = {}
+        for obj in self._find_large(value):
+            if id(obj) not in self.backing:
+                try:
+                    self.backing[id(obj)] = Snapshot(obj, obj if isinstance(obj, np.ndarray) else obj.to_numpy())
+                except OSError:
+                    # no space for the snapshot, so obj is deep copied
+                    continue
+            memo[id(obj)] = copy.deepcopy(self.backing[id(obj)], memo)
+        return copy.deepcopy(value, memo)
+
+    def _mappable(self, arr):
+        return (arr.nbytes >= self.min_bytes and not arr.dtype.hasobject and
+                (arr.flags.c_contiguous or arr.flags.f_contiguous))
+
+    def _is_large(self, obj):
+        if isinstance(obj, np.ndarray):
+            return type(obj) is np.ndarray and self._mappable(obj)
+        pandas = sys.modules.get("pandas")
+        if pandas is None or type(obj) is not pandas.DataFrame:
+            return False
+        dtypes = set(obj.dtypes)
+        if len(dtypes) != 1 or not isinstance(dtypes.pop(), np.dtype):
+            return False
+        return self._mappable(obj.to_numpy())
+
+    def _find_large(self, value):
+        """
+        Returns the arrays and DataFrames in value that are snapshotted.
+        """
+
+        found = []
+        seen = set()
+        stack = [value]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if self._is_large(obj):
+                found.append(obj)
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+            elif isinstance(obj, dict):
+                stack.extend(obj.values())
+            elif not isinstance(obj, (type, ModuleType, FunctionType)) and \
+                    not hasattr(type(obj), '__deepcopy__') and isinstance(getattr(obj, '__dict__', None), dict):
+                # objects that copy themselves don't use the memo
+                stack.extend(vars(obj).values())
+        return found
@@ -5,7 +5,7 @@ from os.path import join
 from types import FunctionType
 from collections import namedtuple
 from pl_helpers import (points, name, save_plot, not_repeated)
-from pl_execute import execute_code
+from pl_execute import execute_code, read_data, MAX_OUTPUT_BYTES
 from code_feedback import Feedback
 
 
@@ -26,6 +26,8 @@ class PLTestCase(unittest.TestCase):
     student_code_file = 'user_code.py'
     iter_num = 0
     total_iters = 1
+    parallel_iters = 1
+    max_output_bytes = MAX_OUTPUT_BYTES
     ipynb_key = '#grade'
 
     @classmethod
@@ -37,19 +39,20 @@ class PLTestCase(unittest.TestCase):
         base_dir = os.environ.get("MERGE_DIR")
         job_dir = os.environ.get("JOB_DIR")
         filenames_dir = os.environ.get("FILENAMES_DIR")
+        # output files go to a separate directory when iterations run in parallel
+        output_dir = os.environ.get("SCRATCH_DIR", base_dir)
         self.student_code_abs_path = join(base_dir, self.student_code_file)
 
         # Load data so that we can use it in the test cases
-        filenames_dir = os.environ.get("FILENAMES_DIR")
-        with open(join(filenames_dir, 'data.json'), encoding='utf-8') as f:
-            self.data = json.load(f)
+        self.data = read_data()
 
         ref_result, student_result, plot_value = execute_code(join(filenames_dir, 'ans.py'),
                                                               join(base_dir, self.student_code_file),
                                                               self.include_plt,
-                                                              join(base_dir, 'output.txt'),
+                                                              join(output_dir, 'output.txt'),
                                                               self.iter_num,
-                                                              self.ipynb_key)
+                                                              self.ipynb_key,
+                                                              self.max_output_bytes)
         answerTuple = namedtuple('answerTuple', ref_result.keys())
         self.ref = answerTuple(**ref_result)
         studentTuple = namedtuple('studentTuple', student_result.keys())
@@ -22,13 +22,19 @@ OUT_DIR=$JOB_DIR'/results'
 # where we will copy everything
 export MERGE_DIR=$JOB_DIR'/run'
 
+# the version of the question in the reference solution cache (see below),
+# which is a hash of the files of the question and of the autograder
+if [[ -n "$PL_REFERENCE_CACHE_DIR" ]]; then
+  QUESTION_DIGEST=`cd $JOB_DIR && find $AG_DIR tests serverFilesCourse -type f -print0 2>/dev/null | sort -z | xargs -0 sha256sum | sha256sum | cut -c1-64`
+fi
+
 # now set up the stuff so that our run.sh can work
 mkdir $MERGE_DIR
 mkdir $OUT_DIR
 
-mv $STUDENT_DIR/* $MERGE_DIR
 mv $AG_DIR/* $MERGE_DIR
 mv $TEST_DIR/* $MERGE_DIR
+# the student files are added after the reference solution cache is filled (see below)
 
 # user does not need a copy of this script
 rm -f "$MERGE_DIR/run.sh"
@@ -54,6 +60,74 @@ if [[ -f "$MERGE_DIR/trailing_code.py" ]]; then
     mv $MERGE_DIR/trailing_code.py $FILENAMES_DIR
 fi
 
+##########################
+# REFERENCE CACHE
+##########################
+
+# The reference solution cache (see pl_execute.py) is only accessed by root.
+# It has a directory for each version of a question, whose entries are
+# copied to the job before any code runs as the ag user, and are then
+# deleted like the other grading files while the student code runs. If the
+# cache is writable and the question has no directory yet, it is filled
+# before the student files are added, so that only the code of the
+# question writes to it. The ag user writes the entries to a staging
+# directory, and root copies them to the cache.
+if [[ -n "$PL_REFERENCE_CACHE_DIR" && -d "$PL_REFERENCE_CACHE_DIR" ]]; then
+  QUESTION_CACHE_DIR="$PL_REFERENCE_CACHE_DIR/$QUESTION_DIGEST"
+  if [[ -w "$PL_REFERENCE_CACHE_DIR" ]]; then
+    chown root:root "$PL_REFERENCE_CACHE_DIR"
+    chmod 700 "$PL_REFERENCE_CACHE_DIR"
+  fi
+  if su -c "test -r $PL_REFERENCE_CACHE_DIR -o -x $PL_REFERENCE_CACHE_DIR" ag; then
+    echo "[run] not using the reference solution cache, which the ag user can read"
+  else
+    if [[ -w "$PL_REFERENCE_CACHE_DIR" && ! -f "$QUESTION_CACHE_DIR/.filled" ]]; then
+      STAGING_DIR=`mktemp -d`
+      chown ag "$STAGING_DIR"
+      su -c "PL_REFERENCE_CACHE_STAGING_DIR=$STAGING_DIR python3 $MERGE_DIR/pl_reference_cache.py" ag
+      mkdir -p "$QUESTION_CACHE_DIR"
+      for ENTRY in "$STAGING_DIR"/*.npz; do
+        NAME=`basename "$ENTRY"`
+        if [[ -f "$ENTRY" && ! -L "$ENTRY" && "$NAME" =~ ^[0-9a-f]{64}\.npz$ ]]; then
+          install -m 600 -o root -g root "$ENTRY" "$QUESTION_CACHE_DIR/.$NAME.tmp"
+          mv "$QUESTION_CACHE_DIR/.$NAME.tmp" "$QUESTION_CACHE_DIR/$NAME"
+        fi
+      done
+      rm -rf "$STAGING_DIR"
+      touch "$QUESTION_CACHE_DIR/.filled"
+
+      # remove the least recently used questions while the cache is too large
+      if [[ -n "$PL_REFERENCE_CACHE_MAX_MB" ]]; then
+        for DIR in `ls -d -t -r "$PL_REFERENCE_CACHE_DIR"/*/`; do
+          if (( `du -s -m "$PL_REFERENCE_CACHE_DIR" | cut -f1` <= PL_REFERENCE_CACHE_MAX_MB )); then
+            break
+          fi
+          if [[ "$DIR" != "$QUESTION_CACHE_DIR/" ]]; then
+            rm -rf "$DIR"
+          fi
+        done
+      fi
+    fi
+    if [[ -d "$QUESTION_CACHE_DIR" ]]; then
+      # the modification time of the directory is its last use
+      if [[ -w "$PL_REFERENCE_CACHE_DIR" ]]; then
+        touch "$QUESTION_CACHE_DIR"
+      fi
+      mkdir "$FILENAMES_DIR/reference_cache"
+      for ENTRY in "$QUESTION_CACHE_DIR"/*.npz; do
+        if [[ -f "$ENTRY" ]]; then
+          cp "$ENTRY" "$FILENAMES_DIR/reference_cache"
+        fi
+      done
+      chown -R ag "$FILENAMES_DIR/reference_cache"
+    fi
+  fi
+fi
+
+# files of the student can't replace any of the files above
+chmod -R 755 $STUDENT_DIR
+mv -n $STUDENT_DIR/* $MERGE_DIR
+
 ##########################
 # RUN
 ##########################
@@ -1,5 +1,6 @@
 const ERR = require('async-stacktrace');
 const _ = require('lodash');
+const fs = require('fs');
 const path = require('path');
 const child_process = require('child_process');
 const { v4: uuidv4 } = require('uuid');
@@ -8,6 +9,8 @@ const debug = require('debug')('prairielearn:' + path.basename(__filename, '.js'
 const config = require('./config');
 const logger = require('./logger');
 const load = require('./load');
+const jsonDelta = require('./json-delta');
+const pythonTiming = require('./python-timing');
 
 const activeCallers = {};
 
@@ -17,6 +20,53 @@ const IN_CALL = Symbol('IN_CALL');
 const EXITING = Symbol('EXITING');
 const EXITED  = Symbol('EXITED');
 
+/**
+ * Returns the contents of a file() return value that the worker passed
+ * through a file in config.pythonSharedDir (see python_helper_shared.py)
+ * and deletes the file. Only files whose names start with prefix (that of
+ * the worker) are read.
+ */
+function readSharedFile(file, prefix) {
+    // only read and delete files that the worker could have created
+    const sharedDir = path.resolve(config.pythonSharedDir || '');
+    const filePath = path.resolve(String(file.path));
+    if (!config.pythonSharedDir || path.dirname(filePath) != sharedDir || !path.basename(filePath).startsWith(prefix)) {
+        throw new Error(`invalid shared file path: ${file.path}`);
+    }
+    let fd = null;
+    try {
+        // don't follow a symlink that something else put in its place
+        fd = fs.openSync(filePath, fs.constants.O_RDONLY | fs.constants.O_NOFOLLOW);
+        if (!fs.fstatSync(fd).isFile()) throw new Error(`not a regular file: ${filePath}`);
+        const buf = fs.readFileSync(fd);
+        if (buf.length != file.size) throw new Error(`expected ${file.size} bytes but read ${buf.length} from ${filePath}`);
+        return buf;
+    } finally {
+        if (fd != null) fs.closeSync(fd);
+        fs.unlink(filePath, (err) => {
+            if (err && err.code != 'ENOENT') logger.error(`Error deleting PythonCaller shared file: ${err}`);
+        });
+    }
+}
+
+/**
+ * Deletes the files in config.pythonSharedDir whose names start with
+ * prefix, which a worker that exited may have left behind (e.g., if it was
+ * killed after writing a file but before the file was read).
+ */
+function removeSharedFiles(prefix) {
+    if (!config.pythonSharedDir) return;
+    fs.readdir(config.pythonSharedDir, (err, names) => {
+        if (err) return logger.error(`Error listing PythonCaller shared files: ${err}`);
+        for (const name of names) {
+            if (!name.startsWith(prefix)) continue;
+            fs.unlink(path.join(config.pythonSharedDir, name), (err) => {
+                if (err && err.code != 'ENOENT') logger.error(`Error deleting PythonCaller shared file: ${err}`);
+            });
+        }
+    });
+}
+
 class FunctionMissingError extends Error {
   constructor(message) {
     super(message);
@@ -40,9 +90,28 @@ class FunctionMissingError extends Error {
   call(file, fcn, args, options, callback): run file.fcn(args)
     callback should take (err, data, output):
       err is an Error() or null
-      data is the returned value from the function
+      data is the returned value from the function (for file(), either
+        a base64 string or a Buffer if the value was passed through
+        config.pythonSharedDir)
       output is a string containing STDOUT and STDERR together
 
+  callBatch(fcn, calls, data, options, callback): run fcn(element_html, data)
+    for each of the element calls in order, threading data through them
+    in a single round trip. Each call is an object {file, cwd, paths,
+    element_html, extensions}. Only phases that modify data (not render or
+    file) can be batched.
+    With options.steps, the worker also returns the change that each call
+    made to data, which costs a full copy of data after each call.
+    callback is the same as for call(), except that the returned value is
+    an object {data, failed, steps}:
+      data is the final data (which the worker returns as a delta, see
+        json-delta.js)
+      failed is the index of the call that raised an exception (the
+        calls after it were not made, and the traceback is in output),
+        or null
+      steps is the list of changes that each call made to data, as
+        deltas, or undefined without options.steps
+
   restart(): restart the child process to clear out any stale state
 
   done(): clean up the running python process (if any)
@@ -118,6 +187,11 @@ class PythonCaller {
         // for error logging
         this.lastCallData = null;
 
+        // for config.pythonDeltaData, the "data" argument of the current
+        // call and the "data" that the worker holds from the last call
+        this.sentData = null;
+        this.lastData = null;
+
         this.state = CREATED;
         this._checkState();
 
@@ -142,6 +216,30 @@ class PythonCaller {
             cwd: localOptions.cwd,
             paths: localOptions.paths,
         };
+        if (localOptions.batch) callData.batch = true;
+        if (localOptions.batch && localOptions.steps) callData.steps = true;
+        if (config.pythonCallTiming) callData.timing = true;
+        if (config.pythonProfileFraction > 0 && localOptions.profileTag) callData.profile_tag = localOptions.profileTag;
+        if (config.useWorkers && (config.pythonDeltaData || localOptions.batch)) {
+            // send the "data" argument (the last object argument) as a
+            // delta against the "data" of the previous call, and ask for
+            // modified "data" to be returned as a delta as well (a batch
+            // always returns a delta, as it usually changes little of a
+            // large "data")
+            const dataIndex = _.findLastIndex(args, _.isPlainObject);
+            if (dataIndex >= 0) {
+                // the same values as the worker gets from JSON, without
+                // undefined ones, which a delta could not represent
+                this.sentData = JSON.parse(JSON.stringify(args[dataIndex]));
+                callData.data_index = dataIndex;
+                callData.delta = true;
+                if (config.pythonDeltaData && this.lastData != null) {
+                    callData.args = [...args];
+                    callData.args[dataIndex] = null;
+                    callData.data_delta = jsonDelta.diff(this.lastData, this.sentData);
+                }
+            }
+        }
         const callDataString = JSON.stringify(callData);
         this.callback = callback;
         this.timeoutID = setTimeout(this._timeout.bind(this), localOptions.timeout);
@@ -161,6 +259,13 @@ class PythonCaller {
         debug(`exit call(), state: ${String(this.state)}, uuid: ${this.uuid}`);
     }
 
+    callBatch(fcn, calls, data, options, callback) {
+        debug(`enter callBatch(), state: ${String(this.state)}, uuid: ${this.uuid}`);
+        if (!config.useWorkers) return callback(new Error('cannot batch calls when useWorkers=false'));
+        this.call(null, fcn, [calls, data], _.assign({}, options, {batch: true}), callback);
+        debug(`exit callBatch(), state: ${String(this.state)}, uuid: ${this.uuid}`);
+    }
+
     /*
      * @param {function} callback - A callback(err, success) function. If 'success' is false then this PythonCaller should be discarded and a new one created by the parent.
      */
@@ -177,6 +282,8 @@ class PythonCaller {
             debug(`exit restart(), state: ${String(this.state)}, uuid: ${this.uuid}`);
             callback(null, true);
         } else if (this.state == WAITING) {
+            // the new worker doesn't have any "data" from previous calls
+            this.lastData = null;
             this.call(null, 'restart', [], {}, (err, ret_val, _consoleLog) => {
                 if (ERR(err, callback)) return;
                 if (ret_val != 'success') return callback(new Error(`Error while restarting: ${ret_val}`));
@@ -237,6 +344,20 @@ class PythonCaller {
         // https://www.python.org/dev/peps/pep-0538/
         // https://www.python.org/dev/peps/pep-0540/
         env.PYTHONIOENCODING = 'utf-8';
+        env.PL_PYTHON_CODE_CACHE_SIZE = String(config.pythonCodeCacheSize);
+        env.PL_PYTHON_PRELOAD_ELEMENTS = config.pythonPreloadElements ? 'true' : 'false';
+        env.PL_PYTHON_PRELOAD_MODULES = JSON.stringify(config.pythonPreloadModules);
+        env.PL_PYTHON_ELEMENT_CACHE_MB = String(config.pythonElementCacheMB);
+        env.PL_PYTHON_WORKER_MAX_RSS_MB = String(config.pythonWorkerMaxRssMB);
+        if (config.pythonProfileFraction > 0 && config.pythonProfileDir) {
+            env.PL_PYTHON_PROFILE_FRACTION = String(config.pythonProfileFraction);
+            env.PL_PYTHON_PROFILE_DIR = config.pythonProfileDir;
+        }
+        if (config.pythonSharedDir) {
+            env.PL_PYTHON_SHARED_DIR = config.pythonSharedDir;
+            env.PL_PYTHON_SHARED_PREFIX = this._sharedPrefix();
+            env.PL_PYTHON_SHARED_MIN_BYTES = String(config.pythonSharedMinBytes);
+        }
         const options = {
             cwd: __dirname,
             stdio: ['pipe', 'pipe', 'pipe', 'pipe'], // stdin, stdout, stderr, and an extra one for data
@@ -261,6 +382,11 @@ class PythonCaller {
         debug(`exit _startChild(), state: ${String(this.state)}, uuid: ${this.uuid}`);
     }
 
+    _sharedPrefix() {
+        // the prefix of the names of the shared files of this caller's worker
+        return `pl-file-${this.uuid}-`;
+    }
+
     _handleStderrData(data) {
         debug(`enter _handleStderrData(), state: ${String(this.state)}, uuid: ${this.uuid}`);
         debug(`_handleStderrData(), data: ${data}`);
@@ -303,6 +429,7 @@ class PythonCaller {
         this._checkState([WAITING, IN_CALL, EXITING]);
         load.endJob('python', this.uuid);
         delete activeCallers[this.uuid];
+        removeSharedFiles(this._sharedPrefix());
         if (this.state == WAITING) {
             this._logError('PythonCaller child process exited while in state = WAITING, code = ' + String(code) + ', signal = ' + String(signal));
             this.child = null;
@@ -384,7 +511,39 @@ class PythonCaller {
             this._callCallback(err);
         } else {
             this.state = WAITING;
-            if (data.present) {
+            if (this.sentData != null) {
+                // the worker only returns a delta if the call modified "data"
+                if (_.has(data, 'delta')) {
+                    data.val = jsonDelta.apply(this.sentData, data.delta);
+                    if (config.pythonDeltaData) this.lastData = _.cloneDeep(data.val);
+                } else if (config.pythonDeltaData) {
+                    this.lastData = this.sentData;
+                }
+                this.sentData = null;
+            }
+            if (_.has(data, 'timing')) {
+                pythonTiming.record(this.lastCallData, data.timing);
+            }
+            if (_.has(data, 'recycled')) {
+                // the worker exited back to the zygote after this call
+                // (see config.pythonWorkerMaxRssMB),
+                // so the next worker doesn't have any "data"
+                debug(`worker recycled: ${data.recycled}, uuid: ${this.uuid}`);
+                this.lastData = null;
+            }
+            if (data.present && _.has(data, 'file')) {
+                // a large file() return value, passed through a shared file
+                try {
+                    data.val = readSharedFile(data.file, this._sharedPrefix());
+                } catch (e) {
+                    err = new Error('Error reading PythonCaller shared file: ' + e.message);
+                }
+            }
+            if (err) {
+                this._callCallback(err);
+            } else if (data.present && this.lastCallData.batch) {
+                this._callCallback(null, {data: data.val, failed: data.failed, steps: data.steps}, this.outputBoth);
+            } else if (data.present) {
                 this._callCallback(null, data.val, this.outputBoth);
             } else {
                 this._callCallback(new FunctionMissingError('Function not found in module'));
@@ -1,5 +1,7 @@
 const _ = require('lodash');
 const fs = require('fs');
+const os = require('os');
+const path = require('path');
 const logger = require('./logger');
 const jsonLoad = require('./json-load');
 const schemas = require('../schemas');
@@ -99,6 +101,26 @@ config.workersPerCpu = 1;
 config.workerWarmUpDelayMS = 1000;
 config.workerUseQueue = true;
 config.workerOverloadDelayMS = 10000;
+config.pythonCodeCacheSize = 256; // max number of compiled files cached by each python worker
+config.pythonBatchElementCalls = false; // send all element calls for prepare/parse/grade/test in one round trip (needs useWorkers)
+config.pythonDeltaData = false; // send "data" to and from python workers as deltas against the previous call (needs useWorkers)
+config.pythonPreloadElements = true; // import the core element controllers in the python zygote before forking
+config.pythonPreloadModules = [ // extra modules imported by the python zygote before forking
+    'pygments',
+    'pygments.lexers',
+    'pygments.formatters',
+    'pygraphviz',
+    'pyquaternion',
+    'sympy.parsing.sympy_parser',
+];
+config.pythonElementCacheMB = 64; // size of the cache of slow element outputs (e.g., pl-code highlighting) kept by a server process next to the python zygote (0 to disable)
+config.pythonWorkerMaxRssMB = 0; // growth (MB) of a forked python worker since the fork above which it is replaced by a fresh one (0 for no limit)
+config.pythonCallTiming = false; // have python workers time each call, aggregated per (element, phase) in lib/python-timing.js and logged on SIGUSR2
+config.pythonCallTimingReportIntervalSec = 600; // how often to log and reset the python call timing (0 to never log it)
+config.pythonProfileFraction = 0; // fraction of python calls that are profiled with cProfile (0 to disable)
+config.pythonProfileDir = path.join(os.tmpdir(), 'prairielearn-python-profiles'); // where the .pstats files of profiled python calls are written
+config.pythonSharedDir = '/dev/shm'; // memory-backed directory for passing large file() outputs from python workers, or null to always send them as base64
+config.pythonSharedMinBytes = 65536; // file() outputs of at least this size go through config.pythonSharedDir
 config.groupName = 'local'; // used for load reporting
 config.instanceId = 'server'; // will be overridden by EC2 auto-detect
 config.instanceIdEc2Override = null; // will override EC2 auto-detect
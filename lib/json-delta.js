@@ -0,0 +1,68 @@
+const _ = require('lodash');
+
+/*
+  Deltas between two JSON values, used by PythonCaller to avoid sending
+  the whole "data" object to and from the Python worker on every call.
+
+  A delta is a list of JSON-patch-style operations, each of which is an
+  object {op, path, value}. Unlike RFC 6902, path is an array of object
+  keys rather than a JSON pointer string. The operations are:
+
+    add     -> set path to value (the key did not exist before)
+    replace -> set path to value (the key existed before)
+    remove  -> delete path (no value)
+
+  Only plain objects are diffed recursively. Any other value (including
+  arrays) that differs is replaced as a whole. An empty path replaces the
+  root value.
+
+  The same format is implemented in lib/python_helper_delta.py.
+*/
+
+/**
+ * Returns the list of operations that turns the JSON value oldValue into newValue.
+ */
+module.exports.diff = function(oldValue, newValue, path = []) {
+    if (_.isPlainObject(oldValue) && _.isPlainObject(newValue)) {
+        const ops = [];
+        for (const key of _.keys(oldValue)) {
+            if (!_.has(newValue, key)) {
+                ops.push({op: 'remove', path: [...path, key]});
+            }
+        }
+        for (const key of _.keys(newValue)) {
+            if (!_.has(oldValue, key)) {
+                ops.push({op: 'add', path: [...path, key], value: newValue[key]});
+            } else {
+                ops.push(...module.exports.diff(oldValue[key], newValue[key], [...path, key]));
+            }
+        }
+        return ops;
+    }
+    if (_.isEqual(oldValue, newValue)) return [];
+    return [{op: 'replace', path, value: newValue}];
+};
+
+/**
+ * Applies the list of operations to the JSON value base and returns the
+ * result. The base value is modified in place unless the root is replaced.
+ */
+module.exports.apply = function(base, ops) {
+    for (const op of ops) {
+        if (op.path.length == 0) {
+            if (op.op == 'remove') throw new Error('cannot remove the root value');
+            base = op.value;
+            continue;
+        }
+        const parent = op.path.length == 1 ? base : _.get(base, op.path.slice(0, -1));
+        const key = _.last(op.path);
+        if (op.op == 'remove') {
+            delete parent[key];
+        } else if (op.op == 'add' || op.op == 'replace') {
+            parent[key] = op.value;
+        } else {
+            throw new Error(`unknown delta operation: ${op.op}`);
+        }
+    }
+    return base;
+};
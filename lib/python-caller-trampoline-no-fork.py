@@ -15,8 +15,10 @@
 # Errors are signaled by exiting with non-zero exit code
 # Exceptions are not caught and so will trigger a process exit with non-zero exit code (signaling an error)
 
-import sys, os, json, importlib, copy, base64, io, matplotlib
+import sys, os, json, importlib, copy, base64, io, time, resource, matplotlib
 from inspect import signature
+import python_helper_profile
+import python_helper_shared
 
 # This function tries to convert a python object to valid JSON. If an exception
 # is raised, this function prints the object and re-raises the exception. This is
@@ -31,6 +33,16 @@ def try_dumps(obj, sort_keys=False, allow_nan=False):
         raise
 
 
+# With "timing" in the input, the output includes the same timing as from
+# the forking trampoline (see python-caller-trampoline.py), except that the
+# module is imported rather than compiled and executed, so compile_ms is 0
+# and exec_ms is the time of the import (which is 0 once it is cached).
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
 matplotlib.use('PDF')
 
 saved_path = copy.copy(sys.path)
@@ -45,6 +57,8 @@ with open(3, 'w', encoding='utf-8') as outf:
 
         # wait for a single line of input
         json_inp = sys.stdin.readline()
+        start = time.perf_counter()
+        start_rss_kb = peak_rss_kb()
         # unpack the input line as JSON
         inp = json.loads(json_inp)
 
@@ -55,6 +69,11 @@ with open(3, 'w', encoding='utf-8') as outf:
         cwd = inp['cwd']
         paths = inp['paths']
 
+        timing = None
+        if inp.get('timing', False):
+            timing = {'compile_ms': 0.0, 'exec_ms': 0.0, 'call_ms': 0.0}
+            timing['read_ms'] = 1e3 * (time.perf_counter() - start)
+
         # reset and then set up the path
         sys.path = copy.copy(saved_path)
         for path in reversed(paths):
@@ -65,7 +84,10 @@ with open(3, 'w', encoding='utf-8') as outf:
         os.chdir(cwd)
 
         # load the "file" as a module
+        import_start = time.perf_counter()
         mod = importlib.import_module(file);
+        if timing is not None:
+            timing['exec_ms'] = 1e3 * (time.perf_counter() - import_start)
 
         # check whether we have the desired fcn in the module
         if hasattr(mod, fcn):
@@ -78,9 +100,15 @@ with open(3, 'w', encoding='utf-8') as outf:
             if len(arg_names) == 3 and arg_names[0] == 'element_html' and arg_names[1] == 'element_index' and arg_names[2] == 'data':
                 args.insert(1, None)
 
-            # call the desired function in the loaded module
-            val = method(*args)
+            # call the desired function in the loaded module, which may be
+            # profiled (see python_helper_profile.py)
+            call_start = time.perf_counter()
+            val = python_helper_profile.call(method, args, inp.get('profile_tag', None), file, fcn)
+            if timing is not None:
+                timing['call_ms'] = 1e3 * (time.perf_counter() - call_start)
+            serialize_start = time.perf_counter()
 
+            shared = None
             if fcn=="file":
                 # if val is None, replace it with empty string
                 if val is None:
@@ -92,9 +120,13 @@ with open(3, 'w', encoding='utf-8') as outf:
                 # if val is a string, treat it as utf-8
                 if isinstance(val,str):
                     val = bytes(val,'utf-8')
+                # a large value is passed through a shared file
+                # rather than as base64 (see python_helper_shared.py)
+                shared = python_helper_shared.write_shared(val)
                 # if this next call does not work, it will throw an error, because
                 # the thing returned by file() does not have the correct format
-                val = base64.b64encode(val).decode()
+                if shared is None:
+                    val = base64.b64encode(val).decode()
 
             # Any function that is not 'file' or 'render' will modify 'data' and
             # should not be returning anything (because 'data' is mutable).
@@ -106,12 +138,24 @@ with open(3, 'w', encoding='utf-8') as outf:
                     json_outp = try_dumps({"present": True, "val": val}, sort_keys=True, allow_nan=False)
                     if json_outp_passed != json_outp:
                         sys.stderr.write('WARNING: Passed and returned value of "data" differ in the function ' + str(fcn) + '() in the file ' + str(cwd) + '/' + str(file) + '.py.\n\n passed:\n  ' + str(args[-1]) + '\n\n returned:\n  ' + str(val) + '\n\nThere is no need to be returning "data" at all (it is mutable, i.e., passed by reference). In future, this code will throw a fatal error. For now, the returned value of "data" was used and the passed value was discarded.')
+            elif shared is not None:
+                json_outp = try_dumps({"present": True, "file": shared}, allow_nan=False)
             else:
                 json_outp = try_dumps({"present": True, "val": val}, allow_nan=False)
         else:
             # the function wasn't present, so report this
+            serialize_start = time.perf_counter()
             json_outp = try_dumps({"present": False}, allow_nan=False)
 
+        if timing is not None:
+            timing['serialize_ms'] = 1e3 * (time.perf_counter() - serialize_start)
+            timing['total_ms'] = 1e3 * (time.perf_counter() - start)
+            timing['peak_rss_delta_kb'] = peak_rss_kb() - start_rss_kb
+            timing['bytes_in'] = len(json_inp.encode('utf-8'))
+            timing['bytes_out'] = len(json_outp.encode('utf-8'))
+            # add the timing to the end of the already serialized output
+            json_outp = json_outp[:-1] + ', "timing": ' + json.dumps(timing) + '}'
+
         # make sure all output streams are flushed
         sys.stderr.flush()
         sys.stdout.flush()
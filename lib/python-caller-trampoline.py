@@ -15,7 +15,7 @@
 # Errors are signaled by exiting with non-zero exit code
 # Exceptions are not caught and so will trigger a process exit with non-zero exit code (signaling an error)
 
-import sys, os, json, importlib, copy, base64, io, matplotlib, signal, sklearn, nltk
+import sys, os, json, importlib, copy, base64, io, matplotlib, signal, sklearn, nltk, collections, glob, resource, time, traceback
 from inspect import signature
 
 saved_path = copy.copy(sys.path)
@@ -23,6 +23,10 @@ saved_path = copy.copy(sys.path)
 # pre-loading imports
 sys.path.insert(0, os.path.abspath('../question-servers/freeformPythonLib'))
 import prairielearn, lxml.html, html, numpy, random, math, chevron, matplotlib
+import python_helper_cache
+import python_helper_delta
+import python_helper_profile
+import python_helper_shared
 
 # This function tries to convert a python object to valid JSON. If an exception
 # is raised, this function prints the object and re-raises the exception. This is
@@ -39,7 +43,259 @@ def try_dumps(obj, sort_keys=False, allow_nan=False):
 
 matplotlib.use('PDF')
 
+# Cache of compiled code objects, keyed by file path. Each entry also
+# stores the (mtime, size) of the file when it was compiled, so that a
+# file that has changed on disk is recompiled. Entries are evicted in
+# least-recently-used order once the cache is full. The zygote fills
+# the cache with the core element controllers before forking, so every
+# worker starts with them already compiled (and shared copy-on-write).
+code_cache_max_size = int(os.environ.get('PL_PYTHON_CODE_CACHE_SIZE', '256'))
+code_cache = collections.OrderedDict()
+code_cache_stats = {'hits': 0, 'misses': 0}
+
+def compile_file(file_path):
+    stat = os.stat(file_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    entry = code_cache.get(file_path)
+    if entry is not None and entry[0] == stamp:
+        code_cache.move_to_end(file_path)
+        code_cache_stats['hits'] += 1
+        return entry[1]
+
+    code_cache_stats['misses'] += 1
+    with open(file_path, encoding='utf-8') as inf:
+        # use compile to associate filename with code object, so the
+        # filename appears in the traceback if there is an error
+        # (https://stackoverflow.com/a/437857)
+        code = compile(inf.read(), file_path, 'exec')
+    if code_cache_max_size > 0:
+        code_cache[file_path] = (stamp, code)
+        code_cache.move_to_end(file_path)
+        while len(code_cache) > code_cache_max_size:
+            code_cache.popitem(last=False)
+    return code
+
+elements_dir = os.path.abspath('../elements')
+
+def warm_code_cache():
+    for file_path in sorted(glob.glob(os.path.join(elements_dir, '*', '*.py'))):
+        try:
+            compile_file(file_path)
+        except Exception:
+            # a broken element will report its own error when it is called
+            pass
+    # don't count the warm-up as misses in the workers
+    code_cache_stats['misses'] = 0
+
+# The preload manifest is a JSON list of module names that the zygote
+# imports before forking, so that each worker starts with them (and
+# their dependencies) already resident and shared copy-on-write.
+# Modules that are not installed are skipped.
+def preload_modules():
+    manifest = json.loads(os.environ.get('PL_PYTHON_PRELOAD_MODULES', '[]'))
+    for name in manifest:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+# Execute each core element controller once in the zygote so that the
+# modules it imports at the top level are loaded before forking. Any
+# element-local helper modules are removed from sys.modules afterwards
+# so that they can't shadow a course module with the same name.
+def preload_elements():
+    if os.environ.get('PL_PYTHON_PRELOAD_ELEMENTS', 'true') != 'true':
+        return
+    saved_cwd = os.getcwd()
+    zygote_path = copy.copy(sys.path)
+    for element_dir in sorted(glob.glob(os.path.join(elements_dir, '*'))):
+        file_path = os.path.join(element_dir, os.path.basename(element_dir) + '.py')
+        if not os.path.isfile(file_path):
+            continue
+        sys.path = [element_dir] + zygote_path
+        try:
+            os.chdir(element_dir)
+            exec(compile_file(file_path), {})
+        except Exception:
+            # missing optional dependencies are reported when the element is called
+            pass
+    sys.path = zygote_path
+    os.chdir(saved_cwd)
+    for name, mod in list(sys.modules.items()):
+        mod_file = getattr(mod, '__file__', None)
+        if mod_file and os.path.abspath(mod_file).startswith(elements_dir + os.sep):
+            del sys.modules[name]
+    code_cache_stats['hits'] = 0
+
+# With "timing" in the input, the output includes the milliseconds spent in
+# each step of the call, the growth of the peak resident set size, and the
+# size of the input and output, so that the caller can tell where the time
+# goes without attaching a profiler.
+def new_timing():
+    return {'compile_ms': 0.0, 'exec_ms': 0.0, 'call_ms': 0.0}
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+def call_function(file, fcn, args, cwd, paths, timing=None, profile_tag=None):
+    """(present, val) = call_function(file, fcn, args, cwd, paths, timing=None, profile_tag=None)
+
+    Loads the given file and calls fcn(*args) in it. Returns whether the
+    function was present in the file and, if so, its return value. If
+    timing is a dict, the milliseconds spent compiling the file, executing
+    the module, and calling the function are added to its "compile_ms",
+    "exec_ms", and "call_ms" entries. The call may be profiled (see
+    python_helper_profile.py), with the profile tagged with profile_tag.
+    """
+    # re-seed the PRNGs
+    if len(args) > 0 and type(args[-1]) is dict:
+        variant_seed = args[-1].get('variant_seed', None)
+        random.seed(variant_seed)
+        numpy.random.seed(variant_seed)
+
+    # reset and then set up the path
+    sys.path = copy.copy(saved_path)
+    for path in reversed(paths):
+        sys.path.insert(0, path)
+    sys.path.insert(0, cwd)
+
+    # change to the desired working directory
+    os.chdir(cwd)
+
+    # we used to load the "file" as a module:
+    #   mod = importlib.import_module('.' + file, os.path.basename(os.getcwd()));
+    # now, instead, we read the "file" as a string, then compile and exec it.
+    # The compiled code object is cached (see compile_file()).
+    mod = {}
+    file_path = os.path.join(cwd, file + '.py')
+    start = time.perf_counter()
+    code = compile_file(file_path)
+    compiled = time.perf_counter()
+    exec(code, mod)
+    if timing is not None:
+        timing['compile_ms'] += 1e3 * (compiled - start)
+        timing['exec_ms'] += 1e3 * (time.perf_counter() - compiled)
+
+    # check whether we have the desired fcn in the module
+    if fcn not in mod: #hasattr(mod, fcn):
+        return (False, None)
+
+    # get the desired function in the loaded module
+    method = mod[fcn] #getattr(mod, fcn)
+
+    # check if the desired function is a legacy element function - if
+    # so, we add an argument for element_index
+    arg_names = list(signature(method).parameters.keys())
+    if len(arg_names) == 3 and arg_names[0] == 'element_html' and arg_names[1] == 'element_index' and arg_names[2] == 'data':
+        args.insert(1, None)
+
+    # call the desired function in the loaded module
+    if timing is None:
+        return (True, python_helper_profile.call(method, args, profile_tag, file, fcn))
+    start = time.perf_counter()
+    val = python_helper_profile.call(method, args, profile_tag, file, fcn)
+    timing['call_ms'] += 1e3 * (time.perf_counter() - start)
+    return (True, val)
+
+def warn_returned_data(file, fcn, cwd, passed, returned):
+    """Warns if a function returned a "data" that differs from the one passed to it."""
+    json_outp_passed = try_dumps(passed, sort_keys=True, allow_nan=False)
+    json_outp = try_dumps(returned, sort_keys=True, allow_nan=False)
+    if json_outp_passed != json_outp:
+        sys.stderr.write('WARNING: Passed and returned value of "data" differ in the function ' + str(fcn) + '() in the file ' + str(cwd) + '/' + str(file) + '.py.\n\n passed:\n  ' + str(passed) + '\n\n returned:\n  ' + str(returned) + '\n\nThere is no need to be returning "data" at all (it is mutable, i.e., passed by reference). In future, this code will throw a fatal error. For now, the returned value of "data" was used and the passed value was discarded.')
+
+def call_batch(fcn, calls, data, timing=None, profile_tag=None, steps=None):
+    """data, failed = call_batch(fcn, calls, data, timing=None, profile_tag=None, steps=None)
+
+    Calls fcn(element_html, data) for each element in the ordered list of
+    calls, threading the mutable "data" through all of them. Each call is a
+    dict with the keys "file", "cwd", "paths", "element_html", and
+    "extensions". A call whose function is not present leaves "data"
+    unchanged. Only phases that modify "data" (not "render" or "file") can
+    be batched. If timing is a dict, the times of all calls are added to it
+    as for call_function() and the times of each call are appended to its
+    "calls" list. If steps is a list, the change that each call made to
+    "data" is appended to it as a delta (see python_helper_delta.py). This
+    copies all of "data" after each call, so the caller only asks for it to
+    find the call that left "data" invalid.
+
+    Returns the final "data" and the index of the call that raised an
+    exception, or None. The calls after a failed one are not made, and its
+    traceback is written to stderr.
+    """
+    if fcn == 'render' or fcn == 'file':
+        raise Exception('cannot batch calls to ' + fcn + '()')
+    if steps is not None:
+        before = python_helper_delta.json_copy(data)
+    for i, call in enumerate(calls):
+        data['extensions'] = call['extensions']
+        call_timing = None if timing is None else new_timing()
+        try:
+            present, val = call_function(call['file'], fcn, [call['element_html'], data], call['cwd'], call['paths'], call_timing, profile_tag)
+        except Exception:
+            traceback.print_exc()
+            data.pop('extensions', None)
+            return (data, i)
+        if present and val is not None:
+            warn_returned_data(call['file'], fcn, call['cwd'], data, val)
+            data = val
+        data.pop('extensions', None)
+        if steps is not None:
+            after = python_helper_delta.json_copy(data)
+            steps.append(python_helper_delta.diff(before, after))
+            before = after
+        if timing is not None:
+            for key in call_timing:
+                timing[key] += call_timing[key]
+            timing['calls'].append({'file': call['file'], **call_timing})
+    return (data, None)
+
+# A worker exits back to the zygote, which forks a fresh one, once the
+# memory that it doesn't share with the zygote is above
+# PL_PYTHON_WORKER_MAX_RSS_MB. This bounds the memory that course code can
+# accumulate in a worker between restarts. A limit of 0 disables the check.
+worker_max_rss_mb = float(os.environ.get('PL_PYTHON_WORKER_MAX_RSS_MB', '0'))
+
+# the anonymous memory of the zygote when it forked the current worker
+zygote_rss_mb = 0.0
+
+def rss_mb():
+    """mb = rss_mb()
+
+    Returns the resident memory of the process that is not backed by a
+    file, from /proc/self/statm, which is cheap enough to read after every
+    call. Pages of shared libraries and other mapped files are left out,
+    because a forked worker only maps them again as it touches them.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            (resident, shared) = f.read().split()[1:3]
+            return (int(resident) - int(shared)) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # no /proc (e.g., macOS), so use the peak resident set size instead,
+        # which is in kilobytes on Linux and in bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def recycle_reason():
+    """reason = recycle_reason()
+
+    Returns why the worker should exit after its current call, or None if it
+    can keep going. The worker inherits the memory of the zygote, so its own
+    memory is the growth of rss_mb() since the fork.
+    """
+    if worker_max_rss_mb > 0:
+        worker_mb = rss_mb() - zygote_rss_mb
+        if worker_mb > worker_max_rss_mb:
+            return 'memory %.1f MB above the zygote (limit %g MB)' % (worker_mb, worker_max_rss_mb)
+    return None
+
 def worker_loop():
+    # the "data" of the previous call, for delta mode
+    last_data = None
+
     # file descriptor 3 is for output data
     with open(3, 'w', encoding='utf-8') as outf:
 
@@ -50,6 +306,8 @@ def worker_loop():
 
             # wait for a single line of input
             json_inp = sys.stdin.readline()
+            start = time.perf_counter()
+            start_rss_kb = peak_rss_kb()
             # unpack the input line as JSON
             inp = json.loads(json_inp)
 
@@ -70,78 +328,108 @@ def worker_loop():
                 outf.flush()
                 break
 
-            # re-seed the PRNGs
-            if type(args[-1]) is dict:
-                variant_seed = args[-1].get('variant_seed', None)
-                random.seed(variant_seed)
-                numpy.random.seed(variant_seed)
-
-
-            # reset and then set up the path
-            sys.path = copy.copy(saved_path)
-            for path in reversed(paths):
-                sys.path.insert(0, path)
-            sys.path.insert(0, cwd)
-
-            # change to the desired working directory
-            os.chdir(cwd)
-
-            # we used to load the "file" as a module:
-            #   mod = importlib.import_module('.' + file, os.path.basename(os.getcwd()));
-            # now, instead, we read the "file" as a string, then compile and exec it:
-            mod = {}
-            file_path = os.path.join(cwd, file + '.py')
-            with open(file_path, encoding='utf-8') as inf:
-                # use compile to associate filename with code object, so the
-                # filename appears in the traceback if there is an error
-                # (https://stackoverflow.com/a/437857)
-                code = compile(inf.read(), file_path, 'exec')
-                exec(code, mod)
-
-            # check whether we have the desired fcn in the module
-            if fcn in mod: #hasattr(mod, fcn):
-                # get the desired function in the loaded module
-                method = mod[fcn] #getattr(mod, fcn)
-
-                # check if the desired function is a legacy element function - if
-                # so, we add an argument for element_index
-                arg_names = list(signature(method).parameters.keys())
-                if len(arg_names) == 3 and arg_names[0] == 'element_html' and arg_names[1] == 'element_index' and arg_names[2] == 'data':
-                    args.insert(1, None)
-
-                # call the desired function in the loaded module
-                val = method(*args)
-
-                if fcn=="file":
-                    # if val is None, replace it with empty string
-                    if val is None:
-                        val = ''
-                    # if val is a file-like object, read whatever is inside
-                    if isinstance(val,io.IOBase):
-                        val.seek(0)
-                        val = val.read()
-                    # if val is a string, treat it as utf-8
-                    if isinstance(val,str):
-                        val = bytes(val,'utf-8')
-                    # if this next call does not work, it will throw an error, because
-                    # the thing returned by file() does not have the correct format
-                    val = base64.b64encode(val).decode()
-
-                # Any function that is not 'file' or 'render' will modify 'data' and
-                # should not be returning anything (because 'data' is mutable).
-                if (fcn != 'file') and (fcn != 'render'):
-                    if val is None:
-                        json_outp = try_dumps({"present": True, "val": args[-1]}, allow_nan=False)
+            # In delta mode the "data" argument (at position data_index in
+            # args) is sent as a delta against the "data" of the previous
+            # call, and modified "data" is returned as a delta against the
+            # "data" that was passed in (see python_helper_delta.py). The
+            # "data" of the previous call is kept as the caller has it, so
+            # that the function gets the same values as without deltas.
+            data_index = inp.get('data_index', None)
+            if 'data_delta' in inp:
+                args[data_index] = python_helper_delta.apply(python_helper_delta.json_copy(last_data), inp['data_delta'])
+            if data_index is not None:
+                sent_data = python_helper_delta.json_copy(args[data_index])
+
+            timing = None
+            if inp.get('timing', False):
+                timing = new_timing()
+                timing['read_ms'] = 1e3 * (time.perf_counter() - start)
+
+            # "data" after the call, or None if the call does not modify it
+            data = None
+            failed = None
+            if file == None and inp.get('batch', False):
+                # a batch of element calls for one phase, with args = [calls, data]
+                if timing is not None:
+                    timing['calls'] = []
+                # the caller always asks for the "data" of a batch as a
+                # delta, which is computed once for the whole batch
+                steps = [] if inp.get('steps', False) else None
+                data, failed = call_batch(fcn, args[0], args[1], timing, inp.get('profile_tag', None), steps)
+                outp, sort_keys = {"present": True, "val": data, "failed": failed}, False
+                if steps is not None:
+                    outp["steps"] = steps
+            else:
+                present, val = call_function(file, fcn, args, cwd, paths, timing, inp.get('profile_tag', None))
+                shared = None
+                if present:
+                    if fcn=="file":
+                        # if val is None, replace it with empty string
+                        if val is None:
+                            val = ''
+                        # if val is a file-like object, read whatever is inside
+                        if isinstance(val,io.IOBase):
+                            val.seek(0)
+                            val = val.read()
+                        # if val is a string, treat it as utf-8
+                        if isinstance(val,str):
+                            val = bytes(val,'utf-8')
+                        # a large value is passed through a shared file
+                        # rather than as base64 (see python_helper_shared.py)
+                        shared = python_helper_shared.write_shared(val)
+                        # if this next call does not work, it will throw an error, because
+                        # the thing returned by file() does not have the correct format
+                        if shared is None:
+                            val = base64.b64encode(val).decode()
+
+                    # Any function that is not 'file' or 'render' will modify 'data' and
+                    # should not be returning anything (because 'data' is mutable).
+                    if (fcn != 'file') and (fcn != 'render'):
+                        if val is None:
+                            data = args[-1]
+                            outp, sort_keys = {"present": True, "val": data}, False
+                        else:
+                            warn_returned_data(file, fcn, cwd, args[-1], val)
+                            data = val
+                            outp, sort_keys = {"present": True, "val": data}, True
+                    elif shared is not None:
+                        outp, sort_keys = {"present": True, "file": shared}, False
                     else:
-                        json_outp_passed = try_dumps({"present": True, "val": args[-1]}, sort_keys=True, allow_nan=False)
-                        json_outp = try_dumps({"present": True, "val": val}, sort_keys=True, allow_nan=False)
-                        if json_outp_passed != json_outp:
-                            sys.stderr.write('WARNING: Passed and returned value of "data" differ in the function ' + str(fcn) + '() in the file ' + str(cwd) + '/' + str(file) + '.py.\n\n passed:\n  ' + str(args[-1]) + '\n\n returned:\n  ' + str(val) + '\n\nThere is no need to be returning "data" at all (it is mutable, i.e., passed by reference). In future, this code will throw a fatal error. For now, the returned value of "data" was used and the passed value was discarded.')
+                        outp, sort_keys = {"present": True, "val": val}, False
                 else:
-                    json_outp = try_dumps({"present": True, "val": val}, allow_nan=False)
-            else:
-                # the function wasn't present, so report this
-                json_outp = try_dumps({"present": False}, allow_nan=False)
+                    # the function wasn't present, so report this
+                    outp, sort_keys = {"present": False}, False
+
+            serialize_start = time.perf_counter()
+            if data_index is not None:
+                if data is None:
+                    last_data = sent_data
+                else:
+                    if inp.get('delta', False):
+                        outp["delta"] = python_helper_delta.diff(sent_data, data)
+                        del outp["val"]
+                    last_data = python_helper_delta.js_copy(data)
+
+            # tell the caller if this worker is about to exit, because the
+            # next worker won't have the "data" of this call
+            reason = recycle_reason()
+            if failed is not None:
+                # an element raised an exception, so its module state can't
+                # be trusted and the worker is replaced as it would be if the
+                # exception had not been caught
+                reason = 'batch call %d raised an exception' % failed
+            if reason is not None:
+                outp["recycled"] = reason
+            json_outp = try_dumps(outp, sort_keys=sort_keys, allow_nan=False)
+
+            if timing is not None:
+                timing['serialize_ms'] = 1e3 * (time.perf_counter() - serialize_start)
+                timing['total_ms'] = 1e3 * (time.perf_counter() - start)
+                timing['peak_rss_delta_kb'] = peak_rss_kb() - start_rss_kb
+                timing['bytes_in'] = len(json_inp.encode('utf-8'))
+                timing['bytes_out'] = len(json_outp.encode('utf-8'))
+                # add the timing to the end of the already serialized output
+                json_outp = json_outp[:-1] + ', "timing": ' + json.dumps(timing) + '}'
 
             # make sure all output streams are flushed
             sys.stderr.flush()
@@ -152,16 +440,30 @@ def worker_loop():
             outf.write("\n");
             outf.flush()
 
+            if reason is not None:
+                break
+
 worker_pid = 0
+cache_server_pid = None
 def terminate_worker(signum, stack):
     if worker_pid > 0:
         os.kill(worker_pid, signal.SIGKILL)
+    if cache_server_pid is not None:
+        os.kill(cache_server_pid, signal.SIGKILL)
     sys.exit(0)
 
 signal.signal(signal.SIGTERM, terminate_worker)
 signal.signal(signal.SIGINT, terminate_worker) # Ctrl-C case
 
+warm_code_cache()
+preload_modules()
+preload_elements()
+# the element cache server is forked before any course code runs (see
+# python_helper_cache.py)
+cache_server_pid = python_helper_cache.start_server(elements_dir)
+
 while True:
+    zygote_rss_mb = rss_mb()
     worker_pid = os.fork()
     if worker_pid == 0:
         worker_loop()
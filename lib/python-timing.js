@@ -0,0 +1,149 @@
+const _ = require('lodash');
+const path = require('path');
+const debug = require('debug')('prairielearn:' + path.basename(__filename, '.js'));
+
+const config = require('./config');
+const logger = require('./logger');
+
+/*
+  Aggregation of the timing that the python trampolines return for each
+  call when config.pythonCallTiming is set (see "timing" in
+  python-caller-trampoline.py). Calls are grouped by (element, phase),
+  where the element is the python file that was called (e.g.,
+  "pl-symbolic-input" or "server") and the phase is the function (e.g.,
+  "grade"). Each group has a histogram of the time spent in the function,
+  so that the slowest groups can be found from the summary(). The element
+  calls of a batch are recorded separately, and the batch itself is also
+  recorded with the element "batch", for the time and bytes of the round
+  trip.
+
+  The summary is logged every config.pythonCallTimingReportIntervalSec
+  seconds, and also when the process receives SIGUSR2.
+*/
+
+// upper bounds (in milliseconds) of the histogram buckets, the last
+// bucket has no upper bound
+const BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000];
+
+// per-call timing values that are summed for each group (the element
+// calls of a batch only have the first three)
+const TOTALS = ['compile_ms', 'exec_ms', 'call_ms', 'read_ms', 'serialize_ms', 'total_ms', 'bytes_in', 'bytes_out'];
+
+let groups = {};
+let intervalID = null;
+
+function newGroup() {
+    return {
+        count: 0,
+        totals: _.fromPairs(TOTALS.map((key) => [key, 0])),
+        maxCallMS: 0,
+        maxPeakRssDeltaKB: 0,
+        buckets: new Array(BUCKETS_MS.length + 1).fill(0),
+    };
+}
+
+function recordCall(file, fcn, timing) {
+    const key = `${file}.${fcn}`;
+    if (!_.has(groups, key)) groups[key] = newGroup();
+    const group = groups[key];
+    group.count++;
+    for (const total of TOTALS) group.totals[total] += timing[total] || 0;
+    group.maxCallMS = Math.max(group.maxCallMS, timing.call_ms);
+    group.maxPeakRssDeltaKB = Math.max(group.maxPeakRssDeltaKB, timing.peak_rss_delta_kb || 0);
+    group.buckets[_.sortedIndex(BUCKETS_MS, timing.call_ms)]++;
+}
+
+/**
+ * Returns the upper bound of the bucket that contains the given quantile
+ * of the calls in the group.
+ */
+function quantileMS(group, quantile) {
+    let seen = 0;
+    for (let i = 0; i < group.buckets.length; i++) {
+        seen += group.buckets[i];
+        if (seen >= quantile * group.count) {
+            return i < BUCKETS_MS.length ? BUCKETS_MS[i] : group.maxCallMS;
+        }
+    }
+    return group.maxCallMS;
+}
+
+/**
+ * Records the timing returned by the python worker for a call. The
+ * callData is what was sent to the worker, so for a batch call each of
+ * the element calls is recorded separately.
+ */
+module.exports.record = function(callData, timing) {
+    if (callData.batch) {
+        const calls = callData.args[0];
+        _.each(timing.calls, (callTiming, i) => recordCall(calls[i].file, callData.fcn, callTiming));
+        recordCall('batch', callData.fcn, timing);
+    } else {
+        recordCall(callData.file, callData.fcn, timing);
+    }
+};
+
+/**
+ * Returns the aggregated timing for each (element, phase), sorted with the
+ * largest total time in the function first. All times are in milliseconds
+ * and the percentiles are the upper bounds of histogram buckets. The
+ * call_ms of a batch is the sum of its element calls, so rows with the
+ * element "batch" are left out of the order.
+ */
+module.exports.summary = function() {
+    const rows = _.map(groups, (group, key) => ({
+        key,
+        count: group.count,
+        compile_ms: group.totals.compile_ms,
+        exec_ms: group.totals.exec_ms,
+        call_ms: group.totals.call_ms,
+        read_ms: group.totals.read_ms,
+        serialize_ms: group.totals.serialize_ms,
+        total_ms: group.totals.total_ms,
+        bytes_in: group.totals.bytes_in,
+        bytes_out: group.totals.bytes_out,
+        max_peak_rss_delta_kb: group.maxPeakRssDeltaKB,
+        mean_call_ms: group.totals.call_ms / group.count,
+        p50_call_ms: quantileMS(group, 0.5),
+        p99_call_ms: quantileMS(group, 0.99),
+        max_call_ms: group.maxCallMS,
+        histogram: _.fromPairs(group.buckets.map((n, i) => [i < BUCKETS_MS.length ? `<=${BUCKETS_MS[i]}` : `>${_.last(BUCKETS_MS)}`, n])),
+    }));
+    return _.orderBy(rows, [(row) => row.key.startsWith('batch.') ? -1 : row.call_ms], ['desc']);
+};
+
+module.exports.reset = function() {
+    groups = {};
+};
+
+/**
+ * Logs and then resets the summary().
+ */
+module.exports.report = function() {
+    debug('report()');
+    if (_.size(groups) > 0) logger.verbose('python call timing', {summary: module.exports.summary()});
+    module.exports.reset();
+};
+
+/**
+ * Logs and resets the summary() every config.pythonCallTimingReportIntervalSec
+ * seconds (if it is positive) and whenever the process receives SIGUSR2.
+ */
+module.exports.init = function() {
+    debug('init()');
+    if (!config.pythonCallTiming) return;
+    if (config.pythonCallTimingReportIntervalSec > 0) {
+        intervalID = setInterval(module.exports.report, config.pythonCallTimingReportIntervalSec * 1000);
+        intervalID.unref();
+    }
+    process.on('SIGUSR2', module.exports.report);
+};
+
+module.exports.close = function() {
+    debug('close()');
+    if (intervalID != null) {
+        clearInterval(intervalID);
+        intervalID = null;
+    }
+    process.removeListener('SIGUSR2', module.exports.report);
+};
@@ -0,0 +1,178 @@
+import collections
+import json
+import os
+import select
+import socket
+import sys
+
+# The values of element functions that are slow to compute and only depend
+# on their arguments (see prairielearn.element_cache()) are cached in a
+# server process that the zygote forks before any course code runs, so
+# that the cache survives the restart of the worker after each request.
+#
+# The code of every course runs as the same user, so the server never
+# stores a value that a worker sends it. A worker only sends the element
+# file, the function, and its arguments. On a hit the server answers with
+# the cached value. On a miss it answers at once, the worker computes the
+# value itself, and the server computes the value with its own copy of the
+# core element for the next lookup. Only functions of core elements
+# (elements/<name>/<name>.py) that are decorated with element_cache() are
+# computed by the server.
+#
+# The server keeps at most PL_PYTHON_ELEMENT_CACHE_MB of keys and values
+# and evicts the least recently used ones. A limit of 0 disables the
+# server, and values are then only cached in each worker.
+
+cache_max_bytes = float(os.environ.get('PL_PYTHON_ELEMENT_CACHE_MB', '64')) * 2**20
+
+# how long a worker waits for an answer before it computes the value itself
+LOOKUP_TIMEOUT_SEC = 0.5
+
+# the largest request or answer, above which the value is not cached
+MAX_MESSAGE_BYTES = 2**20
+
+# the most misses that the server has yet to compute
+MAX_PENDING = 16
+
+# the socket of the workers, or None if there is no server
+client = None
+
+
+def start_server(elements_dir):
+    """pid = start_server(elements_dir)
+
+    Forks the cache server for the core elements in elements_dir and
+    connects this process (and the workers that it forks) to it. Returns
+    the pid of the server, or None if the cache is disabled. The server
+    exits once every process that is connected to it has exited.
+    """
+    global client
+    if cache_max_bytes <= 0:
+        return None
+    (client_sock, server_sock) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    for sock in (client_sock, server_sock):
+        # the system may limit messages to less than this
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_MESSAGE_BYTES)
+    pid = os.fork()
+    if pid == 0:
+        client_sock.close()
+        try:
+            serve(server_sock, os.path.realpath(elements_dir))
+        finally:
+            os._exit(0)
+    server_sock.close()
+    client_sock.settimeout(LOOKUP_TIMEOUT_SEC)
+    client = client_sock
+    return pid
+
+
+def lookup(file, fcn, args):
+    """(found, value) = lookup(file, fcn, args)
+
+    Asks the server for the value of fcn(*args) in the element file.
+    Returns whether the value was found and, if so, the value.
+    """
+    if client is None:
+        return (False, None)
+    # answers to lookups that timed out are discarded by their id, which
+    # does not use the random module so that the seeded state of the
+    # element is unchanged
+    request_id = os.urandom(8).hex()
+    try:
+        client.send(json.dumps({'id': request_id, 'file': file, 'fcn': fcn, 'args': args}).encode('utf-8'))
+        while True:
+            answer = json.loads(client.recv(MAX_MESSAGE_BYTES))
+            if answer['id'] == request_id:
+                break
+    except (OSError, ValueError, KeyError, TypeError):
+        return (False, None)
+    if 'value' not in answer:
+        return (False, None)
+    return (True, answer['value'])
+
+
+def load_element(elements_dir, modules, file):
+    """mod = load_element(elements_dir, modules, file)
+
+    Returns the module dict of the core element file, executing it the
+    first time, or None if file is not a core element.
+    """
+    file = os.path.realpath(file)
+    element_dir = os.path.dirname(file)
+    if os.path.dirname(element_dir) != elements_dir or os.path.basename(file) != os.path.basename(element_dir) + '.py':
+        return None
+    if file not in modules:
+        saved_path = sys.path
+        saved_cwd = os.getcwd()
+        mod = {}
+        try:
+            sys.path = [element_dir] + saved_path
+            os.chdir(element_dir)
+            with open(file, encoding='utf-8') as f:
+                exec(compile(f.read(), file, 'exec'), mod)
+        finally:
+            sys.path = saved_path
+            os.chdir(saved_cwd)
+        modules[file] = mod
+    return modules[file]
+
+
+def compute(elements_dir, modules, request):
+    """value_json = compute(elements_dir, modules, request)
+
+    Returns the JSON of the value of the function in the request, or None
+    if the function can't be computed by the server.
+    """
+    try:
+        mod = load_element(elements_dir, modules, request['file'])
+        method = None if mod is None else getattr(mod.get(request['fcn']), 'element_cache_wrapped', None)
+        if method is None:
+            return None
+        return json.dumps(method(*request['args']), allow_nan=False)
+    except Exception:
+        return None
+
+
+def serve(sock, elements_dir):
+    cache = collections.OrderedDict()
+    cache_bytes = 0
+    pending = collections.OrderedDict()
+    modules = {}
+    while True:
+        # misses are only computed while no lookup is waiting
+        if pending and not select.select([sock], [], [], 0)[0]:
+            (key, request) = pending.popitem(last=False)
+            value_json = compute(elements_dir, modules, request)
+            if value_json is not None and len(key) + len(value_json) <= cache_max_bytes:
+                cache[key] = value_json
+                cache_bytes += len(key) + len(value_json)
+                while cache_bytes > cache_max_bytes:
+                    (old_key, old_value_json) = cache.popitem(last=False)
+                    cache_bytes -= len(old_key) + len(old_value_json)
+            continue
+
+        message = sock.recv(MAX_MESSAGE_BYTES)
+        if not message:
+            # every worker and the zygote have exited
+            return
+        try:
+            request = json.loads(message)
+            key = json.dumps([request['file'], request['fcn'], request['args']], sort_keys=True)
+            miss = '{"id": %s}' % json.dumps(request['id'])
+        except (ValueError, KeyError, TypeError):
+            continue
+        value_json = cache.get(key)
+        if value_json is None:
+            if key not in pending and len(pending) < MAX_PENDING:
+                pending[key] = request
+            answers = [miss]
+        else:
+            cache.move_to_end(key)
+            # if the value is too large for a message, report a miss
+            answers = [miss[:-1] + ', "value": ' + value_json + '}', miss]
+        for answer in answers:
+            try:
+                sock.send(answer.encode('utf-8'))
+                break
+            except OSError:
+                pass
@@ -0,0 +1,109 @@
+import json
+import decimal
+
+# Deltas between two JSON values, used by the forking python trampoline to
+# avoid sending the whole "data" dict to and from the Node side on every call.
+#
+# A delta is a list of JSON-patch-style operations, each of which is a dict
+# {'op': ..., 'path': [...], 'value': ...}. Unlike RFC 6902, 'path' is a list
+# of dict keys rather than a JSON pointer string. The operations are:
+#
+#     'add'     -> set path to value (the key did not exist before)
+#     'replace' -> set path to value (the key existed before)
+#     'remove'  -> delete path (no value)
+#
+# Only dicts are diffed recursively. Any other value (including lists) that
+# differs is replaced as a whole. An empty path replaces the root value.
+#
+# The same format is implemented in lib/json-delta.js.
+
+
+def json_copy(v):
+    """v_copy = json_copy(v)
+
+    Returns a deep copy of a JSON-serializable value.
+    """
+    return json.loads(json.dumps(v))
+
+
+def _js_number(x):
+    # a number is a double in JavaScript, and JSON.stringify() writes the
+    # integral ones below 1e21 without a fraction, with only as many
+    # significant digits as are needed to read the double back
+    if x != x or x in (float('inf'), float('-inf')):
+        return None
+    if x.is_integer() and abs(x) < 1e21:
+        if abs(x) < 2 ** 53:
+            return int(x)
+        return int(decimal.Decimal(repr(x)))
+    return x
+
+
+def _js_parse_int(s):
+    if len(s) < 16:
+        return int(s)
+    return _js_number(float(s))
+
+
+def js_copy(v):
+    """v_copy = js_copy(v)
+
+    Returns a deep copy of a JSON-serializable value as the Node side has
+    it after parsing and serializing it again, so that the value is the same
+    whether it is sent as a delta or as a whole (e.g., 1.0 becomes 1).
+    """
+    return json.loads(json.dumps(v), parse_float=lambda s: _js_number(float(s)), parse_int=_js_parse_int,
+                      parse_constant=lambda s: None)
+
+
+def _same(old, new):
+    # 1 == 1.0 == True in python, but they are different JSON values
+    return type(old) is type(new) and old == new
+
+
+def diff(old, new, path=None):
+    """ops = diff(old, new)
+
+    Returns the list of operations that turns the JSON value old into new.
+    """
+    if path is None:
+        path = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': path + [key]})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({'op': 'add', 'path': path + [key], 'value': value})
+            else:
+                ops.extend(diff(old[key], value, path + [key]))
+        return ops
+    if _same(old, new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply(base, ops):
+    """new = apply(base, ops)
+
+    Applies the list of operations to the JSON value base and returns the
+    result. The base value is modified in place unless the root is replaced.
+    """
+    for op in ops:
+        path = op['path']
+        if len(path) == 0:
+            if op['op'] == 'remove':
+                raise Exception('cannot remove the root value')
+            base = op['value']
+            continue
+        parent = base
+        for key in path[:-1]:
+            parent = parent[key]
+        if op['op'] == 'remove':
+            del parent[path[-1]]
+        elif op['op'] in ('add', 'replace'):
+            parent[path[-1]] = op['value']
+        else:
+            raise Exception('unknown delta operation: {:s}'.format(str(op['op'])))
+    return base
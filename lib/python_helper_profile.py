@@ -0,0 +1,64 @@
+import os
+import re
+import sys
+import time
+import random
+import cProfile
+import itertools
+
+# Opt-in profiling of the functions called by the python trampolines. A
+# random fraction PL_PYTHON_PROFILE_FRACTION of the calls is run under
+# cProfile and each profile is written to the directory PL_PYTHON_PROFILE_DIR
+# as a .pstats file, which can be read with "python3 -m pstats <file>" or
+# converted to other formats (e.g., with gprof2dot or flameprof).
+#
+# The file name is tagged with the course and question (the "tag" sent by
+# the caller), the file that was called (the element or "server"), and the
+# function (the phase), for example:
+#
+#     20200601-120000-123-TAM212-lorenz_attractor-server-generate-4242-0.pstats
+
+profile_fraction = float(os.environ.get('PL_PYTHON_PROFILE_FRACTION', '0'))
+profile_dir = os.environ.get('PL_PYTHON_PROFILE_DIR', '')
+
+# The trampolines re-seed the "random" module for every variant, so use the
+# OS random source to choose the calls to profile. This also differs
+# between forked workers.
+_sampler = random.SystemRandom()
+
+# distinguishes the profiles written by a process in the same millisecond
+_counter = itertools.count()
+
+
+def _clean(name):
+    return re.sub(r'[^A-Za-z0-9_.]+', '_', str(name)).strip('_') or 'none'
+
+
+def profile_path(tag, file, fcn):
+    """path = profile_path(tag, file, fcn)
+
+    Returns the path of a new profile file for a call of fcn() in file.
+    """
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + '-{:03d}'.format(int(1000 * (now % 1)))
+    parts = [stamp] + [_clean(p) for p in (tag or '').split('/')] + [_clean(file), _clean(fcn), str(os.getpid()), str(next(_counter))]
+    return os.path.join(profile_dir, '-'.join(parts) + '.pstats')
+
+
+def call(method, args, tag, file, fcn):
+    """val = call(method, args, tag, file, fcn)
+
+    Returns method(*args), profiling the call if it is sampled.
+    """
+    if profile_fraction <= 0 or not profile_dir or _sampler.random() >= profile_fraction:
+        return method(*args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(method, *args)
+    finally:
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(profile_path(tag, file, fcn))
+        except OSError as e:
+            # profiling must never break the call itself
+            sys.stderr.write('Error writing profile: {:s}\n'.format(str(e)))
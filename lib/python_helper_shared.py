@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# Large return values of file() are passed from the python trampolines to
+# PythonCaller through a file in a memory-backed directory (e.g., /dev/shm)
+# instead of being base64-encoded into the JSON output, which makes them a
+# third larger and makes the caller parse a single multi-megabyte line. Only
+# a small descriptor {"path": ..., "size": ...} is sent in the JSON, and the
+# caller deletes the file after reading it.
+#
+# The directory is PL_PYTHON_SHARED_DIR and the names of the files start
+# with PL_PYTHON_SHARED_PREFIX, so that the caller can delete any files
+# left behind when the worker exits. Only values of at least
+# PL_PYTHON_SHARED_MIN_BYTES bytes are passed this way. If the directory is
+# not set or the file can't be written, the value is sent as base64.
+
+shared_dir = os.environ.get('PL_PYTHON_SHARED_DIR', '')
+shared_prefix = os.environ.get('PL_PYTHON_SHARED_PREFIX', 'pl-file-')
+shared_min_bytes = int(os.environ.get('PL_PYTHON_SHARED_MIN_BYTES', '65536'))
+
+
+def write_shared(val):
+    """descriptor = write_shared(val)
+
+    Writes the bytes val to a new file in the shared directory and returns
+    its descriptor, or None if val should be sent in the JSON instead.
+    """
+    if not shared_dir or not isinstance(val, bytes) or len(val) < shared_min_bytes:
+        return None
+    try:
+        (fd, path) = tempfile.mkstemp(prefix=shared_prefix, dir=shared_dir)
+    except OSError:
+        return None
+    try:
+        with open(fd, 'wb') as f:
+            f.write(val)
+    except OSError:
+        os.unlink(path)
+        return None
+    return {'path': path, 'size': len(val)}
@@ -1,9 +1,16 @@
 import sympy
 import ast
 import sys
-
-# Create a new instance of this class to access the member dictionaries. This
-# is to avoid accidentally modifying these dictionaries.
+import functools
+import os
+import signal
+import select
+import traceback
+import numpy as np
+
+# Use the module-level instance _constants (below) to access the member
+# dictionaries. These are shared by all conversions, so never modify them;
+# copy them first instead.
 class _Constants:
     def __init__(self):
         self.helpers = {
@@ -33,6 +40,8 @@ class _Constants:
             'sqrt': sympy.sqrt,
         }
 
+_constants = _Constants()
+
 # Safe evaluation of user input to convert from string to sympy expression.
 #
 # Adapted from:
@@ -113,59 +122,86 @@ class HasEscapeError(Error):
 class HasCommentError(Error):
     pass
 
-class CheckNumbers(ast.NodeTransformer):
-    def visit_Num(self, node):
-        if isinstance(node.n, int):
-            return ast.Call(func=ast.Name(id='_Integer', ctx=ast.Load()), args=[node], keywords=[])
-        elif isinstance(node.n, float):
-            raise HasFloatError(node.col_offset, node.n)
-        elif isinstance(node.n, complex):
-            raise HasComplexError(node.col_offset, node.n)
-        return node
+# AST node types that may appear in an expression.
+#
+# Be very careful about adding to the list below. In particular,
+# do not add `ast.Attribute` without fully understanding the
+# reflection-based attacks described by
+# https://nedbatchelder.com/blog/201206/eval_really_is_dangerous.html
+# http://blog.delroth.net/2013/03/escaping-a-python-sandbox-ndh-2013-quals-writeup/
+#
+# Numbers (`ast.Num`) are also allowed, see CheckExpression.is_number().
+_whitelist = frozenset([ast.Module, ast.Expr, ast.Load, ast.Expression, ast.Call, ast.Name, ast.UnaryOp, ast.UAdd, ast.USub, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow])
 
-class CheckWhiteList(ast.NodeVisitor):
-    def __init__(self, whitelist):
-        self.whitelist = whitelist
+class CheckExpression:
+    """Validates and transforms the AST of an expression in a single pass.
 
-    def visit(self, node):
-        if not isinstance(node, self.whitelist):
-            node = get_parent_with_location(node)
-            raise HasInvalidExpressionError(node.col_offset)
-        return super().visit(node)
+    This does all of the following:
 
-class CheckFunctions(ast.NodeVisitor):
-    def __init__(self, functions):
+    - Disallow functions that are not in `functions`
+    - Disallow variables that are not in `variables`
+    - Disallow AST nodes that are not in the whitelist
+    - Disallow float and complex, and replace int with sympy equivalent
+
+    If there are several errors, the one that is raised is the first one (in
+    depth-first order) of the first kind in the list above.
+    """
+    def __init__(self, functions, variables):
         self.functions = functions
-    def visit_Call(self, node):
-        if isinstance(node.func, ast.Name):
-            if node.func.id not in self.functions:
-                node = get_parent_with_location(node)
-                raise HasInvalidFunctionError(node.col_offset, node.func.id)
-        self.generic_visit(node)
-
-class CheckVariables(ast.NodeVisitor):
-    def __init__(self, variables):
         self.variables = variables
-    def visit_Name(self, node):
-        if isinstance(node.ctx, ast.Load):
-            if not is_name_of_function(node):
-                if node.id not in self.variables:
-                    node = get_parent_with_location(node)
-                    raise HasInvalidVariableError(node.col_offset, node.id)
-        self.generic_visit(node)
-
-def is_name_of_function(node):
-    # The node is the name of a function if all of the following are true:
-    # 1) it has type ast.Name
-    # 2) its parent has type ast.Call
-    # 3) it is not in the list of parent's args
-    return isinstance(node, ast.Name) and isinstance(node.parent, ast.Call) and (node not in node.parent.args)
-
-def get_parent_with_location(node):
-    if hasattr(node, 'col_offset'):
+        self.function_error = None
+        self.variable_error = None
+        self.whitelist_error = None
+        self.number_error = None
+
+    @staticmethod
+    def is_number(node):
+        # ast.Num also matches numeric ast.Constant nodes in python >= 3.8
+        return isinstance(node, ast.Num)
+
+    def check(self, root):
+        root = self.visit(root, None, None)
+        for err in (self.function_error, self.variable_error, self.whitelist_error, self.number_error):
+            if err is not None:
+                raise err
+        return root
+
+    def visit(self, node, parent, located):
+        # Errors are reported at the nearest node (or ancestor) with a location
+        if hasattr(node, 'col_offset'):
+            located = node
+
+        if type(node) not in _whitelist and not self.is_number(node):
+            if self.whitelist_error is None:
+                self.whitelist_error = HasInvalidExpressionError(located.col_offset)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id not in self.functions and self.function_error is None:
+                self.function_error = HasInvalidFunctionError(located.col_offset, node.func.id)
+
+        # The name of a function is checked as a function, not as a variable
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            is_name_of_function = isinstance(parent, ast.Call) and node is parent.func
+            if not is_name_of_function and node.id not in self.variables and self.variable_error is None:
+                self.variable_error = HasInvalidVariableError(located.col_offset, node.id)
+
+        if self.is_number(node):
+            if isinstance(node.n, int):
+                return ast.Call(func=ast.Name(id='_Integer', ctx=ast.Load()), args=[node], keywords=[])
+            elif isinstance(node.n, float):
+                if self.number_error is None:
+                    self.number_error = HasFloatError(located.col_offset, node.n)
+            elif isinstance(node.n, complex):
+                if self.number_error is None:
+                    self.number_error = HasComplexError(located.col_offset, node.n)
+            return node
+
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                value[:] = [self.visit(child, node, located) if isinstance(child, ast.AST) else child for child in value]
+            elif isinstance(value, ast.AST):
+                setattr(node, field, self.visit(value, node, located))
         return node
-    else:
-        return get_parent_with_location(node.parent)
 
 def evaluate(expr, locals_for_eval={}):
 
@@ -183,30 +219,10 @@ def evaluate(expr, locals_for_eval={}):
     except Exception as err:
         raise HasParseError(err.offset)
 
-    # Link each node to its parent
-    for node in ast.walk(root):
-        for child in ast.iter_child_nodes(node):
-            child.parent = node
-
-    # Disallow functions that are not in locals_for_eval
-    CheckFunctions(locals_for_eval['functions']).visit(root)
-
-    # Disallow variables that are not in locals_for_eval
-    CheckVariables(locals_for_eval['variables']).visit(root)
-
-    # Disallow AST nodes that are not in whitelist
-    #
-    # Be very careful about adding to the list below. In particular,
-    # do not add `ast.Attribute` without fully understanding the
-    # reflection-based attacks described by
-    # https://nedbatchelder.com/blog/201206/eval_really_is_dangerous.html
-    # http://blog.delroth.net/2013/03/escaping-a-python-sandbox-ndh-2013-quals-writeup/
-    #
-    whitelist = (ast.Module, ast.Expr, ast.Load, ast.Expression, ast.Call, ast.Name, ast.Num, ast.UnaryOp, ast.UAdd, ast.USub, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow)
-    CheckWhiteList(whitelist).visit(root)
-
-    # Disallow float and complex, and replace int with sympy equivalent
-    root = CheckNumbers().visit(root)
+    # Disallow functions and variables that are not in locals_for_eval, AST
+    # nodes that are not in the whitelist, and float and complex, and replace
+    # int with sympy equivalent
+    root = CheckExpression(locals_for_eval['functions'], locals_for_eval['variables']).check(root)
 
     # Clean up lineno and col_offset attributes
     ast.fix_missing_locations(root)
@@ -215,17 +231,25 @@ def evaluate(expr, locals_for_eval={}):
     # a whitelist of local expressions
     locals = {}
     for key in locals_for_eval:
-        locals = {**locals, **locals_for_eval[key]}
+        locals.update(locals_for_eval[key])
     return eval(compile(root, '<ast>', 'eval'), {'__builtins__': None}, locals)
 
 def convert_string_to_sympy(a, variables, allow_hidden=False, allow_complex=False):
-    const = _Constants()
+    # Sympy expressions are immutable, so the result of the conversion is
+    # cached and shared between calls with the same arguments.
+    if variables is not None:
+        variables = tuple(variables)
+    return _convert_string_to_sympy_cached(a, variables, allow_hidden, allow_complex)
+
+@functools.lru_cache(maxsize=1024)
+def _convert_string_to_sympy_cached(a, variables, allow_hidden, allow_complex):
+    const = _constants
 
     # Create a whitelist of valid functions and variables (and a special flag
     # for numbers that are converted to sympy integers).
     locals_for_eval = {
         'functions': const.functions,
-        'variables': const.variables,
+        'variables': {**const.variables},
         'helpers': const.helpers,
     }
     if allow_hidden:
@@ -249,7 +273,7 @@ def point_to_error(s, ind, w = 5):
     return s[ind-w_left:ind+w_right] + '\n' + ' '*w_left + '^' + ' '*w_right
 
 def sympy_to_json(a, allow_complex=True):
-    const = _Constants()
+    const = _constants
 
     # Get list of variables in the sympy expression
     variables = [str(v) for v in a.free_symbols]
@@ -281,3 +305,95 @@ def json_to_sympy(a, allow_complex=True):
         a['_variables'] = None
 
     return convert_string_to_sympy(a['_value'], a['_variables'], allow_hidden=True, allow_complex=allow_complex)
+
+def call_with_time_limit(f, seconds):
+    """result = call_with_time_limit(f, seconds)
+
+    Returns bool(f()), computed in a forked child process that is killed if
+    it takes longer than seconds, in which case None is returned. This does
+    not use signals, so it does not interfere with the process that calls
+    it (e.g., a python worker that is shared by many calls).
+    """
+    (r, w) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            msg = b'1' if f() else b'0'
+        except Exception:
+            msg = b'e' + traceback.format_exc().encode('utf-8', 'replace')
+        with os.fdopen(w, 'wb') as out:
+            out.write(msg)
+        # don't run the cleanup of the parent, e.g., flushing its output
+        os._exit(0)
+    os.close(w)
+    msg = b''
+    try:
+        with os.fdopen(r, 'rb') as inp:
+            if select.select([inp], [], [], seconds)[0]:
+                msg = inp.read()
+    finally:
+        if not msg:
+            os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    if not msg:
+        return None
+    if msg[:1] == b'e':
+        raise RuntimeError('comparison failed in the child process:\n' + msg[1:].decode('utf-8'))
+    return msg == b'1'
+
+def numerically_equal(a, b, samples=64, seed=0, rtol_equal=1e-9, rtol_different=1e-3):
+    """result = numerically_equal(a, b)
+
+    Compares two sympy expressions by evaluating both with numpy at the same
+    random complex values of their variables (which, like sympy symbols, are
+    not assumed to be real). Returns True if they agree at every point up to
+    rounding error, False if they clearly differ at some point, and None if
+    the test is inconclusive (e.g., if the expressions could not be evaluated
+    at enough points, or differ by more than rounding error but not clearly).
+
+    The same seed is used every time, so the result is deterministic.
+    """
+    symbols = sorted(a.free_symbols | b.free_symbols, key=str)
+    rng = np.random.default_rng(seed)
+    points = [rng.uniform(-2, 2, samples) + 1j * rng.uniform(-2, 2, samples) for _ in symbols]
+    try:
+        with np.errstate(all='ignore'):
+            f_a = np.broadcast_to(sympy.lambdify(symbols, a, 'numpy')(*points), (samples,)).astype(np.complex128)
+            f_b = np.broadcast_to(sympy.lambdify(symbols, b, 'numpy')(*points), (samples,)).astype(np.complex128)
+    except Exception:
+        return None
+
+    finite = np.isfinite(f_a) & np.isfinite(f_b)
+    if np.count_nonzero(finite) < samples // 2:
+        return None
+    f_a = f_a[finite]
+    f_b = f_b[finite]
+    scale = np.maximum(np.maximum(np.abs(f_a), np.abs(f_b)), 1)
+    difference = np.abs(f_a - f_b) / scale
+    if np.all(difference <= rtol_equal):
+        return True
+    if np.any(difference > rtol_different):
+        return False
+    return None
+
+def is_equal(a, b, numeric_check=False, timeout=None):
+    """correct = is_equal(a, b, numeric_check=False, timeout=None)
+
+    Returns True if the sympy expressions a and b are equal, using
+    a.equals(b). If numeric_check is True, the expressions are first compared
+    with numerically_equal(), and a.equals(b) is only used if that test is
+    inconclusive. If timeout is not None, the comparison is made with
+    call_with_time_limit() and None is returned if it takes longer than that
+    many seconds.
+    """
+    if timeout is None:
+        return _is_equal(a, b, numeric_check)
+    return call_with_time_limit(lambda: _is_equal(a, b, numeric_check), timeout)
+
+def _is_equal(a, b, numeric_check):
+    if numeric_check:
+        result = numerically_equal(a, b)
+        if result is not None:
+            return result
+    return bool(a.equals(b))
@@ -21,6 +21,7 @@ const cache = require('../lib/cache');
 const courseUtil = require('../lib/courseUtil');
 const markdown = require('../lib/markdown');
 const chunks = require('../lib/chunks');
+const jsonDelta = require('../lib/json-delta');
 
 // Maps core element names to element info
 let coreElementsCache = {};
@@ -314,6 +315,7 @@ module.exports = {
             const opts = {
                 cwd,
                 paths,
+                profileTag: module.exports.pythonProfileTag(context),
             };
             pc.call(pythonFile, fcn, pythonArgs, opts, (err, ret, consoleLog) => {
                 if (err instanceof codeCaller.FunctionMissingError) {
@@ -326,6 +328,75 @@ module.exports = {
         });
     },
 
+    /**
+     * Calls the given phase for a list of Python elements in a single round
+     * trip to the worker, threading data through all of them in order.
+     * Resolves to [{data, failed, steps}, consoleLog] (see callBatch() in
+     * lib/code-caller.js).
+     * @param  {Array} elements List of {elementName, elementHtml} objects
+     * @param  {Object} options Extra options for callBatch(), such as steps
+     */
+    elementFunctionBatch: async function(pc, fcn, elements, data, context, options = {}) {
+        return new Promise((resolve, reject) => {
+            const calls = _.map(elements, ({elementName, elementHtml}) => {
+                const resolvedElement = module.exports.resolveElement(elementName, context);
+                const paths = [path.join(__dirname, 'freeformPythonLib')];
+                if (resolvedElement.type == 'course') {
+                    paths.push(path.join(context.course_dir, 'serverFilesCourse'));
+                }
+                return {
+                    file: resolvedElement.controller.replace(/\.[pP][yY]$/, ''),
+                    cwd: resolvedElement.directory,
+                    paths,
+                    element_html: elementHtml,
+                    extensions: _.get(context.course_element_extensions, elementName, []),
+                };
+            });
+            const opts = _.assign({}, options, {
+                profileTag: module.exports.pythonProfileTag(context),
+                // the same total time as if the elements were called one at a time
+                timeout: calls.length * config.questionTimeoutMilliseconds,
+            });
+            pc.callBatch(fcn, calls, data, opts, (err, ret, consoleLog) => {
+                if (ERR(err, reject)) return;
+                resolve([ret, consoleLog]);
+            });
+        });
+    },
+
+    /**
+     * Finds the element of a batch after which data is invalid. "data" is
+     * only checked after the whole batch, as getting the change that each
+     * element made to it costs a full copy of data per element, so this
+     * calls the batch again with those changes only once a check failed.
+     * Resolves to {index, checkErr} for the first element after which
+     * checkData() fails, or null if it can't be found.
+     */
+    findInvalidBatchElement: async function(pc, phase, elements, origData, context) {
+        let ret_val;
+        try {
+            [ret_val] = await module.exports.elementFunctionBatch(pc, phase, elements, JSON.parse(JSON.stringify(origData)), context, {steps: true});
+        } catch (e) {
+            return null;
+        }
+        let data = JSON.parse(JSON.stringify(origData));
+        for (const [index, step] of (ret_val.steps || []).entries()) {
+            data = jsonDelta.apply(data, step);
+            const checkErr = module.exports.checkData(data, origData, phase);
+            if (checkErr) return {index, checkErr};
+        }
+        return null;
+    },
+
+    /**
+     * Returns true if all element calls for this phase should be sent to
+     * the Python worker as a single batch. Batching is only possible for
+     * phases where the elements only modify data.
+     */
+    canBatchElementFunctions: function(phase) {
+        return config.useWorkers && config.pythonBatchElementCalls && ['prepare', 'parse', 'grade', 'test'].includes(phase);
+    },
+
     legacyElementFunction: function(pc, fcn, elementName, $, element, data, context, callback) {
         let resolvedElement;
         try {
@@ -350,6 +421,7 @@ module.exports = {
             const opts = {
                 cwd,
                 paths,
+                profileTag: module.exports.pythonProfileTag(context),
             };
             debug(`elementFunction(): pc.call(pythonFile=${pythonFile}, pythonFunction=${fcn})`);
             pc.call(pythonFile, fcn, pythonArgs, opts, (err, ret, consoleLog) => {
@@ -372,6 +444,14 @@ module.exports = {
         }
     },
 
+    /**
+     * Returns the "course/question" tag of the profiles of Python calls for
+     * this question (see config.pythonProfileFraction).
+     */
+    pythonProfileTag: function(context) {
+        return `${_.get(context, 'course.short_name', '')}/${_.get(context, 'question.qid', '')}`;
+    },
+
     defaultElementFunctionRet: function(phase, data) {
         if (phase == 'render') {
             return '';
@@ -400,6 +480,7 @@ module.exports = {
         const opts = {
             cwd: context.question_dir,
             paths: [path.join(__dirname, 'freeformPythonLib'), path.join(context.course_dir, 'serverFilesCourse')],
+            profileTag: module.exports.pythonProfileTag(context),
         };
         const fullFilename = path.join(context.question_dir, 'server.py');
         fs.access(fullFilename, fs.constants.R_OK, (err) => {
@@ -519,6 +600,52 @@ module.exports = {
         return null;
     },
 
+    batchTraverseQuestionAndExecuteFunctions: async function(phase, pc, data, context, elements, questionHtml, callback) {
+        const origData = JSON.parse(JSON.stringify(data));
+        const courseIssues = [];
+        if (elements.length == 0) {
+            return callback(courseIssues, data, questionHtml, Buffer.from(''), []);
+        }
+        const elementFiles = _.uniq(_.map(elements, ({elementName}) => module.exports.getElementController(elementName, context))).join(', ');
+        try {
+            let ret_val, consoleLog;
+            try {
+                [ret_val, consoleLog] = await module.exports.elementFunctionBatch(pc, phase, elements, data, context);
+            } catch (e) {
+                const courseIssue = new Error(`${elementFiles}: Error calling ${phase}(): ${e.toString()}`);
+                courseIssue.data = e.data;
+                courseIssue.fatal = true;
+                throw courseIssue;
+            }
+            if (ret_val.failed == null && _.isString(consoleLog) && consoleLog.length > 0) {
+                const courseIssue = new Error(`${elementFiles}: output logged on console during ${phase}()`);
+                courseIssue.data = { outputBoth: consoleLog };
+                courseIssue.fatal = false;
+                courseIssues.push(courseIssue);
+            }
+            if (ret_val.failed != null) {
+                const elementFile = module.exports.getElementController(elements[ret_val.failed].elementName, context);
+                const courseIssue = new Error(`${elementFile}: Error calling ${phase}(): Error: exception raised by the element`);
+                courseIssue.data = { outputBoth: consoleLog };
+                courseIssue.fatal = true;
+                throw courseIssue;
+            }
+            const checkErr = module.exports.checkData(ret_val.data, origData, phase);
+            if (checkErr) {
+                const invalid = await module.exports.findInvalidBatchElement(pc, phase, elements, origData, context);
+                const courseIssue = invalid
+                    ? new Error(`${module.exports.getElementController(elements[invalid.index].elementName, context)}: Invalid state after ${phase}(): ${invalid.checkErr}`)
+                    : new Error(`${elementFiles}: Invalid state after ${phase}(): ${checkErr}`);
+                courseIssue.fatal = true;
+                throw courseIssue;
+            }
+            data = ret_val.data;
+        } catch (e) {
+            courseIssues.push(e);
+        }
+        callback(courseIssues, data, questionHtml, Buffer.from(''), []);
+    },
+
     traverseQuestionAndExecuteFunctions: async function(phase, pc, data, context, html, callback) {
         const origData = JSON.parse(JSON.stringify(data));
         const renderedElementNames = [];
@@ -526,6 +653,32 @@ module.exports = {
         let fileData = Buffer.from('');
         const questionElements = new Set([..._.keys(coreElementsCache), ..._.keys(context.course_elements)]);
 
+        if (module.exports.canBatchElementFunctions(phase)) {
+            // Elements don't change the question HTML in this phase, so we
+            // can collect all of them up front (in the same depth-first
+            // order as visitNode() below) and call them in one batch.
+            const elements = [];
+            const collectNode = (node) => {
+                if (node.tagName && questionElements.has(node.tagName)) {
+                    elements.push({
+                        elementName: node.tagName,
+                        elementHtml: parse5.serialize({childNodes: [node]}),
+                    });
+                }
+                _.each(node.childNodes || [], collectNode);
+            };
+            let questionHtml;
+            try {
+                const fragment = parse5.parseFragment(html);
+                collectNode(fragment);
+                questionHtml = parse5.serialize(fragment);
+            } catch (e) {
+                courseIssues.push(e);
+                return callback(courseIssues, data, '', fileData, renderedElementNames);
+            }
+            return module.exports.batchTraverseQuestionAndExecuteFunctions(phase, pc, data, context, elements, questionHtml, callback);
+        }
+
         const visitNode = async (node) => {
             if (node.tagName && questionElements.has(node.tagName)) {
                 const elementName = node.tagName;
@@ -572,8 +725,9 @@ module.exports = {
                     node = parse5.parseFragment(ret_val);
                 } else if (phase == 'file') {
                     // Convert ret_val from base64 back to buffer (this always works,
-                    // whether or not ret_val is valid base64)
-                    const buf = Buffer.from(ret_val, 'base64');
+                    // whether or not ret_val is valid base64), unless it was
+                    // passed as a buffer through config.pythonSharedDir
+                    const buf = Buffer.isBuffer(ret_val) ? ret_val : Buffer.from(ret_val, 'base64');
                     // If the buffer has non-zero length...
                     if (buf.length > 0) {
                         if (fileData.length > 0) {
@@ -629,6 +783,35 @@ module.exports = {
         let fileData = Buffer.from('');
         const questionElements = new Set([..._.keys(coreElementsCache), ..._.keys(context.course_elements)]).values();
 
+        if (module.exports.canBatchElementFunctions(phase)) {
+            // Collect the elements in the same order as the loop below. We
+            // fall back to calling them one at a time if any of them can't
+            // be batched (e.g., has a JS controller or fails to resolve).
+            const elements = [];
+            let canBatch = true;
+            for (const elementName of new Set([..._.keys(coreElementsCache), ..._.keys(context.course_elements)])) {
+                for (const element of $(elementName).toArray()) {
+                    let resolvedElement;
+                    try {
+                        resolvedElement = module.exports.resolveElement(elementName, context);
+                    } catch (e) {
+                        canBatch = false;
+                        break;
+                    }
+                    if (!_.isString(resolvedElement.controller)) {
+                        canBatch = false;
+                        break;
+                    }
+                    const elementHtml = $(element).clone().wrap('<container/>').parent().html();
+                    elements.push({elementName, elementHtml});
+                }
+                if (!canBatch) break;
+            }
+            if (canBatch) {
+                return module.exports.batchTraverseQuestionAndExecuteFunctions(phase, pc, data, context, elements, $.html(), callback);
+            }
+        }
+
         async.eachSeries(questionElements, (elementName, callback) => {
             async.eachSeries($(elementName).toArray(), (element, callback) => {
                 if (phase === 'render' && !_.includes(renderedElementNames, element)) {
@@ -803,8 +986,9 @@ module.exports = {
                 html = ret_val;
             } else if (phase == 'file') {
                 // Convert ret_val from base64 back to buffer (this always works,
-                // whether or not ret_val is valid base64)
-                var buf = Buffer.from(ret_val, 'base64');
+                // whether or not ret_val is valid base64), unless it was
+                // passed as a buffer through config.pythonSharedDir
+                var buf = Buffer.isBuffer(ret_val) ? ret_val : Buffer.from(ret_val, 'base64');
 
                 // If the buffer has non-zero length...
                 if (buf.length > 0) {
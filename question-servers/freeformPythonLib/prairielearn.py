@@ -3,11 +3,6 @@ import html
 import to_precision
 import numpy as np
 import uuid
-import sympy
-import pandas
-from python_helper_sympy import convert_string_to_sympy
-from python_helper_sympy import sympy_to_json
-from python_helper_sympy import json_to_sympy
 import re
 import colors
 import unicodedata
@@ -15,10 +10,36 @@ import importlib
 import importlib.util
 import os
 import collections
+import base64
+import sys
+import chevron
+import chevron.tokenizer
+import copy
+import time
+import itertools
+import json
+import functools
 
 
-def to_json(v):
-    """to_json(v)
+def _python_helper_sympy():
+    # python_helper_sympy imports sympy, which is slow, so it is only
+    # imported when a sympy value is converted
+    return importlib.import_module('python_helper_sympy')
+
+
+def __getattr__(name):
+    # sympy, pandas, and some python_helper_sympy functions used to be
+    # imported at the top of this module, so keep them available as
+    # attributes (e.g., pl.sympy) that are imported on first use
+    if name in ('sympy', 'pandas'):
+        return importlib.import_module(name)
+    if name in ('convert_string_to_sympy', 'sympy_to_json', 'json_to_sympy'):
+        return getattr(_python_helper_sympy(), name)
+    raise AttributeError('module {:s} has no attribute {:s}'.format(__name__, name))
+
+
+def to_json(v, ndarray_encoding='list'):
+    """to_json(v, ndarray_encoding='list')
 
     If v has a standard type that cannot be json serialized, it is replaced with
     a {'_type':..., '_value':...} pair that can be json serialized:
@@ -32,6 +53,13 @@ def to_json(v):
     If v is an ndarray, this function preserves its dtype (by adding '_dtype' as
     a third field in the dictionary).
 
+    If ndarray_encoding is 'list' (the default), an ndarray is stored as nested
+    lists. If ndarray_encoding is 'base64', an ndarray is instead stored as the
+    base64 encoding of its raw buffer, together with its shape and byte order
+    (as '_shape' and '_byteorder', with '_encoding' set to 'base64'). This is
+    much smaller and faster for large arrays. Arrays of python objects are
+    always stored as nested lists.
+
     This function does not try to preserve information like the assumptions on
     variables in a sympy expression.
 
@@ -41,13 +69,21 @@ def to_json(v):
     if np.isscalar(v) and np.iscomplexobj(v):
         return {'_type': 'complex', '_value': {'real': v.real, 'imag': v.imag}}
     elif isinstance(v, np.ndarray):
+        if ndarray_encoding == 'base64' and not v.dtype.hasobject:
+            return _ndarray_to_base64(v)
+        elif ndarray_encoding not in ('list', 'base64'):
+            raise ValueError('ndarray_encoding must be either "list" or "base64": {:s}'.format(str(ndarray_encoding)))
         if np.isrealobj(v):
             return {'_type': 'ndarray', '_value': v.tolist(), '_dtype': str(v.dtype)}
         elif np.iscomplexobj(v):
             return {'_type': 'complex_ndarray', '_value': {'real': v.real.tolist(), 'imag': v.imag.tolist()}, '_dtype': str(v.dtype)}
-    elif isinstance(v, sympy.Expr):
-        return sympy_to_json(v)
-    elif isinstance(v, sympy.Matrix) or isinstance(v, sympy.ImmutableMatrix):
+    # sympy and pandas are slow to import and are only loaded when needed,
+    # so v can only be one of their types if they have already been imported
+    sympy = sys.modules.get('sympy')
+    pandas = sys.modules.get('pandas')
+    if sympy is not None and isinstance(v, sympy.Expr):
+        return _python_helper_sympy().sympy_to_json(v)
+    elif sympy is not None and (isinstance(v, sympy.Matrix) or isinstance(v, sympy.ImmutableMatrix)):
         s = [str(a) for a in v.free_symbols]
         num_rows, num_cols = v.shape
         M = []
@@ -57,12 +93,36 @@ def to_json(v):
                 row.append(str(v[i, j]))
             M.append(row)
         return {'_type': 'sympy_matrix', '_value': M, '_variables': s, '_shape': [num_rows, num_cols]}
-    elif isinstance(v, pandas.DataFrame):
+    elif pandas is not None and isinstance(v, pandas.DataFrame):
         return {'_type': 'dataframe', '_value': {'index': list(v.index), 'columns': list(v.columns), 'data': v.values.tolist()}}
     else:
         return v
 
 
+def _ndarray_to_base64(v):
+    if v.dtype.byteorder in ('<', '>'):
+        byteorder = 'little' if v.dtype.byteorder == '<' else 'big'
+    else:
+        byteorder = sys.byteorder
+    return {
+        '_type': 'complex_ndarray' if np.iscomplexobj(v) else 'ndarray',
+        '_value': base64.b64encode(np.ascontiguousarray(v).data).decode(),
+        '_dtype': str(v.dtype),
+        '_shape': list(v.shape),
+        '_byteorder': byteorder,
+        '_encoding': 'base64',
+    }
+
+
+def _ndarray_from_base64(v):
+    if not (('_value' in v) and ('_dtype' in v) and ('_shape' in v) and ('_byteorder' in v)):
+        raise Exception('variable of type {:s} with base64 encoding should have value, dtype, shape, and byteorder'.format(v['_type']))
+    dtype = np.dtype(v['_dtype']).newbyteorder('<' if v['_byteorder'] == 'little' else '>')
+    # decode into a bytearray so that the array shares its (writable) memory
+    buffer = bytearray(base64.b64decode(v['_value']))
+    return np.frombuffer(buffer, dtype=dtype).reshape(v['_shape'])
+
+
 def from_json(v):
     """from_json(v)
 
@@ -76,7 +136,8 @@ def from_json(v):
         '_type': 'sympy_matrix' -> sympy.Matrix
 
     If v encodes an ndarray and has the field '_dtype', this function recovers
-    its dtype.
+    its dtype. Both the nested list and the base64 encodings of an ndarray
+    (see to_json) are supported.
 
     This function does not try to recover information like the assumptions on
     variables in a sympy expression.
@@ -91,6 +152,8 @@ def from_json(v):
                     return complex(v['_value']['real'], v['_value']['imag'])
                 else:
                     raise Exception('variable of type complex should have value with real and imaginary pair')
+            elif v.get('_encoding') == 'base64' and v['_type'] in ('ndarray', 'complex_ndarray'):
+                return _ndarray_from_base64(v)
             elif v['_type'] == 'ndarray':
                 if ('_value' in v):
                     if ('_dtype' in v):
@@ -108,23 +171,24 @@ def from_json(v):
                 else:
                     raise Exception('variable of type complex_ndarray should have value with real and imaginary pair')
             elif v['_type'] == 'sympy':
-                return json_to_sympy(v)
+                return _python_helper_sympy().json_to_sympy(v)
             elif v['_type'] == 'sympy_matrix':
                 if ('_value' in v) and ('_variables' in v) and ('_shape' in v):
                     value = v['_value']
                     variables = v['_variables']
                     shape = v['_shape']
-                    M = sympy.Matrix.zeros(shape[0], shape[1])
+                    phs = _python_helper_sympy()
+                    M = phs.sympy.Matrix.zeros(shape[0], shape[1])
                     for i in range(0, shape[0]):
                         for j in range(0, shape[1]):
-                            M[i, j] = convert_string_to_sympy(value[i][j], variables)
+                            M[i, j] = phs.convert_string_to_sympy(value[i][j], variables)
                     return M
                 else:
                     raise Exception('variable of type sympy_matrix should have value, variables, and shape')
             elif v['_type'] == 'dataframe':
                 if ('_value' in v) and ('index' in v['_value']) and ('columns' in v['_value']) and ('data' in v['_value']):
                     val = v['_value']
-                    return pandas.DataFrame(index=val['index'], columns=val['columns'], data=val['data'])
+                    return importlib.import_module('pandas').DataFrame(index=val['index'], columns=val['columns'], data=val['data'])
                 else:
                     raise Exception('variable of type dataframe should have value with index, columns, and data')
             else:
@@ -132,6 +196,42 @@ def from_json(v):
     return v
 
 
+# Cache of parsed element HTML, keyed by the element_html string. An element
+# is usually parsed once in each phase (prepare, render, parse, grade, test)
+# with the same element_html, so later phases in the same worker can skip
+# the HTML parser. The cache is an LRU with at most ELEMENT_CACHE_SIZE entries.
+ELEMENT_CACHE_SIZE = 256
+_element_cache = collections.OrderedDict()
+
+# Counters for parse_element(), to compare the time spent on parsing
+# element HTML with the total time spent in element code.
+element_parse_stats = {'calls': 0, 'hits': 0, 'seconds': 0.0}
+
+
+def parse_element(element_html):
+    """element = parse_element(element_html)
+
+    Returns the lxml element for element_html, like
+    lxml.html.fragment_fromstring(element_html), but using a cache of
+    previously parsed elements. Each call returns a new copy of the
+    cached element, so it is safe to modify the returned element.
+    """
+    start = time.perf_counter()
+    element_parse_stats['calls'] += 1
+    element = _element_cache.get(element_html)
+    if element is None:
+        element = lxml.html.fragment_fromstring(element_html)
+        _element_cache[element_html] = element
+        if len(_element_cache) > ELEMENT_CACHE_SIZE:
+            _element_cache.popitem(last=False)
+    else:
+        element_parse_stats['hits'] += 1
+        _element_cache.move_to_end(element_html)
+    element = copy.deepcopy(element)
+    element_parse_stats['seconds'] += time.perf_counter() - start
+    return element
+
+
 def inner_html(element):
     inner = element.text
     if inner is None:
@@ -330,32 +430,13 @@ def numpy_to_matlab(A, ndigits=2, wtype='f'):
     if np.isscalar(A):
         A_str = '{:.{indigits}{iwtype}}'.format(A, indigits=ndigits, iwtype=wtype)
         return A_str
-    elif A.ndim == 1:
-        s = A.shape
-        m = s[0]
-        A_str = '['
-        for i in range(0, m):
-            A_str += '{:.{indigits}{iwtype}}'.format(A[i], indigits=ndigits, iwtype=wtype)
-            if i < m - 1:
-                A_str += ', '
-        A_str += ']'
-        return A_str
+    # Format all entries with the same bound format method, and build the
+    # string with joins rather than repeated concatenation
+    element_format = '{{:.{}{}}}'.format(ndigits, wtype).format
+    if A.ndim == 1:
+        return '[' + ', '.join(map(element_format, A.tolist())) + ']'
     else:
-        s = A.shape
-        m = s[0]
-        n = s[1]
-        A_str = '['
-        for i in range(0, m):
-            for j in range(0, n):
-                A_str += '{:.{indigits}{iwtype}}'.format(A[i, j], indigits=ndigits, iwtype=wtype)
-                if j == n - 1:
-                    if i == m - 1:
-                        A_str += ']'
-                    else:
-                        A_str += '; '
-                else:
-                    A_str += ' '
-        return A_str
+        return '[' + '; '.join(' '.join(map(element_format, row)) for row in A.tolist()) + ']'
 
 
 def string_from_numpy(A, language='python', presentation_type='f', digits=2):
@@ -526,38 +607,17 @@ def numpy_to_matlab_sf(A, ndigits=2):
         else:
             A_str = to_precision.to_precision(A, ndigits)
         return A_str
-    elif A.ndim == 1:
-        s = A.shape
-        m = s[0]
-        A_str = '['
-        for i in range(0, m):
-            if np.iscomplexobj(A[i]):
-                A_str += _string_from_complex_sigfig(A[i], ndigits)
-            else:
-                A_str += to_precision.to_precision(A[i], ndigits)
-            if i < m - 1:
-                A_str += ', '
-        A_str += ']'
-        return A_str
+
+    def element_format(x):
+        if np.iscomplexobj(x):
+            return _string_from_complex_sigfig(x, ndigits)
+        else:
+            return to_precision.to_precision(x, ndigits)
+
+    if A.ndim == 1:
+        return '[' + ', '.join(map(element_format, A)) + ']'
     else:
-        s = A.shape
-        m = s[0]
-        n = s[1]
-        A_str = '['
-        for i in range(0, m):
-            for j in range(0, n):
-                if np.iscomplexobj(A[i, j]):
-                    A_str += _string_from_complex_sigfig(A[i, j], ndigits)
-                else:
-                    A_str += to_precision.to_precision(A[i, j], ndigits)
-                if j == n - 1:
-                    if i == m - 1:
-                        A_str += ']'
-                    else:
-                        A_str += '; '
-                else:
-                    A_str += ' '
-        return A_str
+        return '[' + '; '.join(' '.join(map(element_format, row)) for row in A) + ']'
 
 
 def string_partition_first_interval(s, left='[', right=']'):
@@ -709,6 +769,32 @@ def string_fraction_to_number(a_sub, allow_fractions=True, allow_complex=True):
     return (value, data)
 
 
+def _tokens_to_real_2darray(rows, n):
+    """A = _tokens_to_real_2darray(rows, n)
+
+    Fast path for string_to_2darray(). Converts rows, a list of lists of
+    strings, to a 2D ndarray of type np.float64 in one pass. Returns None if
+    any row does not have n entries or if any entry is not a finite number
+    that float() can parse. The caller then falls back to converting entries
+    one at a time, which finds the first error and reports it.
+    """
+    if any(len(row) != n for row in rows):
+        return None
+    try:
+        A = np.fromiter(map(float, itertools.chain.from_iterable(rows)), dtype=np.float64, count=len(rows) * n)
+    except ValueError:
+        return None
+    if not np.isfinite(A).all():
+        return None
+    return A.reshape(len(rows), n)
+
+
+# Regexes for the fast path of string_to_2darray() in python format, matching
+# the string between the outer brackets when it is a valid list of rows
+_python_rows_regex = re.compile(r'\s*\[[^\[\]]*\](?:\s*,\s*\[[^\[\]]*\])*\s*')
+_python_row_regex = re.compile(r'\[([^\[\]]*)\]')
+
+
 def string_to_2darray(s, allow_complex=True):
     """string_to_2darray(s)
 
@@ -793,6 +879,19 @@ def string_to_2darray(s, allow_complex=True):
         if (n == 0):
             return (None, {'format_error': 'Row 1 of the matrix has no columns.'})
 
+        # Fast path: split all rows and convert all entries at once if they are valid real numbers
+        s_rows = []
+        for s_row in s:
+            s_row = re.split(matlab_delimiter_regex, s_row)
+            if s_row and not s_row[0]:
+                s_row.pop(0)
+            if s_row and not s_row[-1]:
+                s_row.pop(-1)
+            s_rows.append(s_row)
+        A = _tokens_to_real_2darray(s_rows, n)
+        if A is not None:
+            return (A, {'format_type': 'matlab'})
+
         # Define matrix in which to put result
         A = np.zeros((m, n))
 
@@ -847,8 +946,11 @@ def string_to_2darray(s, allow_complex=True):
         if ';' in s:
             return (None, {'format_error': 'Semicolons cannot be used as delimiters in an expression with nested brackets.'})
 
-        # Partition string into rows
+        # Partition string into rows, with a single regex pass if the rows are well formed
         s_row = []
+        if _python_rows_regex.fullmatch(s):
+            s_row = [row.strip() for row in _python_row_regex.findall(s)]
+            s = ''
         while s:
             # Get next row
             (s_before_left, s_between_left_and_right, s_after_right) = string_partition_first_interval(s)
@@ -901,6 +1003,11 @@ def string_to_2darray(s, allow_complex=True):
             elif number_of_columns != n:
                 return (None, {'format_error': f'Rows 1 and {i + 1} of the matrix have a different number of columns.'})
 
+        # Fast path: convert all entries at once if they are valid real numbers
+        A = _tokens_to_real_2darray(s_row, number_of_columns)
+        if A is not None:
+            return (A, {'format_type': 'python'})
+
         # Define matrix in which to put result
         A = np.zeros((number_of_rows, number_of_columns))
 
@@ -984,28 +1091,12 @@ def latex_from_2darray(A, presentation_type='f', digits=2):
 
 def is_correct_ndarray2D_dd(a_sub, a_tru, digits=2):
     # Check if each element is correct
-    m = a_sub.shape[0]
-    n = a_sub.shape[1]
-    for i in range(0, m):
-        for j in range(0, n):
-            if not is_correct_scalar_dd(a_sub[i, j], a_tru[i, j], digits):
-                return False
-
-    # All elements were close
-    return True
+    return bool(np.all(is_correct_elementwise_dd(a_sub, a_tru, digits)))
 
 
 def is_correct_ndarray2D_sf(a_sub, a_tru, digits=2):
     # Check if each element is correct
-    m = a_sub.shape[0]
-    n = a_sub.shape[1]
-    for i in range(0, m):
-        for j in range(0, n):
-            if not is_correct_scalar_sf(a_sub[i, j], a_tru[i, j], digits):
-                return False
-
-    # All elements were close
-    return True
+    return bool(np.all(is_correct_elementwise_sf(a_sub, a_tru, digits)))
 
 
 def is_correct_ndarray2D_ra(a_sub, a_tru, rtol=1e-5, atol=1e-8):
@@ -1049,6 +1140,147 @@ def is_correct_scalar_sf(a_sub, a_tru, digits=2):
     return (a_sub > lower_bound) & (a_sub < upper_bound)
 
 
+def is_correct_elementwise_ra(a_sub, a_tru, rtol=1e-5, atol=1e-8):
+    """correct = is_correct_elementwise_ra(a_sub, a_tru, rtol=1e-5, atol=1e-8)
+
+    Batched version of is_correct_scalar_ra(). Compares each submitted answer
+    in the array a_sub with the true answer in the same position of a_tru
+    (with broadcasting) and returns a boolean ndarray.
+    """
+    return np.isclose(a_sub, a_tru, rtol, atol)
+
+
+def is_correct_elementwise_dd(a_sub, a_tru, digits=2):
+    """correct = is_correct_elementwise_dd(a_sub, a_tru, digits=2)
+
+    Batched version of is_correct_scalar_dd(). Compares each submitted answer
+    in the array a_sub with the true answer in the same position of a_tru
+    (with broadcasting) and returns a boolean ndarray. Entries where either
+    answer is NaN or infinite are not correct.
+    """
+    a_sub = np.asarray(a_sub)
+    a_tru = np.asarray(a_tru)
+    # If answers are complex, check real and imaginary parts separately
+    if np.iscomplexobj(a_sub) or np.iscomplexobj(a_tru):
+        return is_correct_elementwise_dd(a_sub.real, a_tru.real, digits=digits) & is_correct_elementwise_dd(a_sub.imag, a_tru.imag, digits=digits)
+
+    # Get bounds on submitted answers
+    eps = 0.51 * (10**-digits)
+    with np.errstate(invalid='ignore'):
+        lower_bound = a_tru - eps
+        upper_bound = a_tru + eps
+
+        # Check if submitted answers are in bounds
+        return np.asarray((a_sub > lower_bound) & (a_sub < upper_bound))
+
+
+def is_correct_elementwise_sf(a_sub, a_tru, digits=2):
+    """correct = is_correct_elementwise_sf(a_sub, a_tru, digits=2)
+
+    Batched version of is_correct_scalar_sf(). Compares each submitted answer
+    in the array a_sub with the true answer in the same position of a_tru
+    (with broadcasting) and returns a boolean ndarray. Entries where either
+    answer is NaN or infinite are not correct.
+    """
+    a_sub = np.asarray(a_sub)
+    a_tru = np.asarray(a_tru)
+    # If answers are complex, check real and imaginary parts separately
+    if np.iscomplexobj(a_sub) or np.iscomplexobj(a_tru):
+        return is_correct_elementwise_sf(a_sub.real, a_tru.real, digits=digits) & is_correct_elementwise_sf(a_sub.imag, a_tru.imag, digits=digits)
+
+    # Get the decimal exponent of each true answer (0 for a true answer of 0)
+    finite = np.isfinite(a_tru)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exponents = np.floor(np.log10(np.abs(np.where(finite & (a_tru != 0), a_tru, 1)))).astype(int)
+
+    # Get bounds on submitted answers. There are only a few distinct
+    # exponents, so eps is computed for each of them exactly as in
+    # is_correct_scalar_sf(), which uses integer powers of 10.
+    (unique_exponents, inverse) = np.unique(exponents, return_inverse=True)
+    eps = np.array([0.51 * (10**-(-int(e) + (digits - 1))) for e in unique_exponents])[inverse].reshape(exponents.shape)
+    with np.errstate(invalid='ignore'):
+        lower_bound = a_tru - eps
+        upper_bound = a_tru + eps
+
+        # Check if submitted answers are in bounds
+        return np.asarray(finite & (a_sub > lower_bound) & (a_sub < upper_bound))
+
+
+# Cache of tokenized mustache templates, keyed by absolute path. Each entry
+# is (stamp, tokens), where stamp is (mtime_ns, size) of the file when it was
+# read, so that edited templates are picked up again.
+_template_cache = {}
+
+
+def _get_template_tokens(template_path):
+    path = os.path.abspath(template_path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    entry = _template_cache.get(path)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        tokens = list(chevron.tokenizer.tokenize(f.read()))
+    _template_cache[path] = (stamp, tokens)
+    return tokens
+
+
+def render_template(template_path, params):
+    """html = render_template(template_path, params)
+
+    Renders the mustache template in the file template_path (relative to the
+    current directory, which is the element directory when called from an
+    element) with chevron. The tokenized template is cached, so rendering the
+    same template several times only reads and parses the file once.
+    """
+    return chevron.render(_get_template_tokens(template_path), params)
+
+
+# In-process LRU cache for element_cache(), keyed by the JSON of the file,
+# function, and arguments.
+ELEMENT_CACHE_SIZE = 64
+_element_cache = collections.OrderedDict()
+
+
+def element_cache(fcn):
+    """@element_cache
+
+    Decorates a top-level function of an element whose value only depends on
+    its arguments, such as the highlighting of code, so that it is computed
+    only once for the same arguments. The arguments and the value must be
+    JSON-serializable.
+
+    Values are cached in this process. In a forking python worker the values
+    of core element functions are also cached by a server process (see
+    lib/python_helper_cache.py), which survives the restart of the worker
+    after each request and only stores values that it computed itself.
+    """
+    file = fcn.__code__.co_filename
+    name = fcn.__name__
+
+    @functools.wraps(fcn)
+    def wrapper(*args):
+        key = json.dumps([file, name, args])
+        value = _element_cache.get(key)
+        if value is not None:
+            _element_cache.move_to_end(key)
+            return value
+
+        # the server is only there if the trampoline started it
+        server = sys.modules.get('python_helper_cache')
+        (found, value) = server.lookup(file, name, list(args)) if server is not None else (False, None)
+        if not found:
+            value = fcn(*args)
+        _element_cache[key] = value
+        if len(_element_cache) > ELEMENT_CACHE_SIZE:
+            _element_cache.popitem(last=False)
+        return value
+
+    # the server calls the function itself
+    wrapper.element_cache_wrapped = fcn
+    return wrapper
+
+
 def get_uuid():
     """get_uuid()
 
@@ -1,11 +1,16 @@
 # lol
 import sys
 import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../lib')))
+LIB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../lib'))
+sys.path.insert(0, LIB_DIR)
 
 import prairielearn as pl  # noqa: E402
 import unittest            # noqa: E402
 import lxml.html           # noqa: E402
+import json                # noqa: E402
+import numpy as np         # noqa: E402
+import tempfile            # noqa: E402
+import subprocess          # noqa: E402
 
 
 class TestPrairielearnLib(unittest.TestCase):
@@ -17,6 +22,181 @@ class TestPrairielearnLib(unittest.TestCase):
         e = lxml.html.fragment_fromstring('<div>test&gt;test</div>')
         self.assertEqual(pl.inner_html(e), 'test&gt;test')
 
+    def test_ndarray_base64_round_trip(self):
+        arrays = [
+            np.arange(12, dtype=np.float64).reshape(3, 4) / 7,
+            np.arange(6, dtype=np.int32).reshape(2, 3),
+            np.array([[1 + 2j, -3.5j]]),
+            np.array([True, False]),
+            np.arange(6, dtype='>f4').reshape(3, 2).T,
+            np.zeros((0, 3)),
+        ]
+        for a in arrays:
+            encoded = json.loads(json.dumps(pl.to_json(a, ndarray_encoding='base64')))
+            self.assertEqual(encoded['_encoding'], 'base64')
+            b = pl.from_json(encoded)
+            self.assertEqual(b.dtype, a.dtype)
+            self.assertEqual(b.shape, a.shape)
+            np.testing.assert_array_equal(b, a)
+            # decoded arrays must be writable, like those decoded from lists
+            b[...] = 0
+
+    def test_ndarray_list_encoding_still_readable(self):
+        a = np.array([[1.5, 2.5], [3.5, 4.5]])
+        encoded = pl.to_json(a)
+        self.assertEqual(encoded, {'_type': 'ndarray', '_value': [[1.5, 2.5], [3.5, 4.5]], '_dtype': 'float64'})
+        np.testing.assert_array_equal(pl.from_json(encoded), a)
+        c = np.array([1 + 1j, 2])
+        np.testing.assert_array_equal(pl.from_json(pl.to_json(c)), c)
+
+    def test_render_template_reloads_changed_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'test.mustache')
+            with open(path, 'w') as f:
+                f.write('{{#a}}<b>{{x}}</b>{{/a}}')
+            self.assertEqual(pl.render_template(path, {'a': True, 'x': 1}), '<b>1</b>')
+            self.assertEqual(pl.render_template(path, {'a': False, 'x': 1}), '')
+            with open(path, 'w') as f:
+                f.write('{{^a}}<i>{{x}}</i>{{/a}} ')
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(pl.render_template(path, {'a': False, 'x': 2}), '<i>2</i> ')
+
+    def test_parse_element_returns_copies(self):
+        html = '<pl-test a="1"><b>x</b></pl-test>'
+        hits = pl.element_parse_stats['hits']
+        e1 = pl.parse_element(html)
+        e1.set('a', '2')
+        e1.remove(e1[0])
+        e2 = pl.parse_element(html)
+        self.assertEqual(pl.element_parse_stats['hits'], hits + 1)
+        self.assertEqual(pl.get_string_attrib(e2, 'a'), '1')
+        self.assertEqual(pl.inner_html(e2), '<b>x</b>')
+
+    def test_element_cache_is_in_process(self):
+        calls = []
+
+        @pl.element_cache
+        def double(s):
+            calls.append(s)
+            return s + s
+
+        self.assertEqual(double('a'), 'aa')
+        self.assertEqual(double('a'), 'aa')
+        self.assertEqual(double('b'), 'bb')
+        self.assertEqual(calls, ['a', 'b'])
+        pl._element_cache.clear()
+        self.assertEqual(double('a'), 'aa')
+        self.assertEqual(calls, ['a', 'b', 'a'])
+
+    def test_element_cache_server(self):
+        import python_helper_cache
+        import time
+
+        def wait_for_lookup(file, fcn, args):
+            for _ in range(100):
+                (found, value) = python_helper_cache.lookup(file, fcn, args)
+                if found:
+                    break
+                time.sleep(0.01)
+            return (found, value)
+
+        with tempfile.TemporaryDirectory() as elements_dir:
+            os.mkdir(os.path.join(elements_dir, 'pl-test'))
+            file = os.path.join(elements_dir, 'pl-test', 'pl-test.py')
+            with open(file, 'w') as f:
+                f.write('import prairielearn as pl\n\n'
+                        '@pl.element_cache\ndef double(s):\n    return s + s\n\n'
+                        'def plain(s):\n    return s\n')
+            other_file = os.path.join(elements_dir, 'pl-test', 'other.py')
+            with open(other_file, 'w') as f:
+                f.write('import prairielearn as pl\n\n@pl.element_cache\ndef double(s):\n    return s\n')
+
+            pid = python_helper_cache.start_server(elements_dir)
+            try:
+                self.assertEqual(python_helper_cache.lookup(file, 'double', ['a']), (False, None))
+                # the server computes the value after answering the miss
+                self.assertEqual(wait_for_lookup(file, 'double', ['a']), (True, 'aa'))
+                # only decorated functions of core element files are computed
+                self.assertEqual(wait_for_lookup(file, 'plain', ['a']), (False, None))
+                self.assertEqual(wait_for_lookup(other_file, 'double', ['a']), (False, None))
+            finally:
+                python_helper_cache.client.close()
+                python_helper_cache.client = None
+                os.waitpid(pid, 0)
+        self.assertEqual(python_helper_cache.lookup(file, 'double', ['a']), (False, None))
+
+    def test_string_to_2darray(self):
+        for s in ['[1 2; 3 4]', '[1, 2; 3, 4]', '[[1, 2], [3, 4]]', ' [ [1,2] , [ 3 , 4 ] ] ']:
+            (A, info) = pl.string_to_2darray(s)
+            self.assertEqual(A.dtype, np.float64)
+            np.testing.assert_array_equal(A, [[1, 2], [3, 4]])
+        (A, info) = pl.string_to_2darray('[[1, 2i], [3, 4]]')
+        np.testing.assert_array_equal(A, [[1, 2j], [3, 4]])
+        (A, info) = pl.string_to_2darray('[1 2; 3 x]')
+        self.assertIsNone(A)
+        self.assertEqual(info['format_error'], 'Entry <code class="user-output-invalid">x</code> at location (row=2, column=2) in the matrix has an invalid format.')
+        (A, info) = pl.string_to_2darray('[1 2; 3 4 5]')
+        self.assertEqual(info['format_error'], 'Rows 1 and 2 of the matrix have a different number of columns.')
+        (A, info) = pl.string_to_2darray('[[1, 1e999], [3, 4]]')
+        self.assertEqual(info['format_error'], 'Entry <code class="user-output-invalid"> 1e999</code> at location (row=1, column=2) of the matrix has an invalid format.')
+        (A, info) = pl.string_to_2darray('[[1, 2] [3, 4]]')
+        self.assertEqual(info['format_error'], 'No comma after row 1 of the matrix.')
+
+    def test_string_from_2darray_matlab(self):
+        A = np.array([[1, 2.5], [-3, 4]])
+        self.assertEqual(pl.string_from_2darray(A, language='matlab'), '[1.00 2.50; -3.00 4.00]')
+        self.assertEqual(pl.string_from_2darray(A[0], language='matlab'), '[1.00, 2.50]')
+        self.assertEqual(pl.string_from_2darray(A, language='matlab', presentation_type='sigfig', digits=2), '[1.0 2.5; -3.0 4.0]')
+        self.assertEqual(pl.string_from_2darray(np.array([[1 + 2j]]), language='matlab', presentation_type='sigfig'), '[1.0+2.0j]')
+
+    def _random_answer_pairs(self, rng, size):
+        # true answers over many magnitudes, including exact powers of 10 and zero
+        exponents = rng.integers(-12, 12, size=size)
+        a_tru = np.round(rng.uniform(-10, 10, size=size), rng.integers(0, 4)) * 10.0**exponents
+        a_tru[rng.random(size=size) < 0.1] = 0
+        powers = rng.random(size=size) < 0.1
+        a_tru[powers] = 10.0**exponents[powers]
+        # submitted answers close to, on the boundary of, and far from the true answers
+        digits = int(rng.integers(1, 6))
+        offsets = rng.choice([0, 0.49, 0.5, 0.51, 0.52, 5], size=size) * rng.choice([-1, 1], size=size)
+        a_sub = a_tru + offsets * 10.0**(exponents - digits + 1)
+        return (a_sub, a_tru, digits)
+
+    def test_is_correct_elementwise_matches_scalar(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            (a_sub, a_tru, digits) = self._random_answer_pairs(rng, (4, 5))
+            if rng.random() < 0.2:
+                a_sub = a_sub + 1j * a_tru
+                a_tru = a_tru + 1j * a_sub.real
+            for (batched, scalar, matrix) in [(pl.is_correct_elementwise_sf, pl.is_correct_scalar_sf, pl.is_correct_ndarray2D_sf),
+                                              (pl.is_correct_elementwise_dd, pl.is_correct_scalar_dd, pl.is_correct_ndarray2D_dd)]:
+                expected = np.array([[bool(scalar(a_sub[i, j], a_tru[i, j], digits)) for j in range(5)] for i in range(4)])
+                np.testing.assert_array_equal(batched(a_sub, a_tru, digits), expected)
+                self.assertEqual(matrix(a_sub, a_tru, digits), bool(expected.all()))
+            expected = np.array([[bool(pl.is_correct_scalar_ra(a_sub[i, j], a_tru[i, j], 1e-3, 1e-8)) for j in range(5)] for i in range(4)])
+            np.testing.assert_array_equal(pl.is_correct_elementwise_ra(a_sub, a_tru, 1e-3, 1e-8), expected)
+
+    def test_is_correct_elementwise_non_finite(self):
+        a_sub = np.array([1, np.nan, np.inf, 1, np.nan, np.inf, -np.inf])
+        a_tru = np.array([1, 1, 1, np.nan, np.nan, np.inf, -np.inf])
+        for batched in [pl.is_correct_elementwise_sf, pl.is_correct_elementwise_dd]:
+            np.testing.assert_array_equal(batched(a_sub, a_tru, 2), [True, False, False, False, False, False, False])
+            self.assertFalse(pl.is_correct_ndarray2D_sf(a_sub.reshape(1, -1), a_tru.reshape(1, -1)))
+
+    def test_import_does_not_load_sympy_or_pandas(self):
+        code = 'import sys, prairielearn; print(",".join(m for m in ["sympy", "pandas"] if m in sys.modules))'
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join([os.path.dirname(os.path.abspath(__file__)), LIB_DIR])}
+        result = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_sympy_round_trip(self):
+        import sympy
+        x = sympy.Symbol('x')
+        for v in [x**2 + 1, sympy.Matrix([[x, 1], [2, x**3]])]:
+            self.assertEqual(pl.from_json(json.loads(json.dumps(pl.to_json(v)))), v)
+        self.assertEqual(pl.sympy.Symbol('x'), x)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -42,6 +42,7 @@ const freeformServer = require('./question-servers/freeform.js');
 const cache = require('./lib/cache');
 const { LocalCache } = require('./lib/local-cache');
 const workers = require('./lib/workers');
+const pythonTiming = require('./lib/python-timing');
 
 
 process.on('warning', e => console.warn(e)); // eslint-disable-line no-console
@@ -1126,6 +1127,7 @@ if (config.startServer) {
         },
         function(callback) {
             workers.init();
+            pythonTiming.init();
             callback(null);
         },
         async () => {
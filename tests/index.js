@@ -46,6 +46,9 @@ require('./testRedirects');
 require('./testIssues');
 require('./testChunks');
 require('./testLocalLock');
+require('./testJsonDelta');
+require('./testPythonTiming');
+require('./testPythonWorkerRecycle');
 require('./testWorkspaceAccess');
 require('./sync');
 require('./testGroupGenerateAndDelete');
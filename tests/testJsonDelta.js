@@ -0,0 +1,39 @@
+const assert = require('chai').assert;
+const _ = require('lodash');
+const jsonDelta = require('../lib/json-delta');
+
+describe('JSON deltas', function() {
+    const oldData = {
+        params: {m: [[1, 2], [3, 4]], x: 1},
+        correct_answers: {},
+        removed: null,
+    };
+    const newData = {
+        params: {m: [[1, 2], [3, 5]], x: 1},
+        correct_answers: {a: {b: 1}},
+        added: null,
+    };
+
+    it('should only include changed values', function() {
+        const ops = jsonDelta.diff(oldData, newData);
+        assert.deepEqual(ops, [
+            {op: 'remove', path: ['removed']},
+            {op: 'replace', path: ['params', 'm'], value: [[1, 2], [3, 5]]},
+            {op: 'add', path: ['correct_answers', 'a'], value: {b: 1}},
+            {op: 'add', path: ['added'], value: null},
+        ]);
+    });
+
+    it('should be empty for equal values', function() {
+        assert.deepEqual(jsonDelta.diff(oldData, _.cloneDeep(oldData)), []);
+    });
+
+    it('should round-trip through apply', function() {
+        const ops = jsonDelta.diff(oldData, newData);
+        assert.deepEqual(jsonDelta.apply(_.cloneDeep(oldData), ops), newData);
+    });
+
+    it('should replace the root value', function() {
+        assert.deepEqual(jsonDelta.apply(1, jsonDelta.diff(1, {x: 2})), {x: 2});
+    });
+});
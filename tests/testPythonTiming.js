@@ -0,0 +1,53 @@
+const assert = require('chai').assert;
+const pythonTiming = require('../lib/python-timing');
+
+describe('Python call timing', function() {
+    beforeEach(function() {
+        pythonTiming.reset();
+    });
+
+    it('should group calls by element and phase', function() {
+        for (const callMS of [0.05, 3, 4, 4.5]) {
+            pythonTiming.record({file: 'server', fcn: 'generate'}, {compile_ms: 1, exec_ms: 1, call_ms: callMS});
+        }
+        pythonTiming.record({file: 'server', fcn: 'grade'}, {compile_ms: 1, exec_ms: 1, call_ms: 20000});
+        const summary = pythonTiming.summary();
+        assert.deepEqual(summary.map((row) => row.key), ['server.grade', 'server.generate']);
+        const generate = summary[1];
+        assert.equal(generate.count, 4);
+        assert.equal(generate.compile_ms, 4);
+        assert.equal(generate.p50_call_ms, 5);
+        assert.equal(generate.p99_call_ms, 5);
+        assert.equal(generate.max_call_ms, 4.5);
+        assert.equal(generate.histogram['<=0.1'], 1);
+        assert.equal(generate.histogram['<=5'], 3);
+        assert.equal(summary[0].p99_call_ms, 20000);
+        assert.equal(summary[0].histogram['>10000'], 1);
+    });
+
+    it('should record each call of a batch', function() {
+        const calls = [{file: 'pl-number-input'}, {file: 'pl-symbolic-input'}];
+        pythonTiming.record({file: null, fcn: 'grade', batch: true, args: [calls, {}]}, {
+            compile_ms: 2, exec_ms: 2, call_ms: 101,
+            calls: [{compile_ms: 1, exec_ms: 1, call_ms: 1}, {compile_ms: 1, exec_ms: 1, call_ms: 100}],
+        });
+        const summary = pythonTiming.summary();
+        assert.deepEqual(summary.map((row) => [row.key, row.call_ms]), [['pl-symbolic-input.grade', 100], ['pl-number-input.grade', 1], ['batch.grade', 101]]);
+    });
+
+    it('should record the round trip of each call', function() {
+        for (const peakRssDeltaKB of [10, 30]) {
+            pythonTiming.record({file: 'server', fcn: 'generate'}, {
+                compile_ms: 1, exec_ms: 1, call_ms: 1, read_ms: 0.5, serialize_ms: 0.25, total_ms: 3,
+                bytes_in: 100, bytes_out: 200, peak_rss_delta_kb: peakRssDeltaKB,
+            });
+        }
+        const row = pythonTiming.summary()[0];
+        assert.equal(row.read_ms, 1);
+        assert.equal(row.serialize_ms, 0.5);
+        assert.equal(row.total_ms, 6);
+        assert.equal(row.bytes_in, 200);
+        assert.equal(row.bytes_out, 400);
+        assert.equal(row.max_peak_rss_delta_kb, 30);
+    });
+});
@@ -0,0 +1,52 @@
+const assert = require('chai').assert;
+const child_process = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const fixtureDir = path.join(__dirname, 'testPythonWorkerRecycle');
+
+describe('Python worker recycling', function() {
+    this.timeout(20000);
+
+    let child, responses;
+    before('start the zygote', function() {
+        const env = Object.assign({}, process.env, {
+            PYTHONPATH: fixtureDir,
+            PL_PYTHON_PRELOAD_ELEMENTS: 'false',
+            PL_PYTHON_PRELOAD_MODULES: JSON.stringify(['ballast']),
+            PL_PYTHON_WORKER_MAX_RSS_MB: '32',
+        });
+        child = child_process.spawn('python3', [path.join(__dirname, '..', 'lib', 'python-caller-trampoline.py')], {
+            cwd: path.join(__dirname, '..', 'lib'),
+            stdio: ['pipe', 'ignore', 'inherit', 'pipe'],
+            env,
+        });
+        responses = readline.createInterface({input: child.stdio[3]})[Symbol.asyncIterator]();
+    });
+    after('stop the zygote', function() {
+        child.kill('SIGTERM');
+    });
+
+    const call = async (fcn, args) => {
+        child.stdin.write(JSON.stringify({file: 'memory', fcn, args, cwd: fixtureDir, paths: []}) + '\n');
+        return JSON.parse((await responses.next()).value);
+    };
+
+    it('should not count the memory shared with the zygote', async function() {
+        const outp = await call('noop', [{}]);
+        assert.isTrue(outp.present);
+        assert.notProperty(outp, 'recycled');
+    });
+
+    it('should recycle a worker above the limit', async function() {
+        const outp = await call('allocate', [{mb: 48}]);
+        assert.isTrue(outp.present);
+        assert.match(outp.recycled, /^memory/);
+    });
+
+    it('should fork a fresh worker after recycling', async function() {
+        const outp = await call('noop', [{}]);
+        assert.isTrue(outp.present);
+        assert.notProperty(outp, 'recycled');
+    });
+});
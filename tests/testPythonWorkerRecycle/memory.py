@@ -0,0 +1,9 @@
+kept = []
+
+
+def noop(data):
+    pass
+
+
+def allocate(data):
+    kept.append(b'\x01' * (data['mb'] * 2**20))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# Benchmark of the answer comparators in prairielearn.py. For square
+# matrices of several sizes, reports the time of comparing a submitted
+# matrix with the true matrix entry by entry with is_correct_scalar_sf/dd
+# (as elements used to do) and with the batched is_correct_elementwise_sf/dd.
+#
+# Usage: tools/benchmark_comparators.py [repeats]
+
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'question-servers', 'freeformPythonLib'))
+import prairielearn as pl  # noqa: E402
+
+SIZES = [5, 20, 50, 100]
+DIGITS = 3
+
+
+def scalar_loop(scalar, a_sub, a_tru):
+    (m, n) = a_tru.shape
+    return [[scalar(a_sub[i, j], a_tru[i, j], DIGITS) for j in range(n)] for i in range(m)]
+
+
+def report(name, n, fcn, repeats):
+    best = min(timeit.repeat(fcn, number=1, repeat=repeats))
+    print('{:22s} {:4d}x{:<4d} {:10.3f} ms'.format(name, n, n, 1e3 * best))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = np.random.default_rng(0)
+    for n in SIZES:
+        a_tru = rng.normal(size=(n, n)) * 10.0**rng.integers(-6, 6, size=(n, n))
+        a_sub = a_tru * (1 + rng.choice([0, 1e-4, 1e-2], size=(n, n)))
+        for (kind, scalar, batched) in [('sf', pl.is_correct_scalar_sf, pl.is_correct_elementwise_sf),
+                                        ('dd', pl.is_correct_scalar_dd, pl.is_correct_elementwise_dd)]:
+            report('scalar loop ' + kind, n, lambda: scalar_loop(scalar, a_sub, a_tru), repeats)
+            report('elementwise ' + kind, n, lambda: batched(a_sub, a_tru, DIGITS), repeats)
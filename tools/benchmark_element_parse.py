@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Benchmark of the share of element time that goes to parsing element_html.
+# Runs prepare, parse, grade and the three render panels of some core
+# elements, as for a single submission, and reports per element:
+#
+#   total  - time spent in the element functions
+#   parse  - time spent in prairielearn.parse_element()
+#   hits   - fraction of parse_element() calls served from its cache
+#
+# Usage: tools/benchmark_element_parse.py [repeats]
+
+import os
+import sys
+import json
+import timeit
+import importlib.util
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(root, 'lib'))
+sys.path.insert(0, os.path.join(root, 'question-servers', 'freeformPythonLib'))
+import sympy  # noqa: E402
+import prairielearn as pl  # noqa: E402
+
+# (element, element_html, correct answer, submitted answer)
+ELEMENTS = [
+    ('pl-number-input', '<pl-number-input answers-name="x" rtol="0.01" label="$x =$"></pl-number-input>', 3.14, '3.141'),
+    ('pl-integer-input', '<pl-integer-input answers-name="x" label="$n =$"></pl-integer-input>', 42, '42'),
+    ('pl-string-input', '<pl-string-input answers-name="x" label="word"></pl-string-input>', 'hello', 'hello'),
+    ('pl-symbolic-input', '<pl-symbolic-input answers-name="x" variables="x, y"></pl-symbolic-input>',
+     pl.to_json(sympy.sympify('x**2 + y', locals={'x': sympy.Symbol('x'), 'y': sympy.Symbol('y')})), 'y + x^2'),
+    ('pl-multiple-choice', '<pl-multiple-choice answers-name="x">'
+     + ''.join('<pl-answer correct="{:s}">Option <b>{:d}</b></pl-answer>'.format('true' if i == 0 else 'false', i) for i in range(6))
+     + '</pl-multiple-choice>', None, None),
+    ('pl-checkbox', '<pl-checkbox answers-name="x">'
+     + ''.join('<pl-answer correct="{:s}">Option ${:d}$</pl-answer>'.format('true' if i % 2 == 0 else 'false', i) for i in range(8))
+     + '</pl-checkbox>', None, None),
+]
+
+
+def load_element(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(root, 'elements', name, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def new_data():
+    return {
+        'params': {}, 'correct_answers': {}, 'submitted_answers': {}, 'raw_submitted_answers': {},
+        'format_errors': {}, 'partial_scores': {}, 'score': 0, 'feedback': {}, 'variant_seed': 1,
+        'options': {}, 'editable': True, 'panel': 'question', 'extensions': {}, 'num_valid_submissions': 0,
+        'manual_grading': False, 'answers_names': {},
+    }
+
+
+def submission(module, element_html, correct, submitted):
+    data = new_data()
+    if correct is not None:
+        data['correct_answers']['x'] = correct
+    if hasattr(module, 'prepare'):
+        module.prepare(element_html, data)
+    data = json.loads(json.dumps(data))
+    if submitted is None:
+        # choose the first displayed answer
+        submitted = data['params']['x'][0]['key']
+        if isinstance(data['correct_answers']['x'], list):
+            submitted = [submitted]
+    data['submitted_answers']['x'] = submitted
+    data['raw_submitted_answers']['x'] = submitted
+    for fcn in ['parse', 'grade']:
+        if hasattr(module, fcn):
+            getattr(module, fcn)(element_html, data)
+    for panel in ['question', 'submission', 'answer']:
+        data['panel'] = panel
+        module.render(element_html, data)
+
+
+def report(name, module, element_html, correct, submitted, repeats):
+    os.chdir(os.path.join(root, 'elements', name))
+    totals = []
+    for _ in range(repeats):
+        pl._element_cache.clear()
+        pl.element_parse_stats.update({'calls': 0, 'hits': 0, 'seconds': 0.0})
+        totals.append((timeit.timeit(lambda: submission(module, element_html, correct, submitted), number=1),
+                       pl.element_parse_stats['seconds']))
+    total, parse = min(totals)
+    stats = pl.element_parse_stats
+    print('{:20s} total {:8.1f} us   parse {:6.1f} us ({:4.1f}%)   hits {:d}/{:d}'.format(
+        name, 1e6 * total, 1e6 * parse, 100 * parse / total, stats['hits'], stats['calls']))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for (name, element_html, correct, submitted) in ELEMENTS:
+        report(name, load_element(name), element_html, correct, submitted, repeats)
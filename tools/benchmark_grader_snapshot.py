@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Benchmark of copying the setup variables of a python autograder question
+# with a large dataset for the reference and the student code, as done by
+# execute_code() in graders/python/python_autograder/pl_execute.py. The setup
+# variables are a DataFrame and an array of size_mb megabytes each (half for
+# each), and the reference and student code both read all of the data and
+# modify one percent of the rows. Reports for each method, each run in a
+# fresh process:
+#
+#   copy    - time to make the two copies
+#   total   - time to make the copies and run the code
+#   memory  - increase of the memory in use by the system (including the
+#             files in /dev/shm that back the snapshots), with both copies
+#             still alive
+#   shm     - size of the files that back the snapshots, which are on disk
+#             rather than in /dev/shm if it is too small
+#
+# Usage: tools/benchmark_grader_snapshot.py [size_mb]
+
+import os
+import sys
+import time
+import subprocess
+
+AUTOGRADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'graders', 'python', 'python_autograder')
+
+METHODS = ['deepcopy', 'snapshot']
+
+
+def used_mb():
+    with open('/proc/meminfo') as f:
+        info = {line.split(':')[0]: int(line.split()[1]) for line in f}
+    return (info['MemTotal'] - info['MemAvailable']) / 1024
+
+
+def setup(size_mb):
+    import numpy as np
+    import pandas as pd
+    rows = int(size_mb * 2 ** 20 / 2 / 8 / 8)
+    df = pd.DataFrame(np.random.rand(rows, 8), columns=list('abcdefgh'))
+    X = np.random.rand(rows, 8)
+    return {'df': df, 'X': X, 'label': 'h'}
+
+
+def run_user_code(ns):
+    """Reads all of the data and modifies one percent of the rows."""
+    total = ns['df'].sum().sum() + ns['X'].sum()
+    n = len(ns['X']) // 100
+    ns['df'].iloc[:n, 0] = 0.0
+    ns['X'][:n] *= 2
+    return total
+
+
+def run(method, size_mb):
+    sys.path.insert(0, AUTOGRADER_DIR)
+    from copy import deepcopy
+    import pl_snapshot
+
+    ns = setup(size_mb)
+    start_used = used_mb()
+    snapshots = pl_snapshot.Snapshots()
+    copy = deepcopy if method == 'deepcopy' else snapshots.deepcopy
+
+    start = time.perf_counter()
+    ref = copy(ns)
+    copy_time = time.perf_counter() - start
+    run_user_code(ref)
+    start_student = time.perf_counter()
+    student = copy(ns)
+    copy_time += time.perf_counter() - start_student
+    run_user_code(student)
+    total_time = time.perf_counter() - start
+
+    shm_mb = sum(os.fstat(s.file.fileno()).st_size for s in snapshots.backing.values()) / 2 ** 20
+    print('{:10s} copy {:7.3f} s   total {:7.3f} s   memory +{:7.1f} MB   shm {:7.1f} MB'.format(
+        method, copy_time, total_time, used_mb() - start_used, shm_mb))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run(sys.argv[2], float(sys.argv[3]))
+        sys.exit(0)
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    print('dataset: {:.0f} MB'.format(size_mb))
+    for method in METHODS:
+        subprocess.run([sys.executable, __file__, '--run', method, str(size_mb)], check=True)
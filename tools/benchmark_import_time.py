@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Benchmark of the time to import prairielearn.py, as paid by every cold
+# python worker. Runs "python3 -X importtime -c 'import prairielearn'" in a
+# fresh interpreter several times and reports, for the fastest run:
+#
+#   total    - cumulative import time of prairielearn
+#   heaviest - the slowest top-level imports below it
+#
+# Exits with status 1 if any of the LAZY modules were imported (they must only
+# be loaded when a value of their type is converted) or if the total is larger
+# than max_ms, so it can be used as a regression check.
+#
+# Usage: tools/benchmark_import_time.py [repeats] [max_ms]
+
+import os
+import sys
+import subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PYTHONPATH = os.pathsep.join([os.path.join(root, 'lib'), os.path.join(root, 'question-servers', 'freeformPythonLib')])
+
+# Slow imports that prairielearn.py must not load at import time
+LAZY = ['sympy', 'pandas', 'python_helper_sympy']
+
+HEAVIEST = 8
+
+
+def import_times():
+    """times = import_times()
+
+    Returns a list of (cumulative_us, depth, module) for every module
+    imported by "import prairielearn", in the order reported by python.
+    """
+    env = {**os.environ, 'PYTHONPATH': PYTHONPATH}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import prairielearn'],
+                            env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        (_, cumulative, name) = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((int(cumulative), depth, name.strip()))
+    return times
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    max_ms = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    runs = [import_times() for _ in range(repeats)]
+    total = {name: us for (us, _, name) in runs[0]}['prairielearn']
+    best = runs[0]
+    for times in runs[1:]:
+        us = {name: us for (us, _, name) in times}['prairielearn']
+        if us < total:
+            (total, best) = (us, times)
+
+    print('{:30s} {:8.1f} ms'.format('prairielearn (total)', 1e-3 * total))
+    top_level = [(us, name) for (us, depth, name) in best if depth == 1 and name != 'prairielearn']
+    for (us, name) in sorted(top_level, reverse=True)[:HEAVIEST]:
+        print('  {:28s} {:8.1f} ms'.format(name, 1e-3 * us))
+
+    failed = False
+    imported = {name for (_, _, name) in best}
+    for name in LAZY:
+        if name in imported:
+            print('error: {:s} was imported by prairielearn'.format(name))
+            failed = True
+    if max_ms is not None and 1e-3 * total > max_ms:
+        print('error: import took longer than {:.1f} ms'.format(max_ms))
+        failed = True
+    sys.exit(1 if failed else 0)
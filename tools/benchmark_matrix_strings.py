@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+# Benchmark of converting matrices to and from strings with prairielearn.py,
+# as done by pl-matrix-input and pl-matrix-component-input. Reports, for
+# square matrices of several sizes, the time of:
+#
+#   parse matlab  - string_to_2darray() of '[1.23 4.56; ...]'
+#   parse python  - string_to_2darray() of '[[1.23, 4.56], ...]'
+#   format        - string_from_2darray(..., language='matlab')
+#   format sigfig - string_from_2darray(..., language='matlab', presentation_type='sigfig')
+#
+# Usage: tools/benchmark_matrix_strings.py [repeats]
+
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'question-servers', 'freeformPythonLib'))
+import prairielearn as pl  # noqa: E402
+
+SIZES = [5, 20, 50, 100, 200]
+
+
+def python_string(A):
+    return '[' + ', '.join('[' + ', '.join('{:.6g}'.format(x) for x in row) + ']' for row in A) + ']'
+
+
+def report(name, n, fcn, repeats):
+    best = min(timeit.repeat(fcn, number=1, repeat=repeats))
+    print('{:14s} {:4d}x{:<4d} {:10.3f} ms'.format(name, n, n, 1e3 * best))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = np.random.default_rng(0)
+    for n in SIZES:
+        A = rng.normal(size=(n, n))
+        s_matlab = pl.string_from_2darray(A, language='matlab', presentation_type='g', digits=6)
+        s_python = python_string(A)
+        report('parse matlab', n, lambda: pl.string_to_2darray(s_matlab), repeats)
+        report('parse python', n, lambda: pl.string_to_2darray(s_python), repeats)
+        report('format', n, lambda: pl.string_from_2darray(A, language='matlab', digits=6), repeats)
+        report('format sigfig', n, lambda: pl.string_from_2darray(A, language='matlab', presentation_type='sigfig', digits=4), repeats)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Benchmark of parsing student expressions with lib/python_helper_sympy.py, as
+# done by pl-symbolic-input.parse. Reports the time per expression of:
+#
+#   validate - ast.parse and validation/transformation of the AST
+#   convert  - the full convert_string_to_sympy() (without its cache)
+#
+# Usage: tools/benchmark_sympy_parse.py [repeats]
+
+import os
+import sys
+import ast
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+import python_helper_sympy as phs  # noqa: E402
+
+# Realistic student inputs, both valid and invalid
+CORPUS = [
+    'x', 'x + 1', '2*x**2 - 3*x + 1', '2 x + 1', 'x^2 + 2*x + 1',
+    'sin(x)**2 + cos(x)**2', 'exp(-x**2/2)/sqrt(2*pi)', 'log(x*y)/(x - y)',
+    '(x + y)**3 - 3*x**2*y - 3*x*y**2 - y**3', '-x*y + y*x', 'e**(x*t)',
+    'sqrt(x**2 + y**2)', 'tan(x/2)', 'x/(1 + x)**2 - 1/(1 + x)', '1/2*m*v**2',
+    'm*g*h + 1/2*k*x**2', 'cos(omega*t + phi)', 'exp(-t/tau)*sin(omega*t)',
+    'x + 0.5', 'atan(x)', 'x + q', '(x + 1', 'x.real', '3*(x - 1)**2*(x + 2)',
+    'sin(theta)*cos(phi) - cos(theta)*sin(phi)', 'pi*r**2*h/3', 'x**(1/3)',
+]
+VARIABLES = ['x', 'y', 't', 'm', 'v', 'g', 'h', 'k', 'omega', 'phi', 'tau', 'r', 'theta']
+
+
+def locals_for_eval():
+    const = phs._constants
+    variables = {**const.variables}
+    for variable in VARIABLES:
+        variables[variable] = phs.sympy.Symbol(variable)
+    return {'functions': const.functions, 'variables': variables, 'helpers': const.helpers}
+
+
+def validate_all(local_vars):
+    for expr in CORPUS:
+        try:
+            root = ast.parse(expr, mode='eval')
+            phs.CheckExpression(local_vars['functions'], local_vars['variables']).check(root)
+        except (SyntaxError, phs.Error):
+            pass
+
+
+def convert_all():
+    for expr in CORPUS:
+        try:
+            phs._convert_string_to_sympy_cached.__wrapped__(expr, tuple(VARIABLES), False, False)
+        except phs.Error:
+            pass
+
+
+def report(name, fcn, repeats):
+    best = min(timeit.repeat(fcn, number=1, repeat=repeats))
+    print('{:10s} {:8.1f} us/expression'.format(name, 1e6 * best / len(CORPUS)))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    local_vars = locals_for_eval()
+    report('validate', lambda: validate_all(local_vars), repeats)
+    report('convert', convert_all, repeats)